@@ -0,0 +1,10 @@
+"""
+Puts src/ on the import path so benchmark scripts can import the
+project modules the same way src/main.py does.
+"""
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,55 @@
+"""
+Offline evaluation throughput: replay a set of logged questions (with
+repeats) one by one through answer_question_structured, then all at
+once through answer_questions, and compare wall-clock time.
+
+    python benchmarks/bench_batch.py --questions 2000 --unique 500 --concurrency 16
+"""
+import random
+import time
+from common import QUESTIONS, argument_parser, build_chatbot, quiet
+from bootstrap import Settings
+
+def logged_questions(count, unique, seed):
+    """count questions drawn from unique distinct ones, like a replayed query log."""
+    distinct = [f"{QUESTIONS[i % len(QUESTIONS)]} variant {i}" for i in range(unique)]
+    rng = random.Random(seed)
+    return [rng.choice(distinct) for _ in range(count)]
+
+def main():
+    parser = argument_parser("Batch question answering against the in-process Capella fake")
+    parser.add_argument("--questions", type=int, default=1000, help="questions replayed")
+    parser.add_argument("--unique", type=int, default=250, help="distinct questions among them")
+    parser.add_argument("--concurrency", type=int, default=8, help="questions retrieved at once by answer_questions")
+    parser.add_argument("--keyword-search", action="store_true", help="run keyword search alongside vector search")
+    args = parser.parse_args()
+
+    settings = Settings()
+    settings.keyword_search = args.keyword_search
+    # no embedding cache, so the serial run can't reuse embeddings of repeated questions
+    settings.cache_size = 0
+    settings.semantic_cache_threshold = None
+    questions = logged_questions(args.questions, args.unique, args.seed)
+    with quiet(args.verbose):
+        client, embedding_generator, chatbot = build_chatbot(args, settings)
+
+    with quiet(args.verbose):
+        started = time.perf_counter()
+        for question in questions:
+            chatbot.answer_question_structured(question)
+        serial_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = chatbot.answer_questions(questions, max_concurrency=args.concurrency)
+        batch_seconds = time.perf_counter() - started
+
+    failed = sum(1 for result in results if "error" in result)
+    print(f"{len(questions)} questions ({len(set(questions))} unique), {args.landmarks} landmarks")
+    print(f"serial:          {serial_seconds:.2f}s ({len(questions) / serial_seconds:.0f} questions/s)")
+    print(
+        f"answer_questions: {batch_seconds:.2f}s ({len(questions) / batch_seconds:.0f} questions/s, "
+        f"{serial_seconds / batch_seconds:.1f}x, {failed} failed, concurrency {args.concurrency})"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Cost of reaching the embedding model through the shared embedding server
+instead of calling it in-process: per-query latency, batch throughput,
+and concurrent workers sharing the server's micro-batcher.
+
+    python benchmarks/bench_embedding_server.py --queries 2000 --batch 256 --clients 8
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from common import QUESTIONS, argument_parser, format_percentiles, percentiles, quiet
+from rag.embedding_server import EmbeddingClient, EmbeddingServer
+from rag.embeddings import EmbeddingGenerator
+from fake_embeddings import HashingEmbeddingModel
+
+def query_latencies(generator, texts):
+    timings = []
+    for text in texts:
+        started = time.perf_counter()
+        generator.generate_embedding(text)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def concurrent_seconds(generator, texts, clients):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(generator.generate_embedding, texts))
+    return time.perf_counter() - started
+
+def main():
+    parser = argument_parser("Embedding server overhead against an in-process model")
+    parser.add_argument("--queries", type=int, default=1000, help="single-text queries embedded")
+    parser.add_argument("--batch", type=int, default=256, help="texts in the batch request")
+    parser.add_argument("--clients", type=int, default=8, help="threads querying at once")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0, help="the server's micro-batching window")
+    args = parser.parse_args()
+
+    texts = [f"{QUESTIONS[i % len(QUESTIONS)]} {i}" for i in range(args.queries)]
+    batch = texts[:args.batch]
+
+    def model():
+        return HashingEmbeddingModel(encode_ms_per_batch=args.encode_ms, encode_ms_per_text=args.encode_ms_per_text)
+
+    local = EmbeddingGenerator(model_name="hashing-benchmark", model=model())
+    served = EmbeddingGenerator(model_name="hashing-benchmark", model=model())
+    if args.batch_window_ms > 0:
+        served.enable_batching(max_wait_ms=args.batch_window_ms)
+    with tempfile.TemporaryDirectory() as tmp:
+        server = EmbeddingServer(served, os.path.join(tmp, "embeddings.sock"))
+        with quiet(args.verbose):
+            server.start()
+        client = EmbeddingGenerator(
+            model_name="hashing-benchmark",
+            model=EmbeddingClient(server.socket_path, model_name="hashing-benchmark")
+        )
+        # the first request connects and checks the served model
+        client.generate_embedding("warmup")
+
+        differences = np.abs(np.asarray(client.generate_embeddings(batch)) - np.asarray(local.generate_embeddings(batch)))
+        print(f"max difference to the in-process model: {differences.max():.2e}")
+
+        print(f"single queries ({args.queries}):")
+        print(f"  in-process: {format_percentiles(percentiles(query_latencies(local, texts)))}")
+        print(f"  server:     {format_percentiles(percentiles(query_latencies(client, texts)))}")
+
+        for name, generator in (("in-process", local), ("server", client)):
+            started = time.perf_counter()
+            generator.generate_embeddings(batch, batch_size=args.batch)
+            print(f"batch of {args.batch} {name}: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        print(f"{args.queries} queries from {args.clients} threads:")
+        local_seconds = concurrent_seconds(local, texts, args.clients)
+        served_seconds = concurrent_seconds(client, texts, args.clients)
+        print(f"  in-process: {local_seconds:.2f}s ({local.model.encode_calls} encode calls in total)")
+        print(
+            f"  server:     {served_seconds:.2f}s ({served.model.encode_calls} encode calls in total, "
+            f"{args.batch_window_ms}ms batching window)"
+        )
+        print(f"server: {server.stats()}")
+        client.model.close()
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Ingestion throughput: embed and store every synthetic landmark with
+TravelSampleLoader, once per batch size.
+
+    python benchmarks/bench_ingest.py --landmarks 2000 --batch-sizes 1,32,128
+    python benchmarks/bench_ingest.py --batch-sizes 64 --workers 1,2,4
+"""
+import functools
+import time
+from common import argument_parser, build_client, build_embedding_generator, quiet
+from fake_workers import fake_worker_setup
+from data.travel_sample_loader import TravelSampleLoader
+
+def run(args, batch_size, workers=1):
+    with quiet(args.verbose):
+        client = build_client(args)
+        embedding_generator = build_embedding_generator(args, cache_size=0)
+        # worker processes each write to their own fake, so they report counts instead
+        loader = TravelSampleLoader(
+            client, embedding_generator, checkpoint_path=None,
+            worker_setup=functools.partial(fake_worker_setup, vars(args)),
+            page_size=args.page_size
+        )
+        started = time.perf_counter()
+        ok = loader.add_embeddings_to_vectors_collection(batch_size=batch_size, workers=workers)
+        elapsed = time.perf_counter() - started
+    return ok, loader.last_stored_count, elapsed, dict(client.store.operations)
+
+def main():
+    parser = argument_parser("Ingestion throughput against the in-process Capella fake")
+    parser.add_argument("--batch-sizes", default="1,16,64,256", help="comma separated, 1 = one document per round-trip")
+    parser.add_argument("--workers", default="1", help="comma separated worker process counts")
+    parser.add_argument("--page-size", type=int, default=1000, help="landmarks read per query")
+    args = parser.parse_args()
+    print(f"Ingesting {args.landmarks} landmarks (query {args.query_ms}ms, kv {args.kv_ms}ms, encode {args.encode_ms}ms + {args.encode_ms_per_text}ms/text)")
+    for workers in [int(count) for count in args.workers.split(",")]:
+        for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+            ok, stored, elapsed, operations = run(args, batch_size, workers)
+            status = "" if ok else " FAILED"
+            # with workers the kv round-trips happen in the worker processes
+            round_trips = f", {operations['kv']} kv round-trips" if workers == 1 else ""
+            print(
+                f"workers {workers:>2}, batch size {batch_size:>4}: {stored} stored in {elapsed:.2f}s "
+                f"({stored / elapsed if elapsed else 0:.0f} docs/s{round_trips}){status}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Single-user query latency, end to end through TravelChatbot, with the
+time spent in each retrieval stage. Every question is asked once cold
+and then repeated so cache effects show up separately.
+
+    python benchmarks/bench_query.py --rounds 20
+"""
+import time
+from collections import defaultdict
+from common import QUESTIONS, argument_parser, build_chatbot, format_percentiles, percentiles, quiet
+from bootstrap import Settings
+
+def main():
+    parser = argument_parser("Query latency against the in-process Capella fake")
+    parser.add_argument("--rounds", type=int, default=10, help="times each question is asked")
+    parser.add_argument("--num-candidates", type=int, default=3)
+    parser.add_argument("--keyword-search", action="store_true", help="run keyword search alongside vector search")
+    args = parser.parse_args()
+
+    settings = Settings()
+    settings.num_candidates = args.num_candidates
+    settings.keyword_search = args.keyword_search
+    with quiet(args.verbose):
+        client, embedding_generator, chatbot = build_chatbot(args, settings)
+
+    answer_ms = {"cold": [], "warm": []}
+    structured_ms = []
+    first_result_ms = []
+    stages = defaultdict(list)
+    for round_number in range(args.rounds):
+        phase = "cold" if round_number == 0 else "warm"
+        for question in QUESTIONS:
+            with quiet(args.verbose):
+                started = time.perf_counter()
+                chatbot.answer_question(question)
+                answer_ms[phase].append((time.perf_counter() - started) * 1000)
+                result = chatbot.answer_question_structured(question)
+                started = time.perf_counter()
+                for part_number, _ in enumerate(chatbot.stream_answer(question)):
+                    if part_number == 0:
+                        first_result_ms.append((time.perf_counter() - started) * 1000)
+            structured_ms.append(result["timings"]["total"] * 1000)
+            for stage, seconds in result["timings"].items():
+                stages[stage].append(seconds * 1000)
+
+    print(f"{len(QUESTIONS)} questions x {args.rounds} rounds, {args.landmarks} landmarks")
+    print(f"answer_question cold: {format_percentiles(percentiles(answer_ms['cold']))}")
+    print(f"answer_question warm: {format_percentiles(percentiles(answer_ms['warm']))}")
+    print(f"retrieval only:       {format_percentiles(percentiles(structured_ms))}")
+    print(f"stream first result:  {format_percentiles(percentiles(first_result_ms))}")
+    for stage, samples in sorted(stages.items()):
+        print(f"  {stage:<18} {format_percentiles(percentiles(samples))}")
+    if embedding_generator.cache is not None:
+        print(f"embedding cache: {embedding_generator.cache.stats()}")
+    print(f"retrieval planner: {chatbot.retriever.planner.stats()}")
+    print(f"fake operations: {client.store.operations}")
+
+if __name__ == "__main__":
+    main()
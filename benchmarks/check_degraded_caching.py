@@ -0,0 +1,61 @@
+"""
+Check that answers retrieved while key-value reads were failing never
+reach the semantic cache. Every question is asked through the threaded,
+asyncio and streaming paths with cold caches; whenever one of its
+landmark reads timed out, the semantic cache must still be empty
+afterwards. Exits with status 1 if a degraded answer was cached.
+
+    python benchmarks/check_degraded_caching.py --kv-error-fraction 0.3
+"""
+import asyncio
+import sys
+from common import QUESTIONS, argument_parser, build_chatbot, quiet
+from bootstrap import Settings
+
+def main():
+    parser = argument_parser("Degraded answers must not be served from the semantic cache")
+    parser.add_argument("--semantic-cache-threshold", type=float, default=0.95)
+    parser.set_defaults(kv_error_fraction=0.3)
+    args = parser.parse_args()
+    # failures are injected once the pipeline is built, ingestion reads its own hashes
+    kv_error_fraction, args.kv_error_fraction = args.kv_error_fraction, 0.0
+
+    settings = Settings()
+    settings.semantic_cache_threshold = args.semantic_cache_threshold
+    with quiet(args.verbose):
+        client, _, chatbot = build_chatbot(args, settings)
+    client.latency.kv_error_fraction = kv_error_fraction
+    retriever = chatbot.retriever
+
+    paths = {
+        "threaded": chatbot.answer_question,
+        "async": lambda question: asyncio.run(chatbot.aanswer_question(question)),
+        "stream": lambda question: "".join(chatbot.stream_answer(question))
+    }
+    degraded = {path: 0 for path in paths}
+    cached = {path: 0 for path in paths}
+    for question in QUESTIONS:
+        for path, answer in paths.items():
+            retriever.semantic_cache.invalidate()
+            retriever.document_cache.clear()
+            errors_before = client.store.operations["kv_errors"]
+            with quiet(args.verbose):
+                answer(question)
+            if client.store.operations["kv_errors"] > errors_before:
+                degraded[path] += 1
+                if retriever.semantic_cache.stats()["entries"]:
+                    cached[path] += 1
+                    print(f"{path}: degraded answer to {question!r} was cached")
+
+    print(f"{len(QUESTIONS)} questions per path, {kv_error_fraction:.0%} of key-value reads failing")
+    for path in paths:
+        print(f"  {path:<9} degraded {degraded[path]}, cached {cached[path]}")
+    print(f"retrieval planner: {retriever.planner.stats()}")
+    if not any(degraded.values()):
+        print("No read failed, raise --kv-error-fraction")
+        sys.exit(1)
+    if any(cached.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
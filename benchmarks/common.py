@@ -0,0 +1,160 @@
+"""
+Shared setup for the benchmark scripts: a synthetic landmark dataset,
+a chatbot pipeline wired to the in-process Capella fake, and latency
+summaries.
+"""
+import argparse
+import contextlib
+import io
+import random
+import tempfile
+import numpy as np
+import _paths  # noqa: F401
+from bootstrap import Settings, build_retriever
+from data.travel_sample_loader import TravelSampleLoader
+from rag.embedding_cache import EmbeddingCache
+from rag.embeddings import EmbeddingGenerator
+from rag.local_keyword_index import LocalKeywordIndex
+from fake_capella import FakeCapellaClient, LatencyProfile
+from fake_embeddings import HashingEmbeddingModel
+
+CITIES = [
+    ("Paris", "France"), ("London", "United Kingdom"), ("Lyon", "France"),
+    ("San Francisco", "United States"), ("Los Angeles", "United States"),
+    ("Edinburgh", "United Kingdom"), ("Marseille", "France"), ("Seattle", "United States")
+]
+TYPES = ["landmark", "hotel", "restaurant", "museum", "park", "bar"]
+ACTIVITIES = ["see", "do", "eat", "drink", "buy", "listen"]
+WORDS = [
+    "historic", "cathedral", "river", "view", "garden", "gallery", "bridge", "market",
+    "castle", "harbour", "tower", "square", "theatre", "beach", "cafe", "wine",
+    "modern", "art", "old", "town", "quiet", "busy", "famous", "local", "family"
+]
+QUESTIONS = [
+    "museums in Paris", "historic castle in Edinburgh", "where to eat in Lyon",
+    "parks with a view in San Francisco", "art gallery in London", "wine bar in Marseille",
+    "family beach in Los Angeles", "famous bridge in Seattle", "old town market", "quiet garden cafe"
+]
+
+def synthetic_landmarks(count, seed=0):
+    """
+    Landmark documents shaped like travel-sample's inventory.landmark.
+
+    Returns:
+        dict: landmark ID -> document
+    """
+    rng = random.Random(seed)
+    landmarks = {}
+    for i in range(count):
+        city, country = rng.choice(CITIES)
+        kind = rng.choice(TYPES)
+        words = rng.sample(WORDS, 4)
+        landmarks[f"landmark_{i}"] = {
+            "id": i,
+            "name": f"{words[0].title()} {words[1].title()} {kind.title()}",
+            "content": f"A {words[2]} {kind} near the {words[3]} in {city}.",
+            "city": city,
+            "country": country,
+            "type": kind,
+            "activity": rng.choice(ACTIVITIES)
+        }
+    return landmarks
+
+def add_common_arguments(parser):
+    parser.add_argument("--landmarks", type=int, default=2000, help="synthetic landmarks to load")
+    parser.add_argument("--query-ms", type=float, default=5.0, help="simulated N1QL latency")
+    parser.add_argument("--kv-ms", type=float, default=1.0, help="simulated key-value latency")
+    parser.add_argument("--search-ms", type=float, default=8.0, help="simulated search service latency")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency jitter as a fraction")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="fraction of calls that are stragglers")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="extra latency of a straggler")
+    parser.add_argument("--kv-error-fraction", type=float, default=0.0, help="fraction of key-value reads that time out")
+    parser.add_argument("--encode-ms", type=float, default=2.0, help="simulated model cost per encode call")
+    parser.add_argument("--encode-ms-per-text", type=float, default=0.5, help="simulated model cost per text")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own log output")
+    return parser
+
+def argument_parser(description):
+    return add_common_arguments(argparse.ArgumentParser(description=description))
+
+def quiet(verbose=False):
+    """Swallow the pipeline's print() logging unless --verbose was given."""
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+def build_client(args):
+    """
+    Fake Capella client with the synthetic landmarks loaded.
+    """
+    client = FakeCapellaClient(latency=LatencyProfile(
+        query_ms=args.query_ms,
+        kv_ms=args.kv_ms,
+        search_ms=args.search_ms,
+        jitter=args.jitter,
+        seed=args.seed,
+        slow_fraction=args.slow_fraction,
+        slow_ms=args.slow_ms,
+        kv_error_fraction=args.kv_error_fraction
+    ))
+    client.connect()
+    landmark_docs = client.store.collection(client.bucket_name, "inventory", "landmark")
+    landmark_docs.update(synthetic_landmarks(args.landmarks, seed=args.seed))
+    client.store.changed(client.bucket_name, "inventory", "landmark")
+    client.create_embedding_collection("inventory", "vectors")
+    return client
+
+def build_embedding_generator(args, cache_size=1024):
+    model = HashingEmbeddingModel(
+        encode_ms_per_batch=args.encode_ms,
+        encode_ms_per_text=args.encode_ms_per_text
+    )
+    cache = EmbeddingCache(max_entries=cache_size) if cache_size else None
+    return EmbeddingGenerator(model_name="hashing-benchmark", cache=cache, model=model)
+
+def build_chatbot(args, settings=None, batch_size=128):
+    """
+    Build the whole pipeline against the fake: load landmarks, embed them,
+    and wire up the retriever and chatbot the way bootstrap does.
+
+    Returns:
+        tuple: (client, embedding_generator, chatbot)
+    """
+    # LangChain is only imported here, parallel ingestion workers re-import
+    # the benchmark script and shouldn't pay for it
+    from rag.chatbot import TravelChatbot
+    settings = settings or Settings()
+    client = build_client(args)
+    embedding_generator = build_embedding_generator(args, cache_size=settings.cache_size)
+    loader = TravelSampleLoader(client, embedding_generator, checkpoint_path=None)
+    loader.add_embeddings_to_vectors_collection(batch_size=batch_size)
+    if settings.batch_window_ms > 0:
+        embedding_generator.enable_batching(max_batch_size=settings.max_query_batch, max_wait_ms=settings.batch_window_ms)
+    local_keyword_index = None
+    if settings.keyword_backend == "local":
+        # KEYWORD_BACKEND=local, built in a scratch folder so runs never reuse a stale index
+        local_keyword_index = LocalKeywordIndex(tempfile.mkdtemp(prefix="keyword-index-"))
+        local_keyword_index.build(client)
+    retriever = build_retriever(settings, client, embedding_generator, local_keyword_index=local_keyword_index)
+    return client, embedding_generator, TravelChatbot(retriever)
+
+def percentiles(samples_ms):
+    """p50/p95/p99, mean and max of a list of latencies in milliseconds."""
+    if not samples_ms:
+        return {"count": 0}
+    values = np.asarray(samples_ms)
+    return {
+        "count": len(samples_ms),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max())
+    }
+
+def format_percentiles(summary):
+    if not summary.get("count"):
+        return "no samples"
+    return (
+        f"n={summary['count']} mean={summary['mean']:.1f}ms p50={summary['p50']:.1f}ms "
+        f"p95={summary['p95']:.1f}ms p99={summary['p99']:.1f}ms max={summary['max']:.1f}ms"
+    )
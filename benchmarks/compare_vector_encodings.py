@@ -0,0 +1,67 @@
+"""
+Storage size and search recall of each embedding encoding.
+Every synthetic landmark is embedded once, stored in each encoding,
+decoded again and searched; recall@k is measured against exact
+float32 search over the same embeddings.
+
+    python benchmarks/compare_vector_encodings.py --landmarks 5000 --k 10
+    python benchmarks/compare_vector_encodings.py --model all-mpnet-base-v2   # real model instead of the hashing one
+"""
+import argparse
+import random
+import numpy as np
+from common import QUESTIONS, quiet, synthetic_landmarks
+from data.travel_sample_loader import TravelSampleLoader
+from rag.embeddings import EmbeddingGenerator
+from rag.vector_codec import ENCODING_FIELDS, decode_embedding, encoded_size
+from fake_embeddings import HashingEmbeddingModel
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def top_k(matrix, queries, k):
+    scores = queries @ matrix.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector document size and recall per embedding encoding")
+    parser.add_argument("--landmarks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200, help="queries besides the fixed benchmark questions")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--model", default=None, help="sentence-transformers model, default is the hashing model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    landmarks = synthetic_landmarks(args.landmarks, seed=args.seed)
+    texts = [TravelSampleLoader._text_for_embedding(doc) for doc in landmarks.values()]
+    rng = random.Random(args.seed)
+    # short queries made of a few words from random landmarks
+    queries = list(QUESTIONS) + [
+        " ".join(rng.sample(rng.choice(texts).split(), 3)) for _ in range(args.queries)
+    ]
+    with quiet(args.verbose):
+        model = None if args.model else HashingEmbeddingModel()
+        generator = EmbeddingGenerator(args.model or "hashing-benchmark", model=model)
+        embeddings = generator.generate_embeddings(texts, batch_size=64)
+        query_matrix = normalize(np.asarray(generator.generate_embeddings(queries, batch_size=64), dtype=np.float32))
+
+    exact = normalize(np.asarray(embeddings, dtype=np.float32))
+    expected = top_k(exact, query_matrix, args.k)
+    baseline_bytes = None
+    print(f"{len(texts)} documents, {len(queries)} queries, dimension {exact.shape[1]}, recall@{args.k}")
+    print(f"{'encoding':<9} {'bytes/doc':>10} {'vs json':>8} {'recall':>8}")
+    for encoding in ENCODING_FIELDS:
+        generator.encoding = encoding
+        documents = [generator._vector_document(doc_id, embedding) for doc_id, embedding in zip(landmarks, embeddings)]
+        size = sum(encoded_size(document) for document in documents) / len(documents)
+        baseline_bytes = baseline_bytes or size
+        decoded = normalize(np.stack([decode_embedding(document) for document in documents]))
+        found = top_k(decoded, query_matrix, args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, expected)])
+        print(f"{encoding:<9} {size:>10.0f} {baseline_bytes / size:>7.1f}x {recall:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,543 @@
+"""
+In-process stand-in for the parts of the Couchbase SDK this project uses:
+N1QL queries, key-value upsert/get (single and multi), and scope.search for
+vector and full text search. Every operation can be given an injected
+latency so benchmarks can model a remote Capella cluster.
+"""
+from couchbase.diagnostics import PingState
+from couchbase.exceptions import DocumentNotFoundException, UnAmbiguousTimeoutException
+import asyncio
+import copy
+import random
+import re
+import threading
+import time
+import numpy as np
+import _paths  # noqa: F401
+from db.capella_client import CapellaClient
+from rag.vector_codec import decode_embedding
+
+class LatencyProfile:
+    """
+    Latency injected per operation type, in milliseconds.
+    jitter is a fraction, e.g. 0.2 varies each call by +/-20%.
+    slow_fraction of the calls take slow_ms longer, the stragglers
+    that make up the tail latency of a real cluster. kv_error_fraction of
+    the key-value reads time out, per key like the SDK reports them.
+    """
+
+    def __init__(self, query_ms=0.0, kv_ms=0.0, search_ms=0.0, jitter=0.0, seed=0, slow_fraction=0.0, slow_ms=0.0,
+                 kv_error_fraction=0.0):
+        self.query_ms = query_ms
+        self.kv_ms = kv_ms
+        self.search_ms = search_ms
+        self.jitter = jitter
+        self.slow_fraction = slow_fraction
+        self.slow_ms = slow_ms
+        self.kv_error_fraction = kv_error_fraction
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay_seconds(self, kind):
+        base = getattr(self, f"{kind}_ms")
+        if not base:
+            return 0.0
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+            straggler = self.slow_fraction and self._random.random() < self.slow_fraction
+        return (base * factor + (self.slow_ms if straggler else 0)) / 1000
+
+    def kv_error(self):
+        """Whether the next key-value read should time out."""
+        if not self.kv_error_fraction:
+            return False
+        with self._lock:
+            return self._random.random() < self.kv_error_fraction
+
+    def sleep(self, kind):
+        delay = self.delay_seconds(kind)
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self, kind):
+        delay = self.delay_seconds(kind)
+        if delay:
+            await asyncio.sleep(delay)
+
+class FakeStore:
+    """
+    Documents of every collection, keyed by (bucket, scope, collection).
+    """
+
+    def __init__(self):
+        self.collections = {}
+        # bumped on every write, so data derived from a collection knows when to rebuild
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.operations = {"query": 0, "kv": 0, "search": 0, "kv_errors": 0}
+
+    def collection(self, bucket, scope, collection):
+        with self.lock:
+            return self.collections.setdefault((bucket, scope, collection), {})
+
+    def changed(self, bucket, scope, collection):
+        """Record a write to a collection."""
+        with self.lock:
+            key = (bucket, scope, collection)
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def version(self, bucket, scope, collection):
+        with self.lock:
+            return self.versions.get((bucket, scope, collection), 0)
+
+    def count(self, kind):
+        with self.lock:
+            self.operations[kind] += 1
+
+class _ContentAs:
+    def __init__(self, content):
+        self._content = content
+
+    def __getitem__(self, content_type):
+        return content_type(copy.deepcopy(self._content))
+
+class FakeGetResult:
+    def __init__(self, key, content):
+        self.key = key
+        self.content_as = _ContentAs(content)
+        self.success = True
+
+class FakeMultiResult:
+    def __init__(self, results, exceptions):
+        self.results = results
+        self.exceptions = exceptions
+        self.all_ok = not exceptions
+
+class FakeCollection:
+    def __init__(self, cluster, bucket_name, scope_name, name):
+        self._cluster = cluster
+        self._docs = cluster.store.collection(bucket_name, scope_name, name)
+        self._key = (bucket_name, scope_name, name)
+        self.name = name
+
+    def _kv(self):
+        self._cluster.store.count("kv")
+        self._cluster.latency.sleep("kv")
+
+    def _read_error(self, key):
+        """The per-key error of a read, None if the document can be returned."""
+        if self._cluster.latency.kv_error():
+            self._cluster.store.count("kv_errors")
+            return UnAmbiguousTimeoutException(message=f"get {key} timed out")
+        if key not in self._docs:
+            return DocumentNotFoundException(message=f"{key} not found")
+        return None
+
+    def _changed(self):
+        self._cluster.store.changed(*self._key)
+
+    def upsert(self, key, value, *opts, **kwargs):
+        self._kv()
+        self._docs[key] = copy.deepcopy(value)
+        self._changed()
+        return FakeGetResult(key, value)
+
+    def upsert_multi(self, keys_and_docs, *opts, **kwargs):
+        # the SDK pipelines multi operations, so one latency for the whole batch
+        self._kv()
+        for key, value in keys_and_docs.items():
+            self._docs[key] = copy.deepcopy(value)
+        self._changed()
+        return FakeMultiResult({key: FakeGetResult(key, value) for key, value in keys_and_docs.items()}, {})
+
+    def get(self, key, *opts, **kwargs):
+        self._kv()
+        error = self._read_error(key)
+        if error is not None:
+            raise error
+        return FakeGetResult(key, self._docs[key])
+
+    def get_multi(self, keys, *opts, **kwargs):
+        self._kv()
+        results = {}
+        exceptions = {}
+        for key in keys:
+            error = self._read_error(key)
+            if error is None:
+                results[key] = FakeGetResult(key, self._docs[key])
+            else:
+                exceptions[key] = error
+        return FakeMultiResult(results, exceptions)
+
+    def exists(self, key, *opts, **kwargs):
+        self._kv()
+        return key in self._docs
+
+    def remove(self, key, *opts, **kwargs):
+        self._kv()
+        if self._docs.pop(key, None) is None:
+            raise DocumentNotFoundException(message=f"{key} not found")
+        self._changed()
+
+    def remove_multi(self, keys, *opts, **kwargs):
+        self._kv()
+        exceptions = {}
+        for key in keys:
+            if self._docs.pop(key, None) is None:
+                exceptions[key] = DocumentNotFoundException(message=f"{key} not found")
+        self._changed()
+        return FakeMultiResult({}, exceptions)
+
+class FakeSearchRow:
+    def __init__(self, doc_id, score, fields):
+        self.id = doc_id
+        self.score = score
+        self.fields = fields
+
+class FakeSearchResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def rows(self):
+        return iter(self._rows)
+
+class FakeScope:
+    def __init__(self, cluster, bucket_name, name):
+        self._cluster = cluster
+        self._bucket_name = bucket_name
+        self.name = name
+
+    def collection(self, name):
+        return FakeCollection(self._cluster, self._bucket_name, self.name, name)
+
+    def search(self, index_name, request, options=None, *args, **kwargs):
+        self._cluster.store.count("search")
+        self._cluster.latency.sleep("search")
+        return FakeSearchResult(self._cluster.search_engine.search(self._bucket_name, self.name, index_name, request, options))
+
+class FakeBucket:
+    def __init__(self, cluster, name):
+        self._cluster = cluster
+        self.name = name
+
+    def scope(self, name):
+        return FakeScope(self._cluster, self.name, name)
+
+    def default_collection(self):
+        return self.scope("_default").collection("_default")
+
+class _PingReport:
+    state = PingState.OK
+
+class _PingResult:
+    endpoints = {"kv": [_PingReport()]}
+
+class _SearchIndex:
+    def __init__(self, name):
+        self.name = name
+
+class _SearchIndexManager:
+    def __init__(self, names):
+        self._names = names
+
+    def get_all_indexes(self, *args, **kwargs):
+        return [_SearchIndex(name) for name in self._names]
+
+class SearchEngine:
+    """
+    Brute-force implementation of the two search indexes the project uses.
+    The decoded, normalized vectors of a collection are kept between
+    searches and rebuilt after the collection is written to, so a search
+    costs one matrix product instead of decoding every vector document.
+    """
+
+    def __init__(self, store, indexes):
+        """
+        Args:
+            indexes (dict): index name -> (collection name, "vector" or "text")
+        """
+        self.store = store
+        self.indexes = indexes
+        # (bucket, scope, collection, field) -> (collection version, keys, normalized matrix)
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def search(self, bucket_name, scope_name, index_name, request, options):
+        if index_name not in self.indexes:
+            raise ValueError(f"Search index {index_name} does not exist")
+        collection_name, kind = self.indexes[index_name]
+        docs = self.store.collection(bucket_name, scope_name, collection_name)
+        limit = (options or {}).get("limit", 10)
+        if kind == "vector":
+            return self._vector_search((bucket_name, scope_name, collection_name), docs, request, limit)
+        return self._text_search(docs, request, limit, (options or {}).get("fields", []))
+
+    def _vector_matrix(self, collection_key, docs, field_name):
+        """Keys and normalized vectors of the documents with field_name, rebuilt only after a write."""
+        # read the version first, a write during the rebuild then triggers another one
+        version = self.store.version(*collection_key)
+        with self._lock:
+            cached = self._matrices.get((*collection_key, field_name))
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        keys = []
+        vectors = []
+        for key, doc in list(docs.items()):
+            if doc.get(field_name) is not None:
+                keys.append(key)
+                vectors.append(decode_embedding(doc))
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self._matrices[(*collection_key, field_name)] = (version, keys, matrix)
+        return keys, matrix
+
+    def _vector_search(self, collection_key, docs, request, limit):
+        vector_query = request.vector_search.queries[0]
+        query = np.asarray(vector_query.vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        keys, matrix = self._vector_matrix(collection_key, docs, vector_query.field_name)
+        if not keys:
+            return []
+        scores = matrix @ query
+        k = min(vector_query.num_candidates or limit, limit, len(keys))
+        top = np.argsort(-scores)[:k]
+        return [FakeSearchRow(keys[i], float(scores[i]), {}) for i in top]
+
+    @staticmethod
+    def _match_terms(encodable):
+        """Collect the words of every match clause in a search query."""
+        terms = set()
+        if isinstance(encodable, dict):
+            for key, value in encodable.items():
+                if key == "match" and isinstance(value, str):
+                    terms.update(re.findall(r"\w+", value.lower()))
+                else:
+                    terms.update(SearchEngine._match_terms(value))
+        elif isinstance(encodable, list):
+            for value in encodable:
+                terms.update(SearchEngine._match_terms(value))
+        return terms
+
+    def _text_search(self, docs, request, limit, fields):
+        terms = self._match_terms(request.search_query.encodable)
+        scored = []
+        for key, doc in list(docs.items()):
+            words = re.findall(r"\w+", " ".join(str(value) for value in doc.values() if isinstance(value, str)).lower())
+            score = sum(1 for word in words if word in terms)
+            if score:
+                scored.append((score, key, doc))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            FakeSearchRow(key, float(score), {field: doc[field] for field in fields if field in doc})
+            for score, key, doc in scored[:limit]
+        ]
+
+class QueryEngine:
+    """
+    Understands the handful of N1QL statement shapes this project runs:
+    CREATE COLLECTION, COUNT(*), and SELECT with META().id, alias.* and
+    alias.field projections, IS NOT MISSING / META().id > $param filters,
+    ORDER BY META().id and LIMIT.
+    """
+
+    _FROM = re.compile(r"FROM\s+`?([\w-]+)`?\.`?(\w+)`?\.`?(\w+)`?(?:\s+AS\s+(\w+))?", re.IGNORECASE)
+    _CREATE = re.compile(r"CREATE\s+COLLECTION\s+`?([\w-]+)`?\.`?(\w+)`?\.`?(\w+)`?", re.IGNORECASE)
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _named_parameters(args, kwargs):
+        params = {}
+        for option in args:
+            if isinstance(option, dict):
+                params.update(option.get("named_parameters") or {})
+        params.update(kwargs.get("named_parameters") or {})
+        params.update({key: value for key, value in kwargs.items() if key != "named_parameters"})
+        return {key.lstrip("$"): value for key, value in params.items()}
+
+    def run(self, statement, args, kwargs):
+        create = self._CREATE.search(statement)
+        if create:
+            self.store.collection(*create.groups())
+            return []
+        match = self._FROM.search(statement)
+        if not match:
+            raise ValueError(f"Fake query engine can't run: {statement}")
+        bucket, scope, collection, _ = match.groups()
+        docs = self.store.collection(bucket, scope, collection)
+        params = self._named_parameters(args, kwargs)
+
+        items = sorted(list(docs.items()), key=lambda item: item[0])
+        where = re.search(r"WHERE\s+(.*?)(?:ORDER BY|LIMIT|$)", statement, re.IGNORECASE | re.DOTALL)
+        if where:
+            for condition in re.split(r"\s+AND\s+", where.group(1).strip(), flags=re.IGNORECASE):
+                items = self._filter(items, condition.strip(), params)
+
+        if re.search(r"COUNT\(\*\)", statement, re.IGNORECASE):
+            alias = re.search(r"COUNT\(\*\)\s+as\s+(\w+)", statement, re.IGNORECASE)
+            return [{alias.group(1) if alias else "$1": len(items)}]
+
+        limit = re.search(r"LIMIT\s+(\$?\w+)", statement, re.IGNORECASE)
+        if limit:
+            value = limit.group(1)
+            items = items[:int(params[value[1:]] if value.startswith("$") else value)]
+
+        select = re.search(r"SELECT\s+(.*?)\s+FROM", statement, re.IGNORECASE | re.DOTALL).group(1)
+        projections = [part.strip() for part in select.split(",")]
+        return [self._project(key, doc, projections) for key, doc in items]
+
+    @staticmethod
+    def _filter(items, condition, params):
+        missing = re.match(r"\w+\.(\w+)\s+IS\s+NOT\s+MISSING", condition, re.IGNORECASE)
+        if missing:
+            return [(key, doc) for key, doc in items if missing.group(1) in doc]
+        after = re.match(r"META\(\w*\)\.id\s*>\s*\$(\w+)", condition, re.IGNORECASE)
+        if after:
+            return [(key, doc) for key, doc in items if key > params[after.group(1)]]
+        raise ValueError(f"Fake query engine can't filter on: {condition}")
+
+    @staticmethod
+    def _project(key, doc, projections):
+        row = {}
+        for projection in projections:
+            meta = re.match(r"META\(\w*\)\.id(?:\s+as\s+(\w+))?", projection, re.IGNORECASE)
+            if meta:
+                row[meta.group(1) or "id"] = key
+            elif projection.endswith(".*"):
+                row.update(copy.deepcopy(doc))
+            else:
+                field = projection.split(".", 1)[-1].split()[0]
+                if field in doc:
+                    row[field] = copy.deepcopy(doc[field])
+        return row
+
+class FakeCluster:
+    """
+    Sync cluster stand-in sharing a FakeStore with its async counterpart.
+    """
+
+    def __init__(self, store, latency, search_indexes):
+        self.store = store
+        self.latency = latency
+        self.search_engine = SearchEngine(store, search_indexes)
+        self.query_engine = QueryEngine(store)
+        self._search_index_names = list(search_indexes)
+
+    def bucket(self, name):
+        return FakeBucket(self, name)
+
+    def query(self, statement, *args, **kwargs):
+        self.store.count("query")
+        self.latency.sleep("query")
+        return self.query_engine.run(statement, args, kwargs)
+
+    def ping(self, *args, **kwargs):
+        return _PingResult()
+
+    def wait_until_ready(self, *args, **kwargs):
+        pass
+
+    def search_indexes(self):
+        return _SearchIndexManager(self._search_index_names)
+
+    def close(self):
+        pass
+
+class _AsyncQueryResult:
+    def __init__(self, cluster, statement, args, kwargs):
+        self._cluster = cluster
+        self._statement = statement
+        self._args = args
+        self._kwargs = kwargs
+
+    async def __aiter__(self):
+        self._cluster.store.count("query")
+        await self._cluster.latency.asleep("query")
+        for row in self._cluster.query_engine.run(self._statement, self._args, self._kwargs):
+            yield row
+
+class _AsyncSearchResult:
+    def __init__(self, scope, index_name, request, options):
+        self._scope = scope
+        self._index_name = index_name
+        self._request = request
+        self._options = options
+
+    async def rows(self):
+        cluster = self._scope._cluster
+        cluster.store.count("search")
+        await cluster.latency.asleep("search")
+        for row in cluster.search_engine.search(
+            self._scope._bucket_name, self._scope.name, self._index_name, self._request, self._options
+        ):
+            yield row
+
+class AsyncFakeCollection(FakeCollection):
+    async def get(self, key, *opts, **kwargs):
+        self._cluster.store.count("kv")
+        await self._cluster.latency.asleep("kv")
+        error = self._read_error(key)
+        if error is not None:
+            raise error
+        return FakeGetResult(key, self._docs[key])
+
+class AsyncFakeScope(FakeScope):
+    def collection(self, name):
+        return AsyncFakeCollection(self._cluster, self._bucket_name, self.name, name)
+
+    def search(self, index_name, request, options=None, *args, **kwargs):
+        return _AsyncSearchResult(self, index_name, request, options)
+
+class AsyncFakeBucket(FakeBucket):
+    def scope(self, name):
+        return AsyncFakeScope(self._cluster, self.name, name)
+
+    async def on_connect(self):
+        pass
+
+class AsyncFakeCluster(FakeCluster):
+    """
+    Asyncio cluster stand-in, mirrors the acouchbase surface the retriever uses.
+    """
+
+    def bucket(self, name):
+        return AsyncFakeBucket(self, name)
+
+    def query(self, statement, *args, **kwargs):
+        return _AsyncQueryResult(self, statement, args, kwargs)
+
+    async def ping(self, *args, **kwargs):
+        return _PingResult()
+
+    async def wait_until_ready(self, *args, **kwargs):
+        pass
+
+    async def close(self):
+        pass
+
+class FakeCapellaClient(CapellaClient):
+    """
+    CapellaClient whose clusters are in-process fakes. Everything above
+    the cluster handle (reconnects, health checks, query helpers) is the
+    real client code.
+    """
+
+    def __init__(self, store=None, latency=None, bucket_name="travel-sample", search_indexes=None):
+        super().__init__("fake-capella", "benchmark", "benchmark", bucket_name)
+        self.store = store or FakeStore()
+        self.latency = latency or LatencyProfile()
+        self.search_indexes = search_indexes or {
+            "landmarks-vector-index": ("vectors", "vector"),
+            "landmarks-text-index": ("landmark", "text")
+        }
+
+    def _open_cluster(self):
+        cluster = FakeCluster(self.store, self.latency, self.search_indexes)
+        return cluster, cluster.bucket(self.bucket_name)
+
+    async def ensure_connected_async(self):
+        if self.async_cluster is None:
+            self.async_cluster = AsyncFakeCluster(self.store, self.latency, self.search_indexes)
+            self.async_bucket = self.async_cluster.bucket(self.bucket_name)
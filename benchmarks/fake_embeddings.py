@@ -0,0 +1,58 @@
+"""
+Deterministic stand-in for a SentenceTransformer model. A text's embedding
+is the sum of a pseudo-random vector per word (seeded by the word), so texts
+sharing words are close together and every run produces the same dense
+vectors without downloading a model.
+"""
+import re
+import time
+import zlib
+import numpy as np
+
+class HashingEmbeddingModel:
+    """
+    Implements the parts of the SentenceTransformer interface
+    EmbeddingGenerator uses: encode() and get_sentence_embedding_dimension().
+    """
+
+    def __init__(self, dimension=768, encode_ms_per_batch=0.0, encode_ms_per_text=0.0):
+        """
+        Args:
+            dimension (int): Length of each embedding
+            encode_ms_per_batch (float): Simulated fixed cost of one encode() call
+            encode_ms_per_text (float): Simulated extra cost per text in a call
+        """
+        self.dimension = dimension
+        self.encode_ms_per_batch = encode_ms_per_batch
+        self.encode_ms_per_text = encode_ms_per_text
+        self.encode_calls = 0
+        self._word_vectors = {}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _word_vector(self, word):
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            # a dense pseudo-random direction per word, seeded by the word itself
+            seed = zlib.crc32(word.encode("utf-8"))
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            self._word_vectors[word] = vector
+        return vector
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector += self._word_vector(word)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        self.encode_calls += 1
+        cost_ms = self.encode_ms_per_batch + self.encode_ms_per_text * len(texts)
+        if cost_ms:
+            time.sleep(cost_ms / 1000)
+        embeddings = np.stack([self._embed(text) for text in texts]) if texts else np.zeros((0, self.dimension), dtype=np.float32)
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,31 @@
+"""
+Worker setup for parallel ingestion benchmarks. Kept apart from common.py
+so worker processes don't import LangChain, which they never use.
+"""
+import argparse
+import _paths  # noqa: F401
+from rag.embeddings import EmbeddingGenerator
+from fake_capella import FakeCapellaClient, LatencyProfile
+from fake_embeddings import HashingEmbeddingModel
+
+def fake_worker_setup(arguments):
+    """
+    Every worker process gets its own fake store, so only the counts are
+    aggregated. Use with functools.partial(fake_worker_setup, vars(args)).
+
+    Returns:
+        tuple: (FakeCapellaClient, EmbeddingGenerator)
+    """
+    args = argparse.Namespace(**arguments)
+    client = FakeCapellaClient(latency=LatencyProfile(
+        query_ms=args.query_ms,
+        kv_ms=args.kv_ms,
+        search_ms=args.search_ms,
+        jitter=args.jitter,
+        seed=args.seed,
+        slow_fraction=args.slow_fraction,
+        slow_ms=args.slow_ms
+    ))
+    client.connect()
+    model = HashingEmbeddingModel(encode_ms_per_batch=args.encode_ms, encode_ms_per_text=args.encode_ms_per_text)
+    return client, EmbeddingGenerator(model_name="hashing-benchmark", model=model)
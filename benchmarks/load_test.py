@@ -0,0 +1,96 @@
+"""
+Multi-user load test: concurrent users ask random questions for a fixed
+duration, through the threaded (answer_question) or asyncio
+(aanswer_question) path. Reports throughput and p50/p95/p99 latency.
+
+    python benchmarks/load_test.py --users 16 --duration 20
+    python benchmarks/load_test.py --users 64 --mode async
+"""
+import asyncio
+import random
+import threading
+import time
+from common import QUESTIONS, argument_parser, build_chatbot, format_percentiles, percentiles, quiet
+from telemetry.metrics import metrics
+
+def run_threads(chatbot, args):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def user(user_id):
+        rng = random.Random(args.seed + user_id)
+        while time.perf_counter() < deadline:
+            question = rng.choice(QUESTIONS)
+            started = time.perf_counter()
+            try:
+                chatbot.answer_question(question)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+            if args.think_ms:
+                time.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+async def run_async(chatbot, args):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + args.duration
+
+    async def user(user_id):
+        rng = random.Random(args.seed + user_id)
+        while time.perf_counter() < deadline:
+            question = rng.choice(QUESTIONS)
+            started = time.perf_counter()
+            try:
+                await chatbot.aanswer_question(question)
+            except Exception as e:
+                errors.append(e)
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if args.think_ms:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+    await asyncio.gather(*(user(i) for i in range(args.users)))
+    return latencies, errors
+
+def main():
+    parser = argument_parser("Concurrent load test against the in-process Capella fake")
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a user's questions")
+    parser.add_argument("--mode", choices=["threads", "async"], default="threads")
+    args = parser.parse_args()
+
+    with quiet(args.verbose):
+        client, embedding_generator, chatbot = build_chatbot(args)
+        started = time.perf_counter()
+        if args.mode == "async":
+            latencies, errors = asyncio.run(run_async(chatbot, args))
+        else:
+            latencies, errors = run_threads(chatbot, args)
+        elapsed = time.perf_counter() - started
+
+    print(f"{args.users} {args.mode} users for {elapsed:.1f}s, {args.landmarks} landmarks")
+    print(f"throughput: {len(latencies) / elapsed:.1f} answers/s ({len(errors)} errors)")
+    print(f"latency: {format_percentiles(percentiles(latencies))}")
+    if embedding_generator.batcher is not None:
+        print(f"embedding batches: {embedding_generator.batcher.stats()['batch_size']}")
+    print(f"fake operations: {client.store.operations}")
+    counters = metrics.snapshot()["counters"]
+    capella_counters = {name: value for name, value in counters.items() if name.startswith("capella_")}
+    if capella_counters:
+        print(f"capella call counters: {capella_counters}")
+
+if __name__ == "__main__":
+    main()
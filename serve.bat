@@ -0,0 +1,11 @@
+@echo off
+REM Start the HTTP server on Windows
+
+REM Activate virtual environment if not already activated
+if "%VIRTUAL_ENV%"=="" (
+    echo Activating virtual environment...
+    call venv\Scripts\activate
+)
+
+REM Run the server
+python src\server.py
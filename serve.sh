@@ -0,0 +1,11 @@
+#!/bin/bash
+# Start the HTTP server on Unix-based systems (Mac, Linux)
+
+# Activate virtual environment if not already activated
+if [ -z "$VIRTUAL_ENV" ]; then
+    echo "Activating virtual environment..."
+    source venv/bin/activate
+fi
+
+# Run the server
+python src/server.py
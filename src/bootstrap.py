@@ -0,0 +1,316 @@
+from contextlib import contextmanager
+import importlib
+import os
+import threading
+import time
+from db.capella_client import CapellaClient
+from db.hedging import HedgedCaller
+from rag.embeddings import EmbeddingGenerator
+from rag.embedding_server import EmbeddingClient
+from rag.embedding_cache import EmbeddingCache
+from rag.local_vector_index import LocalVectorIndex
+from rag.local_keyword_index import LocalKeywordIndex
+from rag.document_cache import DocumentCache
+from rag.semantic_cache import SemanticCache
+from rag.retrieval_planner import RetrievalPlanner
+from rag.vector_codec import CAPELLA_ENCODINGS, check_encoding, vector_field
+from telemetry.metrics import metrics
+
+# LangChain-based modules, imported in the background while connecting, see preload_modules()
+HEAVY_MODULES = ["rag.retriever", "rag.chatbot"]
+
+def _optional_float(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+class Settings:
+    """
+    Runtime settings read from environment variables (a .env file is
+    loaded by the entry points). Shared by the interactive chatbot
+    and the HTTP server so both build the pipeline the same way.
+    """
+
+    def __init__(self):
+        # Capella connection details
+        self.endpoint = os.getenv("DEV_CAPELLA_ENDPOINT")
+        self.username = os.getenv("DEV_CAPELLA_ADMIN_USER")
+        self.password = os.getenv("DEV_CAPELLA_ADMIN_PASSWORD")
+        self.bucket_name = os.getenv("DEV_CAPELLA_BUCKET_NAME")
+        self.health_check_seconds = int(os.getenv("CAPELLA_HEALTH_CHECK_SECONDS", "30"))
+        # after a failed reconnect, requests fail fast for this long while the health checks keep retrying
+        self.reconnect_cooldown_seconds = float(os.getenv("CAPELLA_RECONNECT_COOLDOWN_SECONDS", "10"))
+        # can specify any models supported here: https://www.sbert.net/docs/sentence_transformer/pretrained_models.html
+        self.model_name = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+        # "torch", or "onnx" / "onnx-int8" to run the model through ONNX Runtime on CPU
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+        self.onnx_dir = os.getenv("EMBEDDING_ONNX_DIR", ".onnx_models")
+        self.quantization = os.getenv("EMBEDDING_QUANTIZATION", "avx2").lower()
+        self.parity_min_cosine = float(os.getenv("EMBEDDING_PARITY_MIN_COSINE", "0.98"))
+        # number of landmarks encoded and upserted per round-trip during ingestion
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        # worker processes used for ingestion, each loads its own model unless EMBEDDING_SERVER_SOCKET is set (1 ingests in this process)
+        self.ingest_workers = int(os.getenv("INGEST_WORKERS", "1"))
+        # landmarks read per query during ingestion, pages are fetched as the previous one is embedded
+        self.ingest_page_size = int(os.getenv("INGEST_PAGE_SIZE", "1000"))
+        # how embeddings are stored in vector documents: json, base64, float16 or int8
+        self.embedding_encoding = check_encoding(os.getenv("EMBEDDING_ENCODING", "json").lower())
+        self.cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+        self.cache_path = os.getenv("EMBEDDING_CACHE_PATH") or None
+        self.cache_disk_size = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "20000"))
+        # gather concurrent query embeddings for up to this many milliseconds (0 disables batching)
+        self.batch_window_ms = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "0"))
+        self.max_query_batch = int(os.getenv("EMBEDDING_MAX_QUERY_BATCH", "32"))
+        # Unix socket of a shared embedding server (src/serve_embeddings.py), unset loads the model in this process
+        self.embedding_server_socket = os.getenv("EMBEDDING_SERVER_SOCKET") or None
+        self.embedding_server_timeout_seconds = float(os.getenv("EMBEDDING_SERVER_TIMEOUT_SECONDS", "30"))
+        # "capella" searches the Capella vector index, "local" searches an in-process copy of the embeddings
+        self.vector_backend = os.getenv("VECTOR_BACKEND", "capella").lower()
+        self.local_vector_index_dir = os.getenv("LOCAL_VECTOR_INDEX_DIR", ".vector_index")
+        self.local_vector_index_refresh_seconds = int(os.getenv("LOCAL_VECTOR_INDEX_REFRESH_SECONDS", "0"))
+        # "capella" uses the Capella full text search index, "local" an in-process BM25 index of the landmarks
+        self.keyword_backend = os.getenv("KEYWORD_BACKEND", "capella").lower()
+        self.local_keyword_index_dir = os.getenv("LOCAL_KEYWORD_INDEX_DIR", ".keyword_index")
+        # landmark documents kept in memory after the first fetch
+        self.document_cache_size = int(os.getenv("DOCUMENT_CACHE_SIZE", "10000"))
+        self.document_cache_ttl_seconds = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "3600"))
+        # answer near-identical questions from recent results (disabled unless a threshold is set)
+        self.semantic_cache_threshold = _optional_float("SEMANTIC_CACHE_THRESHOLD")
+        self.semantic_cache_size = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+        self.semantic_cache_ttl_seconds = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "600"))
+        # optional per-branch timeouts so one slow search service can't stall an answer
+        self.vector_timeout_seconds = _optional_float("VECTOR_SEARCH_TIMEOUT_SECONDS")
+        self.keyword_timeout_seconds = _optional_float("KEYWORD_SEARCH_TIMEOUT_SECONDS")
+        # per-operation deadlines for the Capella calls of a question (unset waits for the cluster-wide timeouts)
+        self.vector_search_deadline_seconds = _optional_float("CAPELLA_VECTOR_SEARCH_DEADLINE_SECONDS")
+        self.landmark_fetch_deadline_seconds = _optional_float("CAPELLA_LANDMARK_FETCH_DEADLINE_SECONDS")
+        self.keyword_search_deadline_seconds = _optional_float("CAPELLA_KEYWORD_SEARCH_DEADLINE_SECONDS")
+        # send a second attempt once a call is slower than this percentile of recent calls (unset never hedges)
+        self.hedge_percentile = _optional_float("CAPELLA_HEDGE_PERCENTILE")
+        # stop calling an operation for a while after this many failures in a row (0 disables)
+        self.circuit_breaker_failures = int(os.getenv("CAPELLA_CIRCUIT_BREAKER_FAILURES", "5"))
+        self.circuit_breaker_reset_seconds = float(os.getenv("CAPELLA_CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+        # keyword search fallback: it runs when vector search returns fewer hits than this (default
+        # NUM_CANDIDATES), a lower best score, or a smaller lead of the best hit over the second
+        self.retrieval_min_results = int(os.getenv("RETRIEVAL_MIN_RESULTS")) if os.getenv("RETRIEVAL_MIN_RESULTS") else None
+        self.retrieval_min_top_score = _optional_float("RETRIEVAL_MIN_TOP_SCORE")
+        self.retrieval_min_score_gap = _optional_float("RETRIEVAL_MIN_SCORE_GAP")
+        # log the per-stage breakdown of answers slower than this (unset never logs)
+        self.slow_request_seconds = _optional_float("SLOW_REQUEST_SECONDS")
+        # retrieval defaults for the non-interactive server
+        self.num_candidates = int(os.getenv("NUM_CANDIDATES", "3"))
+        self.keyword_search = os.getenv("KEYWORD_SEARCH", "false").lower() in ("1", "true", "yes", "y")
+        # HTTP server
+        self.server_host = os.getenv("SERVER_HOST", "0.0.0.0")
+        self.server_port = int(os.getenv("SERVER_PORT", "8080"))
+        # questions answered at once, the rest wait up to the queue timeout and then get a 503
+        self.server_max_concurrency = int(os.getenv("SERVER_MAX_CONCURRENCY", "8"))
+        self.server_queue_timeout_seconds = float(os.getenv("SERVER_QUEUE_TIMEOUT_SECONDS", "5"))
+
+    def missing_connection_settings(self):
+        """Names of the required connection variables that are not set."""
+        required = {
+            "DEV_CAPELLA_ENDPOINT": self.endpoint,
+            "DEV_CAPELLA_ADMIN_USER": self.username,
+            "DEV_CAPELLA_ADMIN_PASSWORD": self.password,
+            "DEV_CAPELLA_BUCKET_NAME": self.bucket_name
+        }
+        return [name for name, value in required.items() if not value]
+
+class StartupReport:
+    """
+    Wall-clock time of each startup phase. Phases run in the
+    background overlap with the others, so they don't add up to the total.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # (name, seconds, ran in the background)
+        self.phases = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, background=False):
+        if seconds is None:
+            return
+        with self._lock:
+            self.phases.append((name, seconds, background))
+        metrics.observe("startup_phase_seconds", seconds, phase=name)
+
+    @contextmanager
+    def phase(self, name, background=False):
+        """Time the block as one startup phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, background)
+
+    def report(self, include_total=True):
+        """
+        Print the time spent in each phase. Leave out the total when
+        startup waited on user input, which would dominate it.
+        """
+        with self._lock:
+            phases = list(self.phases)
+        if include_total:
+            print(f"Startup took {time.perf_counter() - self.started:.2f}s:")
+        else:
+            print("Startup phases:")
+        for name, seconds, background in phases:
+            print(f"  {name}: {seconds:.2f}s{' (background)' if background else ''}")
+
+def preload_modules(startup, module_names=HEAVY_MODULES):
+    """
+    Import heavy modules in a background thread so the import
+    overlaps with connecting to the cluster.
+
+    Returns:
+        Thread: The importing thread
+    """
+    def load():
+        with startup.phase("imports", background=True):
+            for name in module_names:
+                try:
+                    importlib.import_module(name)
+                except Exception as e:
+                    # the real import later reports the error properly
+                    print(f"Error preloading {name}: {e}")
+
+    thread = threading.Thread(target=load, name="preload-imports", daemon=True)
+    thread.start()
+    return thread
+
+def build_client(settings):
+    """
+    Connect to Capella and start background health checks.
+    """
+    client = CapellaClient(
+        endpoint=settings.endpoint,
+        username=settings.username,
+        password=settings.password,
+        bucket_name=settings.bucket_name,
+        reconnect_cooldown_seconds=settings.reconnect_cooldown_seconds
+    )
+    client.connect(timeout_seconds=15, apply_wan_profile=True)
+    # one long-lived connection, checked in the background and replaced only if it breaks
+    client.start_health_checks(interval_seconds=settings.health_check_seconds)
+    return client
+
+def build_embedding_generator(settings):
+    """
+    Set up the embedding generator with the query-embedding cache
+    (and optionally the micro-batching scheduler) in front of it.
+    The model itself is loaded on first use or by load_in_background(),
+    unless an embedding server is configured, which then encodes for it.
+    """
+    # repeated questions reuse their query embedding instead of re-encoding it
+    embedding_cache = EmbeddingCache(
+        max_entries=settings.cache_size,
+        persist_path=settings.cache_path,
+        max_disk_entries=settings.cache_disk_size
+    )
+    model = None
+    if settings.embedding_server_socket:
+        print(f"Using the embedding server on {settings.embedding_server_socket}")
+        model = EmbeddingClient(
+            settings.embedding_server_socket,
+            model_name=settings.model_name,
+            timeout_seconds=settings.embedding_server_timeout_seconds
+        )
+    embedding_generator = EmbeddingGenerator(
+        model_name=settings.model_name,
+        cache=embedding_cache,
+        model=model,
+        encoding=settings.embedding_encoding,
+        backend=settings.embedding_backend,
+        onnx_dir=settings.onnx_dir,
+        quantization=settings.quantization,
+        parity_min_cosine=settings.parity_min_cosine
+    )
+    if settings.batch_window_ms > 0:
+        embedding_generator.enable_batching(max_batch_size=settings.max_query_batch, max_wait_ms=settings.batch_window_ms)
+    return embedding_generator
+
+def build_local_vector_index(settings, client, rebuild=False):
+    """
+    Load (or build) the local vector index when the local backend is selected.
+
+    Returns:
+        LocalVectorIndex: The index, or None for the Capella backend
+    """
+    if settings.vector_backend != "local":
+        return None
+    local_vector_index = LocalVectorIndex(settings.local_vector_index_dir)
+    # rebuild when embeddings changed, otherwise reuse the index from the last run
+    if rebuild or not local_vector_index.load():
+        print("Building local vector index from vectors collection...")
+        local_vector_index.build(client)
+    if settings.local_vector_index_refresh_seconds > 0:
+        local_vector_index.start_auto_refresh(client, settings.local_vector_index_refresh_seconds)
+    return local_vector_index
+
+def build_local_keyword_index(settings, client, rebuild=False):
+    """
+    Load (or build) the local keyword index when the local keyword backend is selected.
+
+    Returns:
+        LocalKeywordIndex: The index, or None for the Capella backend
+    """
+    if settings.keyword_backend != "local":
+        return None
+    local_keyword_index = LocalKeywordIndex(settings.local_keyword_index_dir)
+    # rebuild after ingestion ran, landmarks may have changed, otherwise reuse the index from the last run
+    if rebuild or not local_keyword_index.load():
+        print("Building local keyword index from landmark collection...")
+        local_keyword_index.build(client, page_size=settings.ingest_page_size)
+    return local_keyword_index
+
+def build_retriever(settings, client, embedding_generator, local_vector_index=None, num_candidates=None, keyword_search=None, local_keyword_index=None):
+    """
+    Build the CouchbaseRetriever, using the settings for anything not passed in.
+    """
+    from rag.retriever import CouchbaseRetriever
+    if settings.vector_backend == "capella" and settings.embedding_encoding not in CAPELLA_ENCODINGS:
+        print(
+            f"Warning: Capella vector indexes can't read {settings.embedding_encoding} embeddings, "
+            "use VECTOR_BACKEND=local or EMBEDDING_ENCODING=json/base64"
+        )
+    return CouchbaseRetriever(
+        client,
+        embedding_generator,
+        vector_search_index_name="landmarks-vector-index",
+        collection_name="landmark",
+        num_candidates=settings.num_candidates if num_candidates is None else num_candidates,
+        keyword_search=settings.keyword_search if keyword_search is None else keyword_search,
+        text_search_index_name="landmarks-text-index",
+        vector_backend=settings.vector_backend,
+        local_vector_index=local_vector_index,
+        keyword_backend=settings.keyword_backend,
+        local_keyword_index=local_keyword_index,
+        hedged_caller=HedgedCaller(
+            deadlines={
+                "vector_search": settings.vector_search_deadline_seconds,
+                "landmark_fetch": settings.landmark_fetch_deadline_seconds,
+                "keyword_search": settings.keyword_search_deadline_seconds
+            },
+            hedge_percentile=settings.hedge_percentile,
+            breaker_failures=settings.circuit_breaker_failures,
+            breaker_reset_seconds=settings.circuit_breaker_reset_seconds
+        ),
+        vector_timeout_seconds=settings.vector_timeout_seconds,
+        keyword_timeout_seconds=settings.keyword_timeout_seconds,
+        vector_field=vector_field(settings.embedding_encoding),
+        document_cache=DocumentCache(
+            max_entries=settings.document_cache_size,
+            ttl_seconds=settings.document_cache_ttl_seconds
+        ),
+        semantic_cache=SemanticCache(
+            threshold=settings.semantic_cache_threshold,
+            max_entries=settings.semantic_cache_size,
+            ttl_seconds=settings.semantic_cache_ttl_seconds
+        ) if settings.semantic_cache_threshold else None,
+        planner=RetrievalPlanner(
+            min_results=settings.retrieval_min_results,
+            min_top_score=settings.retrieval_min_top_score,
+            min_score_gap=settings.retrieval_min_score_gap
+        )
+    )
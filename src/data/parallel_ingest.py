@@ -0,0 +1,173 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+import os
+import sys
+import time
+from data.travel_sample_loader import TravelSampleLoader
+
+# client and embedding generator of this worker process, set by _init_worker
+_worker = {}
+
+def settings_worker_setup():
+    """
+    Default worker setup: a Capella connection and embedding model built
+    from the same environment variables as the main process.
+
+    Returns:
+        tuple: (CapellaClient, EmbeddingGenerator)
+    """
+    from dotenv import load_dotenv
+    from bootstrap import Settings, build_embedding_generator
+    from db.capella_client import CapellaClient
+    load_dotenv()
+    settings = Settings()
+    client = CapellaClient(settings.endpoint, settings.username, settings.password, settings.bucket_name)
+    client.connect(timeout_seconds=15, apply_wan_profile=True)
+    return client, build_embedding_generator(settings)
+
+def _init_worker(worker_setup, threads_per_worker):
+    """Runs once in each worker process."""
+    client, embedding_generator = worker_setup()
+    embedding_generator.load_model()
+    if "torch" in sys.modules:
+        # without a limit every worker's torch would use every core
+        sys.modules["torch"].set_num_threads(threads_per_worker)
+    _worker["client"] = client
+    _worker["embedding_generator"] = embedding_generator
+
+def _ingest_batch(batch_index, rows, scope_name, collection_name):
+    """
+    Embed and store one batch of landmark rows in a worker process.
+
+    Returns:
+        dict: Counts and timings of the batch, aggregated by the parent
+    """
+    embedding_generator = _worker["embedding_generator"]
+    doc_ids = [row.get("id") for row in rows]
+    texts = [TravelSampleLoader._text_for_embedding(row) for row in rows]
+    stats = {"batch_index": batch_index, "stored": 0, "failed": 0, "encode_seconds": 0.0, "write_seconds": 0.0}
+    try:
+        started = time.perf_counter()
+        embeddings = embedding_generator.generate_embeddings(texts, batch_size=len(texts))
+        stats["encode_seconds"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        failed_ids = embedding_generator.store_embeddings(
+            _worker["client"],
+            dict(zip(doc_ids, embeddings)),
+            scope_name=scope_name,
+            collection_name=collection_name,
+            content_hashes={doc_id: TravelSampleLoader.content_hash(text) for doc_id, text in zip(doc_ids, texts)}
+        )
+        stats["write_seconds"] = time.perf_counter() - started
+    except Exception as e:
+        print(f"Error storing embeddings for batch starting at {doc_ids[0]}: {e}")
+        stats["failed"] = len(rows)
+        return stats
+    stats["stored"] = len(rows) - len(failed_ids)
+    stats["failed"] = len(failed_ids)
+    return stats
+
+class ProgressReporter:
+    """
+    Aggregates the results of all workers and prints progress at most
+    every interval_seconds.
+    """
+
+    def __init__(self, interval_seconds=2.0):
+        self.interval_seconds = interval_seconds
+        self.stored = 0
+        self.failed = 0
+        self.encode_seconds = 0.0
+        self.write_seconds = 0.0
+        self.started = time.perf_counter()
+        # when the first batch came back, i.e. roughly how long the workers took to start
+        self.first_result_seconds = None
+        self._last_report = 0.0
+
+    def update(self, stats):
+        if self.first_result_seconds is None:
+            self.first_result_seconds = time.perf_counter() - self.started
+        self.stored += stats["stored"]
+        self.failed += stats["failed"]
+        self.encode_seconds += stats["encode_seconds"]
+        self.write_seconds += stats["write_seconds"]
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval_seconds:
+            self._last_report = now
+            print(f"Added {self.stored} embeddings ({self.stored / (now - self.started):.1f} docs/s)...")
+
+    def summary(self, workers, batch_size):
+        elapsed = time.perf_counter() - self.started
+        print(f"Successfully added embeddings for {self.stored} landmarks ({self.failed} failed)")
+        print(
+            f"Throughput: {self.stored / elapsed if elapsed else 0:.1f} docs/s over {elapsed:.2f}s with {workers} workers "
+            f"(encode {self.encode_seconds:.2f}s, write {self.write_seconds:.2f}s summed over workers, batch size {batch_size}, "
+            f"first batch after {self.first_result_seconds or 0:.2f}s)"
+        )
+
+def ingest_in_parallel(loader, batches, batch_size, workers, mode, worker_setup=None, scope_name="inventory", collection_name="vectors"):
+    """
+    Embed and store batches of landmark rows in a pool of worker processes,
+    each with its own model and Capella connection. Batches are pulled from
+    the iterable as workers free up, at most two per worker are in flight,
+    and the checkpoint only advances past batches that were stored without
+    errors along with every batch before them.
+
+    Args:
+        loader (TravelSampleLoader): Loader whose checkpoint is updated
+        batches (iterable): Lists of landmark rows, ordered by ID
+        batch_size (int): Landmarks per batch
+        workers (int): Worker processes
+        mode (str): Checkpoint mode of the run
+        worker_setup (callable): Picklable function returning (client, embedding_generator)
+            in a worker, defaults to settings_worker_setup
+
+    Returns:
+        int: Number of embeddings stored
+    """
+    batches = iter(batches)
+    first_batch = next(batches, None)
+    if first_batch is None:
+        print("No landmarks to embed")
+        return 0
+    progress = ProgressReporter()
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    # spawn instead of fork, the parent already runs Couchbase and torch threads
+    context = multiprocessing.get_context("spawn")
+    # batch index -> last landmark ID, for batches submitted but not yet checkpointed
+    last_ids = {}
+    done = set()
+    checkpointed = -1
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(worker_setup or settings_worker_setup, threads_per_worker)
+    ) as pool:
+        pending = set()
+        next_batch = 0
+        batch = first_batch
+        while batch is not None or pending:
+            while batch is not None and len(pending) < workers * 2:
+                last_ids[next_batch] = batch[-1].get("id")
+                pending.add(pool.submit(_ingest_batch, next_batch, batch, scope_name, collection_name))
+                next_batch += 1
+                batch = next(batches, None)
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stats = future.result()
+                progress.update(stats)
+                # a batch with failed writes is never done, so the checkpoint stays before it
+                if not stats["failed"]:
+                    done.add(stats["batch_index"])
+            # batches finish out of order, only checkpoint the contiguous prefix
+            last_id = None
+            while checkpointed + 1 in done:
+                checkpointed += 1
+                done.discard(checkpointed)
+                last_id = last_ids.pop(checkpointed)
+            if last_id is not None:
+                loader._save_checkpoint(mode, last_id)
+    progress.summary(workers, batch_size)
+    return progress.stored
@@ -1,51 +1,349 @@
+from itertools import islice
+import hashlib
+import json
+import os
+import time
+from rag.vector_codec import decode_embedding, encode_embedding, encoded_size
 
 
+# one page of landmarks to embed, see CapellaClient.paginate_query
+LANDMARKS_PAGE_QUERY = """
+SELECT META(l).id AS id, l.name, l.content, l.country, l.city, l.type, l.activity
+FROM `travel-sample`.inventory.landmark AS l
+WHERE META(l).id > $last_id
+ORDER BY META(l).id
+LIMIT $page_size
+"""
+
+# one page of stored vector documents
+VECTORS_PAGE_QUERY = """
+SELECT META(v).id AS id, v.*
+FROM `travel-sample`.inventory.vectors AS v
+WHERE META(v).id > $last_id
+ORDER BY META(v).id
+LIMIT $page_size
+"""
+
 class TravelSampleLoader():
     """
     Utility to load/prepare travel-sample data for chatbot.
     """
-    
-    def __init__(self, capella_client, embedding_generator):
+
+    def __init__(self, capella_client, embedding_generator, checkpoint_path=".embedding_checkpoint.json", worker_setup=None, page_size=1000):
         self.client = capella_client
         self.embedding_generator = embedding_generator
+        # landmarks read per query, together with the batch size this bounds
+        # how many rows a run holds in memory whatever the collection size
+        self.page_size = page_size
+        # picklable function returning (client, embedding_generator) in a worker process,
+        # used by parallel ingestion, see data.parallel_ingest
+        self.worker_setup = worker_setup
+        # embeddings stored by the last run
+        self.last_stored_count = 0
+        # progress of the current run is saved here so an interrupted run can resume
+        self.checkpoint_path = checkpoint_path
+        # called after embeddings were written, e.g. to invalidate retrieval caches
+        self.embeddings_changed_listeners = []
+
+    def add_embeddings_changed_listener(self, callback):
+        """Call callback() whenever a run writes new embeddings."""
+        self.embeddings_changed_listeners.append(callback)
+
+    def _notify_embeddings_changed(self):
+        for callback in self.embeddings_changed_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error notifying embeddings listener: {e}")
 
-    def add_embeddings_to_vectors_collection(self):
-        """Add embeddings to the vectors collection for all landmarks."""
+    @staticmethod
+    def _text_for_embedding(row):
+        """Build the text that is embedded for a landmark row."""
+        return f"{row.get('name', '')} {row.get('content', '')} {row.get('country', '')} {row.get('city', '')} {row.get('type', '')} {row.get('activity', '')}"
+
+    @staticmethod
+    def content_hash(text):
+        """Hash of the text that was embedded, used to detect changed landmarks."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def add_embeddings_to_vectors_collection(self, batch_size=None, only_changed=False, workers=1):
+        """
+        Add embeddings to the vectors collection for all landmarks.
+
+        Args:
+            batch_size (int): If set, encode and upsert this many landmarks
+                at a time instead of one document per round-trip
+            only_changed (bool): Only re-embed landmarks whose text or
+                embedding model changed since they were last embedded
+            workers (int): If more than 1, shard the batches across this many
+                worker processes, each with its own model and connection
+        """
         try:
-            # get all landmark document results to embed
-            query = """
-            SELECT META().id as id, l.name, l.content, l.country, l.city, l.type, l.activity
-            FROM `travel-sample`.inventory.landmark AS l
-            """
-            # convert results to a list
-            # to avoid "already iterated" error
-            results = list(self.client.execute_query(query))
-            count = 0
-            for row in results:
-                doc_id = row.get("id")
-                text_for_embedding = f"{row.get('name', '')} {row.get('content', '')} {row.get('country', '')} {row.get('city', '')} {row.get('type', '')} {row.get('activity', '')}"
-                try:
-                    # store embedding in vectors collection
-                    if self.embedding_generator.store_embedding(
-                        self.client, 
-                        doc_id, 
-                        text_for_embedding,
-                        scope_name="inventory",
-                        collection_name="vectors"
-                    ):
-                        count += 1
-                        
-                    if count % 100 == 0:
-                        print(f"Added {count} embeddings...")
-                except Exception as e:
-                    print(f"Error storing embedding for {doc_id}: {e}")
-            
-            print(f"Successfully added embeddings for {count} landmarks")
+            # landmarks are read a page at a time in ID order, so memory stays
+            # bounded and an interrupted run can resume from a checkpoint
+            mode = "changed" if only_changed else "all"
+            resume_after = self._load_checkpoint(mode)
+            if resume_after:
+                print(f"Resuming from checkpoint after {resume_after}")
+            pages = self.client.paginate_query(LANDMARKS_PAGE_QUERY, page_size=self.page_size, start_after=resume_after)
+            if only_changed:
+                pages = self._changed_landmarks(pages)
+            rows = (row for page in pages for row in page)
+
+            if workers and workers > 1:
+                from data.parallel_ingest import ingest_in_parallel
+                batch_size = batch_size or 64
+                count = ingest_in_parallel(self, self._batches(rows, batch_size), batch_size, workers, mode, self.worker_setup)
+            elif batch_size and batch_size > 1:
+                count = self._add_embeddings_in_batches(self._batches(rows, batch_size), batch_size, mode)
+            else:
+                count = self._add_embeddings_one_by_one(rows, mode)
+
+            self._clear_checkpoint()
+            self.last_stored_count = count
+            if count:
+                self._notify_embeddings_changed()
             return True
         except Exception as e:
             print(f"Error adding embeddings to vectors collection: {e}")
             return False
 
+    @staticmethod
+    def _batches(rows, batch_size):
+        """Group an iterable of rows into lists of up to batch_size rows."""
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _changed_landmarks(self, pages):
+        """
+        Filter pages of landmarks down to the ones whose text or embedding
+        model changed since they were last embedded, looking up the stored
+        hashes of each page with one multi-document get.
+
+        Yields:
+            list: The new or changed landmarks of a page
+        """
+        model_name = self.embedding_generator.model_name
+        scanned = 0
+        changed = 0
+        for page in pages:
+            existing = self._existing_embedding_hashes([row.get("id") for row in page])
+            rows = [
+                row for row in page
+                if existing.get(row.get("id")) != (self.content_hash(self._text_for_embedding(row)), model_name)
+            ]
+            scanned += len(page)
+            changed += len(rows)
+            if rows:
+                yield rows
+        print(f"{changed} of {scanned} landmarks were new or changed since they were last embedded")
+
+    def _add_embeddings_one_by_one(self, rows, mode):
+        """
+        Embed and upsert landmarks one document per round-trip.
+        The checkpoint never moves past a landmark whose write failed,
+        so a resumed run retries it.
+
+        Returns:
+            int: Number of embeddings stored
+        """
+        count = 0
+        failed = 0
+        for row in rows:
+            doc_id = row.get("id")
+            text_for_embedding = self._text_for_embedding(row)
+            try:
+                # store embedding in vectors collection
+                stored = self.embedding_generator.store_embedding(
+                    self.client,
+                    doc_id,
+                    text_for_embedding,
+                    scope_name="inventory",
+                    collection_name="vectors",
+                    content_hash=self.content_hash(text_for_embedding)
+                )
+            except Exception as e:
+                print(f"Error storing embedding for {doc_id}: {e}")
+                stored = False
+            if not stored:
+                failed += 1
+                continue
+
+            count += 1
+            if count % 100 == 0:
+                print(f"Added {count} embeddings...")
+                # rows come in ID order, so after a failure the checkpoint stays before it
+                if not failed:
+                    self._save_checkpoint(mode, doc_id)
+
+        print(f"Successfully added embeddings for {count} landmarks ({failed} failed)")
+        return count
+
+    def _add_embeddings_in_batches(self, batches, batch_size, mode):
+        """
+        Batched ingestion: one model.encode call and one multi-document
+        upsert per batch of landmarks. Reports throughput when done.
+
+        Returns:
+            int: Number of embeddings stored
+        """
+        count = 0
+        failed = 0
+        encode_seconds = 0.0
+        write_seconds = 0.0
+        started = time.perf_counter()
+        for batch in batches:
+            doc_ids = [row.get("id") for row in batch]
+            texts = [self._text_for_embedding(row) for row in batch]
+            try:
+                encode_started = time.perf_counter()
+                embeddings = self.embedding_generator.generate_embeddings(texts, batch_size=batch_size)
+                encode_seconds += time.perf_counter() - encode_started
+
+                write_started = time.perf_counter()
+                failed_ids = self.embedding_generator.store_embeddings(
+                    self.client,
+                    dict(zip(doc_ids, embeddings)),
+                    scope_name="inventory",
+                    collection_name="vectors",
+                    content_hashes={doc_id: self.content_hash(text) for doc_id, text in zip(doc_ids, texts)}
+                )
+                write_seconds += time.perf_counter() - write_started
+            except Exception as e:
+                print(f"Error storing embeddings for batch starting at {doc_ids[0]}: {e}")
+                failed += len(batch)
+                continue
+
+            count += len(batch) - len(failed_ids)
+            failed += len(failed_ids)
+            # rows come in ID order, so after a failure the checkpoint stays before it
+            if not failed:
+                self._save_checkpoint(mode, doc_ids[-1])
+            print(f"Added {count} embeddings...")
+
+        elapsed = time.perf_counter() - started
+        print(f"Successfully added embeddings for {count} landmarks ({failed} failed)")
+        print(
+            f"Throughput: {count / elapsed if elapsed else 0:.1f} docs/s over {elapsed:.2f}s "
+            f"(encode {encode_seconds:.2f}s, write {write_seconds:.2f}s, batch size {batch_size})"
+        )
+        return count
+
+    def migrate_embedding_encoding(self, encoding=None, batch_size=500):
+        """
+        Rewrite stored vector documents in another encoding without
+        re-running the model: each embedding is decoded and encoded again.
+        Converting from float16 or int8 keeps their precision loss.
+
+        Args:
+            encoding (str): Target encoding, defaults to the generator's encoding
+            batch_size (int): Documents written per multi-document upsert
+
+        Returns:
+            int: Number of documents rewritten
+        """
+        encoding = encoding or self.embedding_generator.encoding
+        print(f"Migrating vector documents to {encoding} encoding...")
+        collection = self.client.bucket.scope("inventory").collection("vectors")
+        migrated = 0
+        bytes_before = 0
+        bytes_after = 0
+        for page in self.client.paginate_query(VECTORS_PAGE_QUERY, page_size=batch_size):
+            documents = {}
+            for row in page:
+                if row.get("embedding_encoding", "json") == encoding:
+                    continue
+                vector_id = row.pop("id")
+                embedding = decode_embedding(row)
+                if embedding is None:
+                    continue
+                bytes_before += encoded_size(row)
+                # drop the fields of the old encoding, keep everything else
+                document = {
+                    key: value for key, value in row.items()
+                    if not key.startswith("embedding")
+                }
+                document["embedding_encoding"] = encoding
+                document.update(encode_embedding(embedding, encoding))
+                bytes_after += encoded_size(document)
+                documents[vector_id] = document
+            if not documents:
+                continue
+            result = collection.upsert_multi(documents)
+            failed = result.exceptions if not result.all_ok else {}
+            for vector_id, error in failed.items():
+                print(f"Error migrating {vector_id}: {error}")
+            migrated += len(documents) - len(failed)
+            print(f"Migrated {migrated} vector documents...")
+        if bytes_before:
+            print(f"Vector documents went from {bytes_before} to {bytes_after} bytes ({bytes_after / bytes_before:.0%} of the original size)")
+        if migrated:
+            self._notify_embeddings_changed()
+        return migrated
+
+    def _existing_embedding_hashes(self, doc_ids):
+        """
+        Get the content hash and model name of the stored embeddings of
+        some landmarks.
+
+        Args:
+            doc_ids (list): Landmark IDs
+
+        Returns:
+            dict: Mapping of landmark ID to (content_hash, model_name),
+                landmarks without an embedding are left out
+        """
+        if not doc_ids:
+            return {}
+        collection = self.client.bucket.scope("inventory").collection("vectors")
+        # landmarks without a vector document show up in result.exceptions
+        result = collection.get_multi([f"vector::{doc_id}" for doc_id in doc_ids])
+        existing = {}
+        for get_result in result.results.values():
+            vector_doc = get_result.content_as[dict]
+            existing[vector_doc.get("doc_id")] = (vector_doc.get("content_hash"), vector_doc.get("model_name"))
+        return existing
+
+    def _load_checkpoint(self, mode):
+        """
+        Get the last landmark ID written by an interrupted run, if that run
+        used the same mode and embedding model.
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable checkpoint {self.checkpoint_path}: {e}")
+            return None
+        if checkpoint.get("mode") != mode or checkpoint.get("model_name") != self.embedding_generator.model_name:
+            return None
+        return checkpoint.get("last_doc_id")
+
+    def _save_checkpoint(self, mode, last_doc_id):
+        """Record the last landmark ID that was written."""
+        if not self.checkpoint_path:
+            return
+        checkpoint = {
+            "mode": mode,
+            "model_name": self.embedding_generator.model_name,
+            "last_doc_id": last_doc_id
+        }
+        # write to a temporary file first so a crash never leaves a half-written checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _clear_checkpoint(self):
+        """Remove the checkpoint once a run has completed."""
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
 
     def check_existing_embeddings(self):
         """Check if embeddings already exist in the vectors collection."""
@@ -60,4 +358,4 @@ class TravelSampleLoader():
             return count
         except Exception as e:
             print(f"Error checking existing embeddings: {e}")
-            return 0 
\ No newline at end of file
+            return 0
@@ -1,20 +1,52 @@
+from collections import deque
 from datetime import timedelta
+import asyncio
+import threading
+import time
+from acouchbase.cluster import Cluster as AsyncCluster
 from couchbase.auth import PasswordAuthenticator
 from couchbase.cluster import Cluster
-from couchbase.options import (ClusterOptions, ClusterTimeoutOptions)
+from couchbase.diagnostics import PingState
+from couchbase.options import (ClusterOptions, ClusterTimeoutOptions, ExistsOptions, QueryOptions)
+from telemetry.metrics import metrics
 
 class CapellaClient:
     """
     Client for connecting and managing Couchbase Capella Cluster.
     """
     
-    def __init__(self, endpoint, username, password, bucket_name):
+    def __init__(self, endpoint, username, password, bucket_name, reconnect_cooldown_seconds=10):
+        """
+        Args:
+            reconnect_cooldown_seconds (float): After a failed reconnect, requests fail
+                right away for this long instead of trying again themselves
+        """
         self.endpoint = endpoint
         self.username = username
         self.password = password
         self.bucket_name = bucket_name
         self.cluster = None
         self.bucket = None
+        # settings from the last connect() call, reused when reconnecting
+        self.timeout_seconds = 10
+        self.apply_wan_profile = True
+        self._healthy = False
+        self._reconnect_lock = threading.Lock()
+        self._last_health_check = 0.0
+        self._health_thread = None
+        self._stop_health_checks = threading.Event()
+        # reconnect statistics
+        self.reconnect_count = 0
+        self.reconnect_failures = 0
+        self.reconnect_durations = deque(maxlen=100)
+        self.last_reconnect_at = None
+        self.reconnect_cooldown_seconds = reconnect_cooldown_seconds
+        # monotonic time of the last reconnect that gave up, None once reconnected
+        self._last_reconnect_failure = None
+        # asyncio cluster handle, created on first use by the async retrieval path
+        self.async_cluster = None
+        self.async_bucket = None
+        self._async_connect_lock = None
         
     def connect(self, timeout_seconds=10, apply_wan_profile=True):
         """
@@ -27,6 +59,38 @@ class CapellaClient:
         Returns:
             CapellaClient: Self for method chaining
         """
+        self.timeout_seconds = timeout_seconds
+        self.apply_wan_profile = apply_wan_profile
+        self.cluster, self.bucket = self._open_cluster()
+        self._healthy = True
+        return self
+
+    def _open_cluster(self):
+        """
+        Build a new cluster handle and wait until it is ready.
+
+        Returns:
+            tuple: (Cluster, Bucket)
+        """
+        timeout_seconds = self.timeout_seconds
+        options, connection_string = self._cluster_options()
+        cluster = Cluster(connection_string, options)
+        # Wait until the cluster is ready
+        cluster.wait_until_ready(timedelta(seconds=timeout_seconds))
+        # Get a reference to our bucket
+        bucket = cluster.bucket(self.bucket_name)
+
+        return cluster, bucket
+
+    def _cluster_options(self):
+        """
+        Build the cluster options shared by the sync and async clusters.
+
+        Returns:
+            tuple: (ClusterOptions, connection string)
+        """
+        timeout_seconds = self.timeout_seconds
+        apply_wan_profile = self.apply_wan_profile
         # Set up authentication
         auth = PasswordAuthenticator(self.username, self.password)
         # Configure cluster options
@@ -43,27 +107,283 @@ class CapellaClient:
         options.timeout_options = timeout_opts
         # Connect to the cluster with proper connection string format
         connection_string = f'couchbases://{self.endpoint}'
-        self.cluster = Cluster(connection_string, options)
-        # Wait until the cluster is ready
-        self.cluster.wait_until_ready(timedelta(seconds=timeout_seconds))
-        # Get a reference to our bucket
-        self.bucket = self.cluster.bucket(self.bucket_name)
+        return options, connection_string
 
-        return self
+    def ensure_connected(self):
+        """
+        Make sure there is a usable cluster handle. This is cheap when the
+        connection is healthy, it only reconnects after a failure was detected.
+        Requests make a single reconnect attempt and fail fast during an
+        outage, retrying with backoff is left to the health-check thread.
+        """
+        if self.cluster is None or not self._healthy:
+            self.reconnect(max_attempts=1, fail_fast=True)
+
+    def _check_reconnect_cooldown(self):
+        """Raise ConnectionError if a reconnect gave up less than reconnect_cooldown_seconds ago."""
+        failed_at = self._last_reconnect_failure
+        if failed_at is None:
+            return
+        elapsed = time.monotonic() - failed_at
+        if elapsed < self.reconnect_cooldown_seconds:
+            metrics.increment("capella_reconnect_cooldown_rejections_total")
+            raise ConnectionError(f"Capella is unreachable, the last reconnect failed {elapsed:.1f}s ago")
+
+    def reconnect(self, max_attempts=5, initial_backoff_seconds=0.5, max_backoff_seconds=8, fail_fast=False):
+        """
+        Replace the cluster handle, retrying with exponential backoff.
+        Only one thread reconnects at a time, the others wait for it.
+
+        Args:
+            fail_fast (bool): Raise ConnectionError right away if a reconnect failed
+                within reconnect_cooldown_seconds, also when another thread's attempt
+                failed while we waited for it, and wait at most that long for a
+                reconnect that is already running. Used on the request path.
+
+        Returns:
+            CapellaClient: Self for method chaining
+        """
+        if fail_fast:
+            self._check_reconnect_cooldown()
+            # a bounded wait, so requests don't queue behind the health-check thread's backoff
+            if not self._reconnect_lock.acquire(timeout=self.reconnect_cooldown_seconds):
+                metrics.increment("capella_reconnect_cooldown_rejections_total")
+                raise ConnectionError("Capella is unreachable, another reconnect is still in progress")
+        else:
+            self._reconnect_lock.acquire()
+        try:
+            # another thread may have reconnected while we waited for the lock
+            if self.cluster is not None and self._healthy:
+                return self
+            if fail_fast:
+                # or failed to, in which case don't try again right after it
+                self._check_reconnect_cooldown()
+            backoff = initial_backoff_seconds
+            for attempt in range(1, max_attempts + 1):
+                started = time.perf_counter()
+                try:
+                    cluster, bucket = self._open_cluster()
+                except Exception as e:
+                    self.reconnect_failures += 1
+                    metrics.increment("capella_reconnect_failures_total")
+                    print(f"Reconnect attempt {attempt}/{max_attempts} failed: {e}")
+                    self._last_reconnect_failure = time.monotonic()
+                    if attempt == max_attempts:
+                        raise
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, max_backoff_seconds)
+                    continue
+
+                old_cluster = self.cluster
+                self.cluster, self.bucket = cluster, bucket
+                self._healthy = True
+                self._last_reconnect_failure = None
+                duration = time.perf_counter() - started
+                self.reconnect_count += 1
+                metrics.increment("capella_reconnects_total")
+                self.reconnect_durations.append(duration)
+                self.last_reconnect_at = time.time()
+                print(f"Reconnected to Couchbase in {duration:.2f}s (reconnect #{self.reconnect_count})")
+                if old_cluster is not None:
+                    try:
+                        old_cluster.close()
+                    except Exception:
+                        pass
+                return self
+        finally:
+            self._reconnect_lock.release()
+
+    def check_health(self):
+        """
+        Ping the cluster and record whether the connection is usable.
+
+        Returns:
+            bool: True if at least one service endpoint answered the ping
+        """
+        self._last_health_check = time.monotonic()
+        if self.cluster is None:
+            self._healthy = False
+            return False
+        try:
+            result = self.cluster.ping()
+            reports = [report for service in result.endpoints.values() for report in service]
+            healthy = any(report.state == PingState.OK for report in reports)
+        except Exception as e:
+            print(f"Couchbase health check failed: {e}")
+            healthy = False
+        if not healthy:
+            metrics.increment("capella_health_check_failures_total")
+        self._healthy = healthy
+        return healthy
+
+    def report_failure(self, error, min_interval_seconds=1.0):
+        """
+        Tell the client an operation failed. The connection is only
+        replaced if a health check confirms that it is actually broken.
+        """
+        # avoid a ping storm when many requests fail at once
+        if time.monotonic() - self._last_health_check < min_interval_seconds:
+            return
+        if not self.check_health():
+            print(f"Connection failure detected ({error}), reconnecting...")
+            try:
+                self.reconnect(max_attempts=1, fail_fast=True)
+            except Exception as reconnect_error:
+                print(f"Failed to reconnect: {reconnect_error}")
+
+    def start_health_checks(self, interval_seconds=30):
+        """
+        Check the connection every interval_seconds in a background thread
+        and reconnect when it is broken.
+        """
+        if self._health_thread is not None:
+            return
+        self._stop_health_checks.clear()
+
+        def health_loop():
+            while not self._stop_health_checks.wait(interval_seconds):
+                if not self.check_health():
+                    try:
+                        self.reconnect()
+                    except Exception as e:
+                        print(f"Failed to reconnect: {e}")
+
+        self._health_thread = threading.Thread(target=health_loop, name="capella-health", daemon=True)
+        self._health_thread.start()
+
+    def connection_stats(self):
+        """
+        How often the client had to reconnect and how long it took.
+        """
+        durations = list(self.reconnect_durations)
+        return {
+            "healthy": self._healthy,
+            "reconnects": self.reconnect_count,
+            "reconnect_failures": self.reconnect_failures,
+            "last_reconnect_seconds": durations[-1] if durations else None,
+            "avg_reconnect_seconds": sum(durations) / len(durations) if durations else None,
+            "max_reconnect_seconds": max(durations) if durations else None,
+            "last_reconnect_at": self.last_reconnect_at
+        }
+
+    def close(self):
+        """
+        Stop health checks and close the cluster handle.
+        """
+        self._stop_health_checks.set()
+        self._health_thread = None
+        if self.cluster is not None:
+            self.cluster.close()
+            self.cluster = None
+            self.bucket = None
+        self._healthy = False
+
+    async def ensure_connected_async(self):
+        """
+        Make sure there is a usable asyncio cluster handle for the async
+        retrieval path, connecting on first use.
+        """
+        if self.async_cluster is not None:
+            return
+        if self._async_connect_lock is None:
+            self._async_connect_lock = asyncio.Lock()
+        async with self._async_connect_lock:
+            if self.async_cluster is not None:
+                return
+            started = time.perf_counter()
+            options, connection_string = self._cluster_options()
+            cluster = await AsyncCluster.connect(connection_string, options)
+            await cluster.wait_until_ready(timedelta(seconds=self.timeout_seconds))
+            bucket = cluster.bucket(self.bucket_name)
+            await bucket.on_connect()
+            self.async_cluster, self.async_bucket = cluster, bucket
+            print(f"Connected async Couchbase cluster in {time.perf_counter() - started:.2f}s")
+
+    async def report_failure_async(self, error):
+        """
+        Async counterpart of report_failure. A broken async handle is
+        dropped so the next request connects a fresh one.
+        """
+        if self.async_cluster is None:
+            return
+        try:
+            result = await self.async_cluster.ping()
+            reports = [report for service in result.endpoints.values() for report in service]
+            if any(report.state == PingState.OK for report in reports):
+                return
+        except Exception:
+            pass
+        print(f"Async connection failure detected ({error}), reconnecting on next request...")
+        cluster, self.async_cluster, self.async_bucket = self.async_cluster, None, None
+        try:
+            await cluster.close()
+        except Exception:
+            pass
+
+    async def execute_query_async(self, statement, *args, **kwargs):
+        """
+        Run a N1QL query on the asyncio cluster and return all rows.
+        """
+        await self.ensure_connected_async()
+        result = self.async_cluster.query(statement, *args, **kwargs)
+        return [row async for row in result]
 
     def execute_query(self, statement, *args, **kwargs):
+        """
+        Run a N1QL query and return all rows as a list. Use stream_query()
+        or paginate_query() for results too large to hold in memory.
+        """
+        return list(self.stream_query(statement, *args, **kwargs))
+
+    def stream_query(self, statement, *args, **kwargs):
+        """
+        Run a N1QL query and yield rows as the SDK receives them,
+        without collecting the result set.
+        """
         if not self.cluster:
             raise RuntimeError("Not connected to Couchbase. Call connect() first.")
-        
-        # Execute the query
-        result = self.cluster.query(statement, *args, **kwargs)
-        
-        # Force execution by accessing metadata
-        rows = []
-        for row in result:
-            rows.append(row)
-        
-        return rows
+        yield from self.cluster.query(statement, *args, **kwargs)
+
+    def paginate_query(self, statement, page_size=1000, start_after="", id_field="id", named_parameters=None):
+        """
+        Page through a large result with keyset pagination: each page is a
+        separate query that continues after the last ID of the previous
+        page, so no query scans or returns more than page_size rows and
+        no server-side cursor is held open between pages.
+
+        The statement must select the document ID as id_field, filter on
+        `META(alias).id > $last_id`, order by `META(alias).id` and end
+        with `LIMIT $page_size`, e.g.
+
+            SELECT META(l).id AS id, l.name
+            FROM `travel-sample`.inventory.landmark AS l
+            WHERE META(l).id > $last_id
+            ORDER BY META(l).id
+            LIMIT $page_size
+
+        Args:
+            statement (str): The N1QL query
+            page_size (int): Rows per page
+            start_after (str): Only return documents with a greater ID,
+                e.g. to resume from a checkpoint
+            id_field (str): Name the document ID is selected as
+            named_parameters (dict): Further query parameters
+
+        Yields:
+            list: One page of rows, ordered by ID
+        """
+        last_id = start_after or ""
+        while True:
+            parameters = dict(named_parameters or {})
+            parameters.update(last_id=last_id, page_size=page_size)
+            page = list(self.stream_query(statement, QueryOptions(named_parameters=parameters)))
+            if not page:
+                return
+            # read before yielding, the caller may modify the rows
+            last_id = page[-1].get(id_field)
+            yield page
+            if len(page) < page_size:
+                return
 
     def create_embedding_collection(self, scope_name, collection_name):
         """
@@ -79,3 +399,30 @@ class CapellaClient:
         except Exception as e:
             print(f"Collection was not created, collection may already exist.", e)
             return False
+
+    def wait_for_collection(self, scope_name, collection_name, timeout_seconds=30, poll_interval_seconds=0.1):
+        """
+        Wait until a collection answers both key-value and N1QL requests,
+        e.g. right after creating it. Polls with a growing interval
+        instead of sleeping for a fixed time.
+
+        Returns:
+            bool: True once the collection is available, False on timeout
+        """
+        started = time.monotonic()
+        deadline = started + timeout_seconds
+        collection = self.bucket.scope(scope_name).collection(collection_name)
+        probe_query = f"SELECT RAW 1 FROM `{self.bucket_name}`.`{scope_name}`.`{collection_name}` LIMIT 1"
+        while True:
+            try:
+                # any answer, even "does not exist", means the data service knows the collection
+                collection.exists("collection-ready-probe", ExistsOptions(timeout=timedelta(seconds=2)))
+                self.execute_query(probe_query)
+                print(f"Collection {scope_name}.{collection_name} available after {time.monotonic() - started:.2f}s")
+                return True
+            except Exception as e:
+                if time.monotonic() + poll_interval_seconds > deadline:
+                    print(f"Collection {scope_name}.{collection_name} not available after {timeout_seconds}s: {e}")
+                    return False
+            time.sleep(poll_interval_seconds)
+            poll_interval_seconds = min(poll_interval_seconds * 2, 2)
@@ -0,0 +1,275 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import asyncio
+import threading
+import time
+import numpy as np
+from telemetry.metrics import metrics
+
+class CallRejectedError(Exception):
+    """A call given up on by policy rather than failed by Capella, no reason to reconnect."""
+
+class DeadlineExceededError(CallRejectedError, TimeoutError):
+    """No attempt of an operation answered within its deadline."""
+
+class CircuitOpenError(CallRejectedError):
+    """The operation failed too often recently and is not being tried."""
+
+class LatencyTracker:
+    """
+    Recent latencies of one operation, to derive the hedging delay from.
+    """
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q):
+        """The q-th percentile in seconds, None without samples."""
+        with self._lock:
+            if not self._samples:
+                return None
+            samples = np.fromiter(self._samples, dtype=np.float64, count=len(self._samples))
+        return float(np.percentile(samples, q))
+
+class CircuitBreaker:
+    """
+    Stops calling an operation after failure_threshold failures in a row.
+    After reset_seconds one trial call is let through: success closes the
+    circuit, failure opens it for another reset_seconds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        """Whether a call may be made now."""
+        if not self.failure_threshold:
+            return True
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """
+        Returns:
+            bool: True if this failure opened the circuit
+        """
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            self._trial_running = False
+            if self.failure_threshold and (was_open or self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                return not was_open
+            return False
+
+class HedgedCaller:
+    """
+    Runs Capella operations with a per-operation deadline, a hedged second
+    attempt when the first is slower than a percentile of recent latencies,
+    and a circuit breaker per operation. Whichever attempt answers first
+    wins, the other one is left to finish in the background.
+    """
+
+    def __init__(self, deadlines=None, hedge_percentile=None, min_samples=20, breaker_failures=5, breaker_reset_seconds=30, max_workers=16):
+        """
+        Args:
+            deadlines (dict): operation -> seconds before giving up on it, None waits
+            hedge_percentile (float): Send a second attempt once the first has taken
+                longer than this percentile of the operation's recent latencies, None never hedges
+            min_samples (int): Latencies needed before an operation is hedged
+            breaker_failures (int): Failures in a row that open an operation's circuit, 0 never opens
+            breaker_reset_seconds (float): How long an open circuit rejects calls
+            max_workers (int): Threads running sync attempts
+        """
+        self.deadlines = {operation: seconds for operation, seconds in (deadlines or {}).items() if seconds}
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.max_workers = max_workers
+        self._trackers = {}
+        self._breakers = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _state(self, operation):
+        with self._lock:
+            if operation not in self._trackers:
+                self._trackers[operation] = LatencyTracker()
+                self._breakers[operation] = CircuitBreaker(self.breaker_failures, self.breaker_reset_seconds)
+                if self._executor is None and (self.deadlines or self.hedge_percentile is not None):
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="capella-call")
+            return self._trackers[operation], self._breakers[operation]
+
+    def _hedge_delay(self, tracker):
+        if self.hedge_percentile is None or len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    def _admit(self, operation, breaker):
+        if not breaker.allow():
+            metrics.increment("capella_circuit_rejections_total", operation=operation)
+            raise CircuitOpenError(f"{operation} circuit is open after repeated failures")
+
+    def _failed(self, operation, breaker, error):
+        if isinstance(error, DeadlineExceededError):
+            metrics.increment("capella_deadline_exceeded_total", operation=operation)
+        if breaker.record_failure():
+            metrics.increment("capella_circuit_opened_total", operation=operation)
+            print(f"Circuit for {operation} opened after {breaker.failures} failures, retrying in {breaker.reset_seconds}s")
+
+    def call(self, operation, fn):
+        """
+        Run fn() under the operation's deadline, hedging and circuit breaker.
+
+        Returns:
+            The result of the first attempt that succeeded
+
+        Raises:
+            CircuitOpenError: The circuit is open, fn was not called
+            DeadlineExceededError: No attempt finished within the deadline
+        """
+        tracker, breaker = self._state(operation)
+        self._admit(operation, breaker)
+        deadline = self.deadlines.get(operation)
+        hedge_delay = self._hedge_delay(tracker)
+        started = time.perf_counter()
+        try:
+            if deadline is None and hedge_delay is None:
+                result = fn()
+            else:
+                result = self._call_hedged(operation, fn, started, deadline, hedge_delay)
+        except Exception as e:
+            self._failed(operation, breaker, e)
+            raise
+        tracker.record(time.perf_counter() - started)
+        breaker.record_success()
+        return result
+
+    def _call_hedged(self, operation, fn, started, deadline, hedge_delay):
+        ends_at = None if deadline is None else started + deadline
+        attempts = [self._executor.submit(fn)]
+        pending = set(attempts)
+        error = None
+        while pending:
+            remaining = None if ends_at is None else max(0, ends_at - time.perf_counter())
+            # wake up to send the hedge if the first attempt is still out by then
+            hedge_at = None if len(attempts) > 1 or hedge_delay is None else started + hedge_delay
+            timeout = remaining
+            if hedge_at is not None:
+                until_hedge = max(0, hedge_at - time.perf_counter())
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not attempts[0]:
+                        metrics.increment("capella_hedge_wins_total", operation=operation)
+                    return future.result()
+                error = future.exception()
+            if hedge_at is not None and time.perf_counter() >= hedge_at and pending:
+                metrics.increment("capella_hedged_requests_total", operation=operation)
+                attempts.append(self._executor.submit(fn))
+                pending.add(attempts[-1])
+            elif ends_at is not None and time.perf_counter() >= ends_at and pending:
+                raise DeadlineExceededError(f"{operation} did not finish within {deadline}s")
+        raise error
+
+    async def acall(self, operation, make_coroutine):
+        """
+        Async counterpart of call(). make_coroutine is called once per
+        attempt, the losing attempt is cancelled.
+        """
+        tracker, breaker = self._state(operation)
+        self._admit(operation, breaker)
+        deadline = self.deadlines.get(operation)
+        hedge_delay = self._hedge_delay(tracker)
+        started = time.perf_counter()
+        try:
+            if deadline is None and hedge_delay is None:
+                result = await make_coroutine()
+            else:
+                result = await self._acall_hedged(operation, make_coroutine, started, deadline, hedge_delay)
+        except Exception as e:
+            self._failed(operation, breaker, e)
+            raise
+        tracker.record(time.perf_counter() - started)
+        breaker.record_success()
+        return result
+
+    async def _acall_hedged(self, operation, make_coroutine, started, deadline, hedge_delay):
+        ends_at = None if deadline is None else started + deadline
+        attempts = [asyncio.ensure_future(make_coroutine())]
+        pending = set(attempts)
+        error = None
+        try:
+            while pending:
+                remaining = None if ends_at is None else max(0, ends_at - time.perf_counter())
+                hedge_at = None if len(attempts) > 1 or hedge_delay is None else started + hedge_delay
+                timeout = remaining
+                if hedge_at is not None:
+                    until_hedge = max(0, hedge_at - time.perf_counter())
+                    timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not attempts[0]:
+                            metrics.increment("capella_hedge_wins_total", operation=operation)
+                        return task.result()
+                    error = task.exception()
+                if hedge_at is not None and time.perf_counter() >= hedge_at and pending:
+                    metrics.increment("capella_hedged_requests_total", operation=operation)
+                    attempts.append(asyncio.ensure_future(make_coroutine()))
+                    pending.add(attempts[-1])
+                elif ends_at is not None and time.perf_counter() >= ends_at and pending:
+                    raise DeadlineExceededError(f"{operation} did not finish within {deadline}s")
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def stats(self):
+        """Latency percentiles and circuit state per operation, for tuning the deadlines and hedging."""
+        with self._lock:
+            operations = list(self._trackers)
+        stats = {}
+        for operation in operations:
+            tracker, breaker = self._trackers[operation], self._breakers[operation]
+            stats[operation] = {
+                "samples": len(tracker),
+                "p50_ms": None if not len(tracker) else tracker.percentile(50) * 1000,
+                "p95_ms": None if not len(tracker) else tracker.percentile(95) * 1000,
+                "hedge_after_ms": None if self._hedge_delay(tracker) is None else self._hedge_delay(tracker) * 1000,
+                "deadline_ms": None if self.deadlines.get(operation) is None else self.deadlines[operation] * 1000,
+                "circuit": breaker.state
+            }
+        return stats
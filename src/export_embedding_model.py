@@ -0,0 +1,56 @@
+from dotenv import load_dotenv
+from bootstrap import Settings, build_embedding_generator
+import sys
+import time
+
+def encode_latency_ms(model, texts, repeats=20):
+    """Median milliseconds to encode one text, the per-question cost."""
+    timings = []
+    for _ in range(repeats):
+        for text in texts:
+            started = time.perf_counter()
+            model.encode(text)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def main():
+    """
+    One-time export of the configured embedding model to ONNX (and int8),
+    e.g. while building a deploy image, so serving nodes start from the
+    cached export. Prints the parity check and per-query encode latency
+    of the export next to the PyTorch model.
+
+        python src/export_embedding_model.py [onnx|onnx-int8]
+    """
+    load_dotenv()
+    settings = Settings()
+    # the export needs the model itself, not the embedding server
+    settings.embedding_server_socket = None
+    if len(sys.argv) > 1:
+        settings.embedding_backend = sys.argv[1]
+    if settings.embedding_backend == "torch":
+        print("EMBEDDING_BACKEND is torch, nothing to export. Pass onnx or onnx-int8 to export anyway.")
+        return
+    embedding_generator = build_embedding_generator(settings)
+    embedding_generator.load_model()
+    if embedding_generator.parity is None:
+        print("Export failed, see above")
+        sys.exit(1)
+    print(f"Parity: {embedding_generator.parity}")
+
+    from sentence_transformers import SentenceTransformer
+    from rag.onnx_backend import PARITY_TEXTS
+    torch_model = SentenceTransformer(settings.model_name)
+    texts = PARITY_TEXTS[:6]
+    # the first calls pay for lazy initialization
+    embedding_generator.warmup()
+    torch_model.encode("warmup")
+    torch_ms = encode_latency_ms(torch_model, texts)
+    export_ms = encode_latency_ms(embedding_generator.model, texts)
+    print(f"Per-query encode latency: torch {torch_ms:.1f}ms, {settings.embedding_backend} {export_ms:.1f}ms ({torch_ms / export_ms:.1f}x)")
+    if not embedding_generator.parity["passed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,22 @@
-import os
 from dotenv import load_dotenv
-from db.capella_client import CapellaClient
-from rag.embeddings import EmbeddingGenerator
-from rag.retriever import CouchbaseRetriever
-from rag.chatbot import TravelChatbot
+from bootstrap import (Settings, StartupReport, build_client, build_embedding_generator, build_local_keyword_index,
+                       build_local_vector_index, build_retriever, preload_modules)
 from data.travel_sample_loader import TravelSampleLoader
-import time
+from telemetry.metrics import metrics
 import sys
 import traceback
 def main():
     
     print("Starting Travel Chatbot...")
+    startup = StartupReport()
     load_dotenv()
     print("Getting connection details...")
-    endpoint = os.getenv("DEV_CAPELLA_ENDPOINT")
-    username = os.getenv("DEV_CAPELLA_ADMIN_USER")
-    password = os.getenv("DEV_CAPELLA_ADMIN_PASSWORD")
-    bucket_name = os.getenv("DEV_CAPELLA_BUCKET_NAME")
-    if not all([endpoint, username, password, bucket_name]):
+    settings = Settings()
+    endpoint = settings.endpoint
+    username = settings.username
+    password = settings.password
+    bucket_name = settings.bucket_name
+    if settings.missing_connection_settings():
         print("Error: Missing required environment variables.")
         return
     
@@ -26,21 +25,22 @@ def main():
     print(f"Password: {'*' * (len(password) if password else 0)}")
     print(f"Bucket: {bucket_name}")
     try:
-        client = CapellaClient(
-            endpoint=endpoint,
-            username=username,
-            password=password,
-            bucket_name=bucket_name
-        )
+        # load the model and import LangChain in the background while connecting
+        embedding_generator = build_embedding_generator(settings)
+        embedding_generator.load_in_background(warmup=True)
+        preload_modules(startup)
         print("connecting to capella...")
     
         try:
-            client = client.connect(timeout_seconds=15, apply_wan_profile=True)
+            with startup.phase("connect"):
+                client = build_client(settings)
             print("Successfully connected to capella!")
             print("Setting up collections for RAG system...")
             try:
-                client.create_embedding_collection("inventory", "vectors")
-                time.sleep(5)  # Wait for collection to be available
+                with startup.phase("collection setup"):
+                    client.create_embedding_collection("inventory", "vectors")
+                    # Wait for collection to be available
+                    client.wait_for_collection("inventory", "vectors")
             except Exception as e:
                 print(f"Error setting up vector collection: {e}")
 
@@ -50,22 +50,33 @@ def main():
             traceback.print_exc()
             print("Check if your endpoint format is correct (should NOT include protocol prefix).")
             raise
-        # can specify any models supported here: https://www.sbert.net/docs/sentence_transformer/pretrained_models.html
-        embedding_generator = EmbeddingGenerator(model_name="all-mpnet-base-v2")
         print(f"Preparing {bucket_name} data...")
-        loader = TravelSampleLoader(client, embedding_generator)
+        batch_size = settings.batch_size
+        loader = TravelSampleLoader(client, embedding_generator, page_size=settings.ingest_page_size)
         existing_count = loader.check_existing_embeddings()
+        embeddings_updated = True
         if existing_count > 0:
-            user_input = input(f"Found {existing_count} existing embeddings. Regenerate them? (y/n): ").lower()
-            proceed = user_input == 'y'
-            if not proceed:
+            user_input = input(
+                f"Found {existing_count} existing embeddings. "
+                "Update changed landmarks only (u), regenerate all (a), "
+                f"convert stored embeddings to {settings.embedding_encoding} encoding (m) or skip (s)? [u]: "
+            ).lower()
+            if user_input == 's':
                 print("Skipping embedding generation")
+                embeddings_updated = False
+            elif user_input == 'm':
+                embeddings_updated = loader.migrate_embedding_encoding(settings.embedding_encoding) > 0
+            elif user_input == 'a':
+                print("Regenerating all embeddings in vectors collection...")
+                loader.add_embeddings_to_vectors_collection(batch_size=batch_size, workers=settings.ingest_workers)
             else:
-                print("Adding embeddings to vectors collection...")
-                loader.add_embeddings_to_vectors_collection()
+                print("Updating embeddings for new or changed landmarks...")
+                completed = loader.add_embeddings_to_vectors_collection(batch_size=batch_size, only_changed=True, workers=settings.ingest_workers)
+                # keep the persisted local indexes when nothing changed, a failed run may have stored some batches
+                embeddings_updated = not completed or loader.last_stored_count > 0
         else:
             print("No existing embeddings found. Adding embeddings to vectors collection...")
-            loader.add_embeddings_to_vectors_collection()
+            loader.add_embeddings_to_vectors_collection(batch_size=batch_size, workers=settings.ingest_workers)
         # ensure vector search index exists, this can be created in Capella UI: 
         #   - https://docs.couchbase.com/cloud/vector-search/create-vector-search-index-ui.html
         print("Available search indexes:")
@@ -83,9 +94,24 @@ def main():
         num_candidates = int(user_input)
         
         
-        print(f"Using {num_candidates} candidates for retrieval. Keyword search: {'enabled' if keyword_search else 'disabled'}")
-        retriever = CouchbaseRetriever(client, embedding_generator, vector_search_index_name="landmarks-vector-index", collection_name="landmark", num_candidates=num_candidates, keyword_search=keyword_search, text_search_index_name="landmarks-text-index")
-        chatbot = TravelChatbot(retriever)
+        with startup.phase("local vector index"):
+            local_vector_index = build_local_vector_index(settings, client, rebuild=embeddings_updated)
+        with startup.phase("local keyword index"):
+            local_keyword_index = build_local_keyword_index(settings, client, rebuild=embeddings_updated)
+
+        print(f"Using {num_candidates} candidates for retrieval. Keyword search: {'enabled' if keyword_search else 'disabled'}. Vector backend: {settings.vector_backend}. Keyword backend: {settings.keyword_backend}")
+        with startup.phase("chatbot setup"):
+            from rag.chatbot import TravelChatbot
+            retriever = build_retriever(settings, client, embedding_generator, local_vector_index, num_candidates=num_candidates, keyword_search=keyword_search, local_keyword_index=local_keyword_index)
+            # later loader runs must not be answered from stale cached results
+            loader.add_embeddings_changed_listener(retriever.invalidate_caches)
+            chatbot = TravelChatbot(retriever, slow_request_seconds=settings.slow_request_seconds)
+        with startup.phase("waiting for model"):
+            embedding_generator.wait_until_loaded()
+        startup.add("model load", embedding_generator.load_seconds, background=True)
+        startup.add("model warmup", embedding_generator.warmup_seconds, background=True)
+        # the prompts above waited on the user, so only the phases are meaningful
+        startup.report(include_total=False)
         
         print("\n=== Travel Information Chatbot ===")
         print("Ask questions about landmarks, cities, or countries.")
@@ -95,12 +121,22 @@ def main():
         while True:
             user_input = input("\nYour question: ")
             if user_input.lower() in ['exit', 'quit', 'bye']:
+                print(f"Embedding cache: {embedding_generator.cache.stats()}")
+                if retriever.semantic_cache is not None:
+                    print(f"Semantic cache: {retriever.semantic_cache.stats()}")
+                print(f"Retrieval planner: {retriever.planner.stats()}")
+                print(f"Connection: {client.connection_stats()}")
+                print(f"Stage timings: {metrics.snapshot()['histograms']}")
+                embedding_generator.cache.close()
                 print("Goodbye!")
                 break
             if not user_input.strip():
                 continue
-            answer = chatbot.answer_question(user_input)
-            print("\n" + answer)
+            # print each result as soon as it is retrieved
+            print()
+            for part in chatbot.stream_answer(user_input):
+                print(part, end="", flush=True)
+            print()
         
     except Exception as e:
         print(f"Error: {e}")
@@ -2,7 +2,9 @@ from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_community.llms import FakeListLLM
-import json
+from concurrent.futures import ThreadPoolExecutor
+import time
+from telemetry.metrics import metrics, record_stage, span, trace
 
 class TravelChatbot:
     """
@@ -11,13 +13,22 @@ class TravelChatbot:
     Uses a fake LLM that returns documents retrieved
     by the CouchbaseRetriever in this project.
     """
-    
-    def __init__(self, retriever):
+    # text around the retrieved landmarks in formatted answers
+    RESPONSE_HEADING = "Here's what I found regarding your question:\n\n"
+    NO_RESULTS = "I couldn't find any information related to your question. Could you try asking in a different way?"
+
+    def __init__(self, retriever, slow_request_seconds=None):
         """
         Initialize the chatbot with a retriever.
         Uses a fake LLM that just returns the retrieved documents.
+
+        Args:
+            retriever (CouchbaseRetriever): Retriever used by the chain
+            slow_request_seconds (float): Log the stage breakdown of answers
+                slower than this, None never logs
         """
         self.retriever = retriever
+        self.slow_request_seconds = slow_request_seconds
         
         # Create a fake LLM that just returns formatted content
         # SOURCE: https://python.langchain.com/api_reference/core/language_models/langchain_core.language_models.fake.FakeListLLM.html
@@ -49,46 +60,223 @@ class TravelChatbot:
         """
         Answer a travel-related question using retrieved documents.
         """
+        started = time.perf_counter()
+        with trace() as timings:
+            try:
+                # get answer from chain
+                # behind the scenes this method invokes the retreiver's get_relevant_documents method,
+                # utilizing the custom retreiver (CouchbaseRetriever) in this project,
+                # this retreiver inherits from BaseRetriever, 
+                # which has a get_relevant_documents method as well
+                result = self.qa_chain.invoke({"input": question})
+                with span("format"):
+                    return self._format_response(result.get("context", []))
+                
+            except Exception as e:
+                print(f"Error answering question: {e}")
+                metrics.increment("rag_errors_total", stage="answer")
+                import traceback
+                traceback.print_exc()
+                return "I'm having trouble answering that question right now. Could you try asking again in a different way?" 
+            finally:
+                self._finish_answer(question, timings, started)
+
+    def answer_question_structured(self, question):
+        """
+        Answer a question with structured data instead of a formatted string:
+        the retrieved documents with their scores and sources, plus the
+        seconds spent in each retrieval stage.
+        """
+        started = time.perf_counter()
+        with trace() as timings:
+            try:
+                # the fake LLM in the chain adds nothing to the retrieved documents,
+                # so call the retriever directly and keep the per-stage timings
+                source_docs = self.retriever.invoke(question, timings=timings)
+                with span("format"):
+                    documents = self._structured_documents(source_docs)
+            except Exception:
+                metrics.increment("rag_errors_total", stage="answer")
+                raise
+            finally:
+                self._finish_answer(question, timings, started)
+        return {
+            "question": question,
+            "documents": documents,
+            "timings": timings
+        }
+
+    def answer_questions(self, questions, max_concurrency=8, batch_size=256):
+        """
+        Answer many questions at once, e.g. to replay logged questions when
+        evaluating retrieval. Repeated questions (ignoring whitespace) are
+        answered once, all questions are embedded up front in batches of
+        batch_size, and retrieval runs for up to max_concurrency questions
+        at a time.
+
+        Args:
+            questions (list): Questions to answer
+            max_concurrency (int): Questions retrieved at the same time
+            batch_size (int): Questions per model forward pass
+
+        Returns:
+            list: One dict per question, in order, shaped like the result of
+                answer_question_structured. Its "embedding" timing is the
+                question's share of the batch encode. A question that failed
+                has no documents and an "error" message.
+        """
+        started = time.perf_counter()
+        keys = [" ".join(question.split()) for question in questions]
+        unique = list(dict.fromkeys(keys))
+        embedding_started = time.perf_counter()
+        embeddings = self.retriever.embedding_generator.generate_query_embeddings(unique, batch_size=batch_size)
+        embedding_seconds = time.perf_counter() - embedding_started
+
+        def answer(question, embedding):
+            answer_started = time.perf_counter()
+            timings = {"embedding": embedding_seconds / len(unique)}
+            result = {"question": question, "documents": [], "timings": timings}
+            try:
+                if embedding is None:
+                    raise ValueError("Empty question")
+                source_docs = self.retriever.invoke(question, timings=timings, query_embedding=embedding)
+                with span("format", timings):
+                    result["documents"] = self._structured_documents(source_docs)
+            except Exception as e:
+                metrics.increment("rag_errors_total", stage="answer")
+                result["error"] = str(e)
+            finally:
+                self._finish_answer(question, timings, answer_started)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="answer-batch") as pool:
+            answers = dict(zip(unique, pool.map(answer, unique, embeddings)))
+        elapsed = time.perf_counter() - started
+        failed = sum(1 for result in answers.values() if "error" in result)
+        print(
+            f"Answered {len(questions)} questions ({len(unique)} unique, {failed} failed) in {elapsed:.2f}s, "
+            f"{embedding_seconds:.2f}s of it embedding"
+        )
+        return [dict(answers[key], question=question) for key, question in zip(keys, questions)]
+
+    def stream_answer(self, question):
+        """
+        Answer a question piece by piece: yields the heading and then each
+        formatted result as soon as its retrieval branch has finished,
+        instead of one string once everything is done. Joining the pieces
+        gives the same text as answer_question (up to the order of results
+        when keyword search finishes before vector search).
+
+        Yields:
+            str: Parts of the answer
+        """
+        started = time.perf_counter()
+        # a trace() can't span the yields of a generator, so timings are passed along explicitly
+        timings = {}
+        format_seconds = 0.0
+        count = 0
         try:
-            # get answer from chain
-            # behind the scenes this method invokes the retreiver's get_relevant_documents method,
-            # utilizing the custom retreiver (CouchbaseRetriever) in this project,
-            # this retreiver inherits from BaseRetriever, 
-            # which has a get_relevant_documents method as well
-            result = self.qa_chain.invoke({"input": question})
-            source_docs = result.get("context", [])
-            if not source_docs:
-                return "I couldn't find any information related to your question. Could you try asking in a different way?"
-            response = "Here's what I found regarding your question:\n\n"
-            for i, doc in enumerate(source_docs, 1):
-                content = doc.page_content
-                if isinstance(content, dict):
-                    content_dict = content
+            for doc in self.retriever.stream_relevant_documents(question, timings=timings):
+                format_started = time.perf_counter()
+                if count == 0:
+                    record_stage("first_result", format_started - started, timings)
+                    part = self.RESPONSE_HEADING + self._format_document(1, doc)
                 else:
-                    try:
-                        content_dict = json.loads(content)
-                    except Exception as e:
-                        print(f"Error parsing content: {e}, content for parsing: {content}")
-                        # Fallback to raw content
-                        response += f"#{i} {str(content)[:100]}...\n"
-                        continue
-                # Format information
-                response += f"#{i} {content_dict.get('name', 'Unknown Landmark')}\n"
-                response += f"Source: {doc.metadata.get('source', 'Unknown')}\n"
-                if "country" in content_dict:
-                    response += f"Location: {content_dict.get('city', '')}, {content_dict.get('country', '')}\n"
-                if "type" in content_dict:
-                    response += f"Type: {content_dict.get('type', '')}\n"
-                if "activity" in content_dict:
-                    response += f"Activity: {content_dict.get('activity', '')}\n"
-                if "content" in content_dict:
-                    response += f"Description: {content_dict.get('content', '')}\n"
-                response += "\n"
-            
-            return response
-            
+                    part = self._format_document(count + 1, doc)
+                count += 1
+                format_seconds += time.perf_counter() - format_started
+                yield part
+            if count == 0:
+                yield self.NO_RESULTS
         except Exception as e:
             print(f"Error answering question: {e}")
+            metrics.increment("rag_errors_total", stage="answer")
             import traceback
             traceback.print_exc()
-            return "I'm having trouble answering that question right now. Could you try asking again in a different way?" 
\ No newline at end of file
+            yield "I'm having trouble answering that question right now. Could you try asking again in a different way?"
+        finally:
+            record_stage("format", format_seconds, timings)
+            self._finish_answer(question, timings, started)
+
+    async def aanswer_question(self, question):
+        """
+        Async version of answer_question. The chain calls the retriever's
+        native async path, so no thread is held while waiting on Couchbase.
+        """
+        started = time.perf_counter()
+        with trace() as timings:
+            try:
+                result = await self.qa_chain.ainvoke({"input": question})
+                with span("format"):
+                    return self._format_response(result.get("context", []))
+
+            except Exception as e:
+                print(f"Error answering question: {e}")
+                metrics.increment("rag_errors_total", stage="answer")
+                import traceback
+                traceback.print_exc()
+                return "I'm having trouble answering that question right now. Could you try asking again in a different way?"
+            finally:
+                self._finish_answer(question, timings, started)
+
+    def _finish_answer(self, question, timings, started):
+        """
+        Record the total time of an answer and log the stage
+        breakdown when it was slower than slow_request_seconds.
+        """
+        record_stage("total", time.perf_counter() - started, timings)
+        metrics.increment("rag_answers_total")
+        if self.slow_request_seconds is not None and timings["total"] > self.slow_request_seconds:
+            metrics.increment("rag_slow_answers_total")
+            breakdown = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+            print(f"Slow answer ({timings['total'] * 1000:.0f}ms) for {question!r}: {breakdown}")
+
+    def _format_response(self, source_docs):
+        """
+        Format the retrieved documents into a readable answer.
+        """
+        if not source_docs:
+            return self.NO_RESULTS
+        return self.RESPONSE_HEADING + "".join(
+            self._format_document(i, doc) for i, doc in enumerate(source_docs, 1)
+        )
+
+    @staticmethod
+    def _structured_documents(source_docs):
+        """
+        The retrieved documents with their scores and sources, as plain dicts.
+        """
+        documents = []
+        for doc in source_docs:
+            landmark = doc.metadata.get("landmark")
+            documents.append({
+                "id": doc.metadata.get("id"),
+                "source": doc.metadata.get("source", "Unknown"),
+                "score": doc.metadata.get("score", 0),
+                "content": landmark.to_dict() if landmark is not None else {"text": doc.page_content}
+            })
+        return documents
+
+    @staticmethod
+    def _format_document(i, doc):
+        """
+        Format one retrieved landmark as part of an answer.
+        """
+        landmark = doc.metadata.get("landmark")
+        if landmark is None:
+            # not from CouchbaseRetriever, show the raw content
+            return f"#{i} {str(doc.page_content)[:100]}...\n"
+        lines = [
+            f"#{i} {landmark.name or 'Unknown Landmark'}",
+            f"Source: {doc.metadata.get('source', 'Unknown')}"
+        ]
+        if landmark.country is not None:
+            lines.append(f"Location: {landmark.city or ''}, {landmark.country}")
+        if landmark.type is not None:
+            lines.append(f"Type: {landmark.type}")
+        if landmark.activity is not None:
+            lines.append(f"Activity: {landmark.activity}")
+        if landmark.content is not None:
+            lines.append(f"Description: {landmark.content}")
+        lines.append("\n")
+        return "\n".join(lines)
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+import threading
+import time
+
+class DocumentCache:
+    """
+    Bounded TTL cache of landmark documents keyed by document ID.
+    Landmarks rarely change and are read over and over, so most
+    fetches can be answered without leaving the process.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # doc_id -> (expires_at, content), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, doc_ids):
+        """
+        Look up several documents at once.
+
+        Returns:
+            tuple: (dict of doc_id -> content for the hits, list of missing IDs)
+        """
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for doc_id in doc_ids:
+                entry = self._entries.get(doc_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(doc_id)
+                    found[doc_id] = entry[1]
+                else:
+                    if entry is not None:
+                        del self._entries[doc_id]
+                    missing.append(doc_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, documents):
+        """Cache a dict of doc_id -> content."""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for doc_id, content in documents.items():
+                self._entries[doc_id] = (expires_at, content)
+                self._entries.move_to_end(doc_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached documents."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for tuning the cache size and TTL."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
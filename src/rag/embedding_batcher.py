@@ -0,0 +1,114 @@
+from concurrent.futures import Future
+import asyncio
+import queue
+import threading
+import time
+from telemetry.metrics import Histogram
+
+class EmbeddingBatcher:
+    """
+    Micro-batching scheduler in front of the embedding model.
+    Concurrent requests are gathered for up to max_wait_ms (or until
+    max_batch_size texts are waiting), encoded with one model call,
+    and each caller gets its own vector back.
+    """
+
+    def __init__(self, encode_batch, max_batch_size=32, max_wait_ms=5):
+        """
+        Args:
+            encode_batch (callable): Takes a list of texts, returns a list of embeddings
+            max_batch_size (int): Most texts encoded in one model call
+            max_wait_ms (float): Longest a request waits for others to join its batch
+        """
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """
+        Queue a text for embedding.
+
+        Returns:
+            Future: Resolves to the embedding
+        """
+        if self._stopped.is_set():
+            raise RuntimeError("EmbeddingBatcher is closed")
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text):
+        """Embed a text, blocking the calling thread until its batch is done."""
+        return self.submit(text).result()
+
+    async def aembed(self, text):
+        """Embed a text without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect_batch(self):
+        """
+        Wait for a first request, then keep collecting until the batch
+        is full or the first request has waited max_wait_seconds.
+        """
+        first = self._queue.get()
+        if first is None:
+            self._stopped.set()
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # close() was called, finish this batch and stop
+                self._stopped.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect_batch()
+            if batch is None:
+                break
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((started - enqueued) * 1000)
+            self.batch_sizes.observe(len(batch))
+            try:
+                embeddings = self.encode_batch([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+        # fail anything that was queued after close()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("EmbeddingBatcher is closed"))
+
+    def stats(self):
+        """Batch-size and queue-wait histograms."""
+        return {
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot()
+        }
+
+    def close(self):
+        """Stop the scheduler thread once queued requests are done."""
+        self._queue.put(None)
+        self._worker.join(timeout=5)
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+import sqlite3
+import threading
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache for query embeddings, keyed on the normalized
+    text and the model name. An optional sqlite file keeps warm
+    entries around across restarts, up to max_disk_entries of them with
+    the oldest written evicted first.
+    """
+
+    def __init__(self, max_entries=1024, persist_path=None, lowercase=False, max_disk_entries=20000):
+        """
+        Args:
+            max_entries (int): Maximum number of embeddings kept in memory
+            persist_path (str): Optional sqlite file for the persistent tier
+            lowercase (bool): Also lowercase text when normalizing, only safe for uncased models
+            max_disk_entries (int): Maximum number of embeddings kept in the sqlite file
+        """
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.max_disk_entries = max_disk_entries
+        self.lowercase = lowercase
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if persist_path:
+            # shared between request threads, all access goes through self._lock
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+            # upper bound on the rows in the file, replaced keys are counted twice until the next eviction
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._evict_disk_entries()
+
+    def normalize(self, text):
+        """Collapse whitespace so trivially different questions share an entry."""
+        text = " ".join(text.split())
+        return text.lower() if self.lowercase else text
+
+    def _key(self, text, model_name):
+        return f"{model_name}\x00{self.normalize(text)}"
+
+    def get(self, text, model_name):
+        """
+        Look up a cached embedding.
+
+        Returns:
+            list: The embedding, or None on a miss
+        """
+        key = self._key(text, model_name)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(embedding)
+
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+                    self._remember(key, embedding)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return list(embedding)
+
+            self.misses += 1
+            return None
+
+    def put(self, text, model_name, embedding):
+        """Add an embedding to the cache (and to the persistent tier if enabled)."""
+        key = self._key(text, model_name)
+        with self._lock:
+            self._remember(key, list(embedding))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, np.asarray(embedding, dtype=np.float32).tobytes())
+                )
+                self._disk_entries += 1
+                self._evict_disk_entries()
+                self._db.commit()
+
+    def _evict_disk_entries(self):
+        """
+        Trim the sqlite file to 90% of max_disk_entries once it is over the
+        limit, so eviction runs once per many puts. A replaced row gets a new
+        rowid, so the lowest rowids are the oldest writes.
+        """
+        # caller holds self._lock (or is __init__)
+        if self._disk_entries <= self.max_disk_entries:
+            return
+        self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if self._disk_entries > self.max_disk_entries:
+            excess = self._disk_entries - int(self.max_disk_entries * 0.9)
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)",
+                (excess,)
+            )
+            self._db.commit()
+            self._disk_entries -= excess
+
+    def _remember(self, key, embedding):
+        # caller holds self._lock
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached embeddings, including the persistent tier."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+                self._disk_entries = 0
+
+    def stats(self):
+        """Hit/miss counters for tuning the cache size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "disk_entries": self._disk_entries if self._db is not None else 0,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """Close the persistent tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,278 @@
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from telemetry.metrics import metrics
+
+# Binary protocol over a Unix stream socket, all integers little-endian.
+#   request:  op (u8), count (u32), batch_size (u32), then for ENCODE count text
+#             lengths (u32) followed by the UTF-8 texts back to back
+#   response: status (u8), count (u32), dimension (u32), then
+#             OK + ENCODE: count * dimension float32 values
+#             OK + INFO:   the model name, count bytes long
+#             ERROR:       the error message, count bytes long
+# A connection carries any number of request/response pairs, one at a time.
+OP_ENCODE = 1
+OP_INFO = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+HEADER = struct.Struct("<BII")
+# refuse requests that would make the server buffer more than this
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+def _recv_exactly(sock, size):
+    """Read exactly size bytes, raise ConnectionError if the peer closes first."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("Embedding server connection closed")
+        received += n
+    return buffer
+
+def _send_error(sock, message):
+    message = message.encode("utf-8")
+    sock.sendall(HEADER.pack(STATUS_ERROR, len(message), 0) + message)
+
+class EmbeddingServer:
+    """
+    Serves one loaded embedding model to any number of local processes
+    over a Unix socket, so serving and ingestion workers don't each load
+    their own copy. Every connection gets its own thread; single-text
+    requests go through the generator's cache and micro-batcher, so
+    questions from different workers can share a forward pass.
+    """
+
+    def __init__(self, embedding_generator, socket_path):
+        """
+        Args:
+            embedding_generator (EmbeddingGenerator): Generator with the model to serve
+            socket_path (str): Path of the Unix socket to listen on
+        """
+        self.embedding_generator = embedding_generator
+        self.socket_path = socket_path
+        self.requests = 0
+        self.texts = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _encode(self, texts, batch_size):
+        if len(texts) == 1 and texts[0]:
+            embeddings = [self.embedding_generator.generate_embedding(texts[0])]
+        else:
+            embeddings = self.embedding_generator.model.encode(texts, batch_size=batch_size)
+        return np.asarray(embeddings, dtype="<f4").reshape(len(texts), -1)
+
+    def _handle_request(self, sock):
+        op, count, batch_size = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+        if op == OP_INFO:
+            name = self.embedding_generator.model_name.encode("utf-8")
+            dimension = self.embedding_generator.vector_dimension
+            sock.sendall(HEADER.pack(STATUS_OK, len(name), dimension) + name)
+            return
+        if op != OP_ENCODE:
+            raise ValueError(f"Unknown embedding server operation: {op}")
+        if count * 4 > MAX_REQUEST_BYTES:
+            raise ValueError(f"Request of {count} texts is too large")
+        lengths = struct.unpack(f"<{count}I", _recv_exactly(sock, count * 4))
+        if sum(lengths) > MAX_REQUEST_BYTES:
+            raise ValueError(f"Request of {sum(lengths)} bytes is too large")
+        data = _recv_exactly(sock, sum(lengths))
+        texts = []
+        offset = 0
+        for length in lengths:
+            texts.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        embeddings = self._encode(texts, batch_size or 32)
+        with self._lock:
+            self.requests += 1
+            self.texts += count
+        metrics.increment("embedding_server_requests_total")
+        metrics.increment("embedding_server_texts_total", count)
+        sock.sendall(HEADER.pack(STATUS_OK, count, embeddings.shape[1] if count else 0) + embeddings.tobytes())
+
+    def _handle_connection(self, sock):
+        with self._lock:
+            self.connections += 1
+        try:
+            while True:
+                try:
+                    self._handle_request(sock)
+                except (ConnectionError, OSError):
+                    return
+                except Exception as e:
+                    # after a malformed request the rest of the stream can't be trusted, so always hang up
+                    print(f"Embedding server error: {e}")
+                    metrics.increment("rag_errors_total", stage="embedding_server")
+                    try:
+                        _send_error(sock, str(e))
+                    except OSError:
+                        pass
+                    return
+        finally:
+            with self._lock:
+                self.connections -= 1
+
+    def start(self):
+        """
+        Listen on the socket and serve connections in a background thread.
+        A stale socket file left by a previous run is replaced.
+
+        Returns:
+            Thread: The accepting thread
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._handle_connection(self.request)
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, name="embedding-server", daemon=True)
+        thread.start()
+        print(f"Serving embedding model {self.embedding_generator.model_name} on {self.socket_path}")
+        return thread
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "texts": self.texts, "connections": self.connections}
+
+class EmbeddingClient:
+    """
+    Thin client for an EmbeddingServer with the parts of the
+    SentenceTransformer interface EmbeddingGenerator uses, so it can be
+    passed as its model. Connections are kept open and reused, one per
+    concurrent caller.
+    """
+
+    def __init__(self, socket_path, model_name=None, timeout_seconds=30, connect_timeout_seconds=10):
+        """
+        Args:
+            socket_path (str): Unix socket the embedding server listens on
+            model_name (str): Model the server must serve, None accepts any
+            timeout_seconds (float): Longest wait for one response
+            connect_timeout_seconds (float): How long to keep retrying while the
+                server is not up yet, e.g. when both start at the same time
+        """
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.timeout_seconds = timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self._info = None
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        give_up_at = time.monotonic() + self.connect_timeout_seconds
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout_seconds)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() >= give_up_at:
+                    raise ConnectionError(f"No embedding server listening on {self.socket_path}")
+                time.sleep(0.1)
+
+    def _request(self, payload, read_response):
+        """
+        Send one request and read its response, on an idle connection if
+        there is one. A reused connection may have been closed by a server
+        restart, so a failure on it is retried once on a new connection.
+        """
+        with self._lock:
+            sock = self._idle.pop() if self._idle else None
+        reused = sock is not None
+        while True:
+            if sock is None:
+                sock = self._connect()
+            try:
+                sock.sendall(payload)
+                status, count, dimension = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+                if status != STATUS_OK:
+                    message = _recv_exactly(sock, count).decode("utf-8")
+                    sock.close()
+                    raise RuntimeError(f"Embedding server error: {message}")
+                result = read_response(sock, count, dimension)
+            except (ConnectionError, OSError) as e:
+                # timeouts included, a late response would be read as the next one's
+                sock.close()
+                if not reused:
+                    raise ConnectionError(f"Embedding server request failed: {e}") from e
+                metrics.increment("embedding_server_reconnects_total")
+                sock, reused = None, False
+                continue
+            with self._lock:
+                self._idle.append(sock)
+            return result
+
+    def info(self):
+        """
+        Name and dimension of the served model, checked against the
+        expected model name on first use.
+
+        Returns:
+            dict: {"model_name": str, "dimension": int}
+        """
+        if self._info is None:
+            info = self._request(
+                HEADER.pack(OP_INFO, 0, 0),
+                lambda sock, count, dimension: {
+                    "model_name": _recv_exactly(sock, count).decode("utf-8"),
+                    "dimension": dimension
+                }
+            )
+            if self.model_name is not None and info["model_name"] != self.model_name:
+                raise ValueError(
+                    f"Embedding server on {self.socket_path} serves {info['model_name']}, expected {self.model_name}"
+                )
+            self._info = info
+        return self._info
+
+    def get_sentence_embedding_dimension(self):
+        return self.info()["dimension"]
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        dimension = self.get_sentence_embedding_dimension()
+        single = isinstance(sentences, str)
+        texts = [text.encode("utf-8") for text in ([sentences] if single else sentences)]
+        if not texts:
+            return np.zeros((0, dimension), dtype=np.float32)
+        payload = b"".join([
+            HEADER.pack(OP_ENCODE, len(texts), batch_size),
+            struct.pack(f"<{len(texts)}I", *(len(text) for text in texts)),
+            *texts
+        ])
+
+        def read_embeddings(sock, count, dimension):
+            data = _recv_exactly(sock, count * dimension * 4)
+            return np.frombuffer(data, dtype="<f4").reshape(count, dimension)
+
+        embeddings = self._request(payload, read_embeddings)
+        return embeddings[0] if single else embeddings
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
@@ -1,17 +1,148 @@
-from sentence_transformers import SentenceTransformer
 from datetime import datetime
+import asyncio
 import json
+import threading
+import time
+from rag.embedding_batcher import EmbeddingBatcher
+from rag.onnx_backend import check_backend, cached_parity, load_onnx_model, onnx_file_name
+from rag.vector_codec import check_encoding, encode_embedding
+from telemetry.metrics import metrics
 
 class EmbeddingGenerator:
     """
     Generates vectorembeddings from text using langchain 
     and a pre-trained model.
     """
-    def __init__(self, model_name):
-        self.model = SentenceTransformer(model_name)
-        self.vector_dimension = self.model.get_sentence_embedding_dimension()
-        print(f"Loaded embedding model: {model_name} with dimension {self.vector_dimension}")
-        
+    def __init__(self, model_name, cache=None, model=None, encoding="json", backend="torch", onnx_dir=".onnx_models", quantization="avx2", parity_min_cosine=0.98):
+        """
+        The model is loaded on first use, or in the background
+        with load_in_background(), not here.
+
+        Args:
+            model_name (str): sentence-transformers model to load
+            cache (EmbeddingCache): Optional cache for repeated query texts
+            model: Optional already loaded model with the SentenceTransformer
+                encode() interface, used instead of loading model_name
+            encoding (str): How embeddings are stored in vector documents,
+                see rag.vector_codec
+            backend (str): "torch", "onnx" or "onnx-int8", see rag.onnx_backend
+            onnx_dir (str): Where ONNX exports are cached
+            quantization (str): Instruction set the onnx-int8 export targets
+            parity_min_cosine (float): Lowest cosine similarity to the PyTorch
+                embeddings an ONNX export may have, otherwise PyTorch is used
+        """
+        self.model_name = model_name
+        # optional EmbeddingCache for repeated query texts
+        self.cache = cache
+        self.encoding = check_encoding(encoding)
+        self.backend = check_backend(backend, quantization)
+        self.onnx_dir = onnx_dir
+        self.quantization = quantization
+        self.parity_min_cosine = parity_min_cosine
+        # result of the ONNX parity check, None for the PyTorch backend
+        self.parity = None
+        # optional EmbeddingBatcher that groups concurrent queries, see enable_batching()
+        self.batcher = None
+        self._model = model
+        self._load_lock = threading.Lock()
+        self._load_thread = None
+        self._load_error = None
+        # seconds spent loading and warming up the model, for the startup report
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def model(self):
+        """The embedding model, loaded (or waited for) on first access."""
+        if self._model is None:
+            self.load_model()
+        return self._model
+
+    @property
+    def vector_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def load_model(self):
+        """
+        Load the model if it isn't loaded yet. Callers arriving while
+        another thread is loading it wait for that load instead of starting their own.
+        """
+        with self._load_lock:
+            if self._model is None:
+                started = time.perf_counter()
+                # sentence-transformers pulls in torch, so it is only imported when a model is needed
+                from sentence_transformers import SentenceTransformer
+                model = self._load_onnx_model() if self.backend != "torch" else None
+                self._model = model if model is not None else SentenceTransformer(self.model_name)
+                self.load_seconds = time.perf_counter() - started
+                print(
+                    f"Loaded embedding model: {self.model_name} ({self.backend} backend) with dimension "
+                    f"{self._model.get_sentence_embedding_dimension()} in {self.load_seconds:.2f}s"
+                )
+        return self._model
+
+    def _load_onnx_model(self):
+        """
+        Load the ONNX export of the model, exporting it on first use.
+
+        Returns:
+            SentenceTransformer: The ONNX model, or None to fall back to PyTorch
+                when ONNX Runtime is missing or the export fails the parity check
+        """
+        try:
+            model, target = load_onnx_model(self.model_name, self.backend, self.onnx_dir, self.quantization)
+            self.parity = cached_parity(
+                model, self.model_name, target, onnx_file_name(self.backend, self.quantization), self.parity_min_cosine
+            )
+        except ImportError as e:
+            print(f"The {self.backend} backend needs optimum and onnxruntime (pip install \"optimum[onnxruntime]\"): {e}")
+            print("Using the PyTorch backend")
+            metrics.increment("rag_fallbacks_total", kind="torch_backend")
+            return None
+        if not self.parity["passed"]:
+            print(
+                f"The {self.backend} export of {self.model_name} is too far from the PyTorch model "
+                f"(min cosine {self.parity['min_cosine']:.4f} < {self.parity_min_cosine}), using the PyTorch backend"
+            )
+            metrics.increment("rag_fallbacks_total", kind="torch_backend")
+            return None
+        print(f"{self.backend} parity with PyTorch: min cosine {self.parity['min_cosine']:.4f}, mean {self.parity['mean_cosine']:.4f}")
+        return model
+
+    def load_in_background(self, warmup=True):
+        """
+        Load (and warm up) the model in a background thread, e.g. while
+        connecting to the cluster. Anything needing the model meanwhile waits for it.
+
+        Returns:
+            Thread: The loading thread
+        """
+        if self._load_thread is None:
+            def load():
+                try:
+                    self.load_model()
+                    if warmup:
+                        self.warmup()
+                except Exception as e:
+                    self._load_error = e
+                    print(f"Error loading embedding model {self.model_name}: {e}")
+
+            self._load_thread = threading.Thread(target=load, name="embedding-model-load", daemon=True)
+            self._load_thread.start()
+        return self._load_thread
+
+    def wait_until_loaded(self):
+        """
+        Block until a background load (and warmup) has finished.
+        Raises the load error if it failed.
+        """
+        if self._load_thread is not None:
+            self._load_thread.join()
+        if self._load_error is not None:
+            raise self._load_error
+        return self.model
+
+
     def generate_embedding(self, text):
         """
         Generate an embedding vector for the given text.
@@ -20,23 +151,130 @@ class EmbeddingGenerator:
         """
         if not text:
             return None
-        
-        embedding = self.model.encode(text)
-        # arrays are not JSON serializable, so we convert to list
-        return embedding.tolist()
 
-    def store_embedding(self, client, doc_id, text, scope_name, collection_name):
+        if self.cache is not None:
+            cached = self.cache.get(text, self.model_name)
+            if cached is not None:
+                return cached
+
+        if self.batcher is not None:
+            embedding = self.batcher.embed(text)
+        else:
+            embedding = self.model.encode(text)
+            # arrays are not JSON serializable, so we convert to list
+            embedding = embedding.tolist()
+        if self.cache is not None:
+            self.cache.put(text, self.model_name, embedding)
+        return embedding
+
+    async def agenerate_embedding(self, text, executor=None):
+        """
+        Async version of generate_embedding. With batching enabled the
+        request joins the scheduler's next batch, otherwise encoding runs
+        on the given executor so it never blocks the event loop.
+        """
+        if not text:
+            return None
+
+        if self.batcher is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, self.generate_embedding, text)
+
+        if self.cache is not None:
+            cached = self.cache.get(text, self.model_name)
+            if cached is not None:
+                return cached
+        embedding = await self.batcher.aembed(text)
+        if self.cache is not None:
+            self.cache.put(text, self.model_name, embedding)
+        return embedding
+
+    def enable_batching(self, max_batch_size=32, max_wait_ms=5):
+        """
+        Route single-query embeddings through a micro-batching scheduler,
+        so concurrent questions share one model forward pass.
+        """
+        if self.batcher is None:
+            self.batcher = EmbeddingBatcher(
+                lambda texts: self.generate_embeddings(texts, batch_size=max_batch_size),
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms
+            )
+        return self.batcher
+
+    def warmup(self):
+        """
+        Run one throwaway encode so the first real question
+        doesn't pay for lazy initialization inside the model.
+        """
+        model = self.model
+        started = time.perf_counter()
+        model.encode("warmup")
+        self.warmup_seconds = time.perf_counter() - started
+
+    def generate_embeddings(self, texts, batch_size=32):
+        """
+        Generate embedding vectors for a list of texts.
+        The whole list is passed to the model in one encode call,
+        which lets it run batch_size texts per forward pass.
+        """
+        if not texts:
+            return []
+
+        embeddings = self.model.encode(texts, batch_size=batch_size)
+        return [embedding.tolist() for embedding in embeddings]
+
+    def generate_query_embeddings(self, texts, batch_size=256):
+        """
+        Embed many questions at once, e.g. when replaying logged questions.
+        Cached embeddings are reused and the rest are encoded in one call.
+        New embeddings are not added to the cache, so a large run doesn't
+        evict the entries live questions depend on.
+
+        Returns:
+            list: One embedding per text, None for empty texts
+        """
+        embeddings = [None] * len(texts)
+        missing = []
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            cached = self.cache.get(text, self.model_name) if self.cache is not None else None
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing.append(i)
+        if missing:
+            encoded = self.generate_embeddings([texts[i] for i in missing], batch_size=batch_size)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+        return embeddings
+
+    def _vector_document(self, doc_id, embedding, content_hash=None):
+        """
+        Build the document stored in the vectors collection.
+        The content hash and model name let the loader detect
+        embeddings that are out of date.
+        """
+        vector_doc = {
+            "doc_id": doc_id,
+            "embedding_encoding": self.encoding,
+            "content_hash": content_hash,
+            "model_name": self.model_name,
+            "created_at": datetime.now().isoformat()
+        }
+        vector_doc.update(encode_embedding(embedding, self.encoding))
+        return vector_doc
+
+    def store_embedding(self, client, doc_id, text, scope_name, collection_name, content_hash=None):
         """
         Store a vector embedding in the specified collection.
         """
         try:
-            embedding = self.generate_embedding(text)
+            # encoded directly like the batch path, landmark texts would only push questions out of the query cache
+            embedding = self.generate_embeddings([text])[0]
             # Create vector document
-            vector_doc = {
-                "doc_id": doc_id,
-                "embedding": embedding,
-                "created_at": datetime.now().isoformat()
-            }
+            vector_doc = self._vector_document(doc_id, embedding, content_hash)
             # Try to get the specified collection
             try:
                 vectors_collection = client.bucket.scope(scope_name).collection(collection_name)
@@ -46,6 +284,7 @@ class EmbeddingGenerator:
                 return True
             except Exception as e:
                 print(f"Capella collection access failed, make sure the collection exists: {e}")
+                metrics.increment("rag_fallbacks_total", kind="query_insert")
                 print("Trying to insert via query...")
                 client.create_embedding_collection(scope_name, collection_name)
                 # If Capella collection access fails, try to insert via query
@@ -59,4 +298,61 @@ class EmbeddingGenerator:
                 
         except Exception as e:
             print(f"Error storing embedding: {e}")
-            return False 
\ No newline at end of file
+            metrics.increment("rag_errors_total", stage="store_embedding")
+            return False 
+
+    def store_embeddings(self, client, embeddings, scope_name, collection_name, content_hashes=None):
+        """
+        Store a batch of vector embeddings with one multi-document upsert.
+
+        Args:
+            client (CapellaClient): Connected Capella client
+            embeddings (dict): Mapping of document ID to embedding vector
+            scope_name (str): Scope of the vectors collection
+            collection_name (str): Name of the vectors collection
+            content_hashes (dict): Optional mapping of document ID to content hash
+
+        Returns:
+            list: IDs of the documents that could not be stored
+        """
+        if not embeddings:
+            return []
+
+        content_hashes = content_hashes or {}
+        vector_docs = {
+            f"vector::{doc_id}": self._vector_document(doc_id, embedding, content_hashes.get(doc_id))
+            for doc_id, embedding in embeddings.items()
+        }
+        try:
+            vectors_collection = client.bucket.scope(scope_name).collection(collection_name)
+            result = vectors_collection.upsert_multi(vector_docs)
+        except Exception as e:
+            print(f"Batch upsert failed, storing embeddings one by one: {e}")
+            metrics.increment("rag_fallbacks_total", kind="single_upsert")
+            return [
+                doc_id for doc_id, embedding in embeddings.items()
+                if not self._store_vector_document(
+                    client, doc_id, embedding, scope_name, collection_name, content_hashes.get(doc_id)
+                )
+            ]
+
+        failed = []
+        if not result.all_ok:
+            for vector_id, error in result.exceptions.items():
+                print(f"Error storing embedding {vector_id}: {error}")
+                metrics.increment("rag_errors_total", stage="store_embedding")
+                failed.append(vector_id.replace("vector::", "", 1))
+        return failed
+
+    def _store_vector_document(self, client, doc_id, embedding, scope_name, collection_name, content_hash=None):
+        """
+        Store a single, already generated embedding.
+        """
+        try:
+            vectors_collection = client.bucket.scope(scope_name).collection(collection_name)
+            vectors_collection.upsert(f"vector::{doc_id}", self._vector_document(doc_id, embedding, content_hash))
+            return True
+        except Exception as e:
+            print(f"Error storing embedding for {doc_id}: {e}")
+            metrics.increment("rag_errors_total", stage="store_embedding")
+            return False
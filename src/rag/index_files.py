@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+class IndexGenerations:
+    """
+    Folders of the successive builds of a memory-mapped index. A build
+    writes its files into a new generation folder and then points the
+    CURRENT file at it with an atomic rename; files that may still be
+    mapped are never replaced. Open memory maps keep reading the
+    generation they were opened on, and Windows refuses to replace or
+    delete a mapped file anyway. Old generations are removed once a newer
+    one is loaded, and retried on later builds if they are still in use.
+    """
+
+    POINTER_FILE = "CURRENT"
+    PREFIX = "generation-"
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+
+    def current(self):
+        """
+        Folder of the generation CURRENT points at. Indexes built before
+        there were generations live directly in the index folder.
+
+        Returns:
+            str: The folder to load the index files from
+        """
+        try:
+            with open(os.path.join(self.index_dir, self.POINTER_FILE)) as f:
+                return os.path.join(self.index_dir, f.read().strip())
+        except FileNotFoundError:
+            return self.index_dir
+
+    def create(self):
+        """
+        Returns:
+            str: A new, empty generation folder to write the index files to
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        return tempfile.mkdtemp(prefix=self.PREFIX, dir=self.index_dir)
+
+    def publish(self, folder):
+        """Make a fully written generation the current one."""
+        pointer = os.path.join(self.index_dir, self.POINTER_FILE)
+        with open(f"{pointer}.tmp", "w") as f:
+            f.write(os.path.basename(folder))
+        os.replace(f"{pointer}.tmp", pointer)
+
+    def remove_stale(self, keep):
+        """
+        Delete every generation folder except the ones in keep, skipping
+        files another process still has mapped.
+
+        Args:
+            keep (list): Generation folders still in use, None entries are ignored
+        """
+        keep = {os.path.basename(folder) for folder in keep if folder}
+        for name in os.listdir(self.index_dir):
+            if name.startswith(self.PREFIX) and name not in keep:
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
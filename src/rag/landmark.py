@@ -0,0 +1,40 @@
+class LandmarkRecord:
+    """
+    The landmark fields the chatbot uses, carried from the fetch or
+    search row to the formatted answer without serializing them in
+    between. Fields a document doesn't have are None.
+    """
+    __slots__ = ("id", "name", "content", "country", "city", "state", "type", "activity", "title")
+    FIELDS = __slots__[1:]
+
+    def __init__(self, doc_id, name=None, content=None, country=None, city=None, state=None, type=None, activity=None, title=None):
+        self.id = doc_id
+        self.name = name
+        self.content = content
+        self.country = country
+        self.city = city
+        self.state = state
+        self.type = type
+        self.activity = activity
+        self.title = title
+
+    @classmethod
+    def from_dict(cls, doc_id, document):
+        """Build a record from a landmark document or search row fields, ignoring other fields."""
+        return cls(doc_id, *(document.get(field) for field in cls.FIELDS))
+
+    def to_dict(self):
+        """The fields that are set, e.g. for a JSON response."""
+        document = {"id": self.id}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                document[field] = value
+        return document
+
+    def text(self):
+        """Plain text of the landmark, the page content of its LangChain Document."""
+        return f"{self.name or ''}: {self.content or ''}"
+
+    def __repr__(self):
+        return f"LandmarkRecord({self.id!r}, {self.name!r})"
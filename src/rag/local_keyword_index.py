@@ -0,0 +1,176 @@
+from collections import Counter
+import json
+import os
+import re
+import numpy as np
+from rag.index_files import IndexGenerations
+
+# words the Capella standard analyzer drops as well, they match nearly every landmark
+STOP_WORDS = frozenset("""
+a an and are as at be but by can do does for from get go has have how i if in into is it its me my near
+of on or our should so some than that the their them then there these they this to us was we what when
+where which who why will with would you your
+""".split())
+
+def tokenize(text):
+    """Lowercased words of a text without stop words, the terms of the keyword index."""
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOP_WORDS]
+
+class LocalKeywordIndex:
+    """
+    In-process BM25 keyword index over the landmark fields the Capella
+    full text search index covers. The postings are stored as flat numpy
+    arrays (CSR layout: the documents and BM25 weights of term i are at
+    offsets[i]:offsets[i + 1]) that are memory-mapped on load, and a
+    search adds up the precomputed weights of the query terms.
+    """
+
+    FIELDS = ["name", "content", "activity", "title", "city", "country", "state", "type"]
+    OFFSETS_FILE = "offsets.npy"
+    DOCS_FILE = "postings.npy"
+    WEIGHTS_FILE = "weights.npy"
+    TERMS_FILE = "terms.json"
+    IDS_FILE = "ids.json"
+
+    def __init__(self, index_dir, k1=1.2, b=0.75):
+        """
+        Args:
+            index_dir (str): Folder the index files are stored in
+            k1 (float): BM25 term frequency saturation
+            b (float): BM25 document length normalization
+        """
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self._generations = IndexGenerations(index_dir)
+        # (terms, offsets, postings, weights, ids) are swapped together on rebuild
+        self._index = None
+        self._loaded_folder = None
+
+    @property
+    def is_loaded(self):
+        return self._index is not None
+
+    def __len__(self):
+        return len(self._index[4]) if self._index else 0
+
+    def build(self, capella_client, scope_name="inventory", collection_name="landmark", page_size=1000):
+        """
+        Build the index from every document in the landmark collection
+        and load it. Landmarks are read a page at a time, only their term
+        counts are kept.
+
+        Returns:
+            int: Number of landmarks in the index
+        """
+        fields = ", ".join(f"l.{field}" for field in self.FIELDS)
+        query = f"""
+        SELECT META(l).id AS id, {fields}
+        FROM `{capella_client.bucket_name}`.`{scope_name}`.`{collection_name}` AS l
+        WHERE META(l).id > $last_id
+        ORDER BY META(l).id
+        LIMIT $page_size
+        """
+        term_ids = {}
+        ids = []
+        lengths = []
+        posting_terms = []
+        posting_docs = []
+        posting_counts = []
+        for page in capella_client.paginate_query(query, page_size=page_size):
+            for row in page:
+                text = " ".join(str(row[field]) for field in self.FIELDS if row.get(field))
+                terms = tokenize(text)
+                doc_index = len(ids)
+                ids.append(row.get("id"))
+                lengths.append(len(terms))
+                for term, count in Counter(terms).items():
+                    posting_terms.append(term_ids.setdefault(term, len(term_ids)))
+                    posting_docs.append(doc_index)
+                    posting_counts.append(count)
+        if not ids:
+            raise ValueError(f"No landmarks found in {scope_name}.{collection_name}")
+
+        terms = np.asarray(posting_terms, dtype=np.int32)
+        docs = np.asarray(posting_docs, dtype=np.int32)
+        counts = np.asarray(posting_counts, dtype=np.float32)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        # group the postings by term, documents stay in ID order within a term
+        order = np.argsort(terms, kind="stable")
+        terms, docs, counts = terms[order], docs[order], counts[order]
+        offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(term_ids)), out=offsets[1:])
+
+        # everything in the BM25 sum except the query is known now, so store each posting's weight
+        document_frequency = np.diff(offsets).astype(np.float32)
+        idf = np.log(1 + (len(ids) - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = float(lengths.mean()) or 1.0
+        saturation = counts * (self.k1 + 1) / (counts + self.k1 * (1 - self.b + self.b * lengths[docs] / average_length))
+        weights = (idf[terms] * saturation).astype(np.float32)
+
+        folder = self._generations.create()
+        for name, array in ((self.OFFSETS_FILE, offsets), (self.DOCS_FILE, docs), (self.WEIGHTS_FILE, weights)):
+            np.save(os.path.join(folder, name), array)
+        for name, values in ((self.TERMS_FILE, list(term_ids)), (self.IDS_FILE, ids)):
+            with open(os.path.join(folder, name), "w") as f:
+                json.dump(values, f)
+        self._generations.publish(folder)
+
+        previous = self._loaded_folder
+        self.load()
+        self._generations.remove_stale(keep=[folder, previous])
+        print(f"Built local keyword index with {len(ids)} landmarks and {len(term_ids)} terms in {self.index_dir}")
+        return len(ids)
+
+    def load(self):
+        """
+        Memory-map a previously built index.
+
+        Returns:
+            bool: True if an index was found and loaded
+        """
+        folder = self._generations.current()
+        names = [self.OFFSETS_FILE, self.DOCS_FILE, self.WEIGHTS_FILE, self.TERMS_FILE, self.IDS_FILE]
+        paths = [os.path.join(folder, name) for name in names]
+        if not all(os.path.exists(path) for path in paths):
+            return False
+        offsets, docs, weights = (np.load(path, mmap_mode="r") for path in paths[:3])
+        with open(paths[3]) as f:
+            terms = {term: i for i, term in enumerate(json.load(f))}
+        with open(paths[4]) as f:
+            ids = json.load(f)
+        self._index = (terms, offsets, docs, weights, ids)
+        self._loaded_folder = folder
+        return True
+
+    def search(self, query, k):
+        """
+        Find the k landmarks with the highest BM25 score for the query.
+
+        Returns:
+            list: (doc_id, score) tuples, best match first, only landmarks
+                that contain at least one query term
+        """
+        if self._index is None:
+            raise RuntimeError("Local keyword index is not loaded. Call build() or load() first.")
+        terms, offsets, docs, weights, ids = self._index
+        scores = None
+        for term, count in Counter(tokenize(query)).items():
+            term_id = terms.get(term)
+            if term_id is None:
+                continue
+            if scores is None:
+                scores = np.zeros(len(ids), dtype=np.float32)
+            start, end = offsets[term_id], offsets[term_id + 1]
+            # a document appears once per term, so plain fancy-index addition is safe
+            scores[docs[start:end]] += weights[start:end] * count
+        if scores is None:
+            return []
+        matches = np.flatnonzero(scores)
+        k = min(k, len(matches))
+        if k <= 0:
+            return []
+        if k < len(matches):
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        matches = matches[np.argsort(-scores[matches], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in matches]
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import numpy as np
+from rag.index_files import IndexGenerations
+from rag.vector_codec import ENCODING_FIELDS, SCALE_FIELD, decode_embedding
+
+class LocalVectorIndex:
+    """
+    In-process vector index built from the vectors collection.
+    Embeddings are stored as a memory-mapped float32 matrix of unit
+    vectors, so a top-k cosine search is a single matrix-vector product.
+    """
+
+    MATRIX_FILE = "embeddings.npy"
+    IDS_FILE = "ids.json"
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._generations = IndexGenerations(index_dir)
+        # (matrix, ids) are swapped together so searches never see a half refreshed index
+        self._index = None
+        self._loaded_folder = None
+        self._refresh_thread = None
+        self._stop_refresh = threading.Event()
+
+    @property
+    def is_loaded(self):
+        return self._index is not None
+
+    def __len__(self):
+        return len(self._index[1]) if self._index else 0
+
+    def build(self, capella_client, scope_name="inventory", collection_name="vectors"):
+        """
+        Build the index from every embedding in the vectors collection
+        and load it. Embeddings may be stored in any vector_codec encoding.
+
+        Returns:
+            int: Number of embeddings in the index
+        """
+        fields = ", ".join(f"v.{field}" for field in list(ENCODING_FIELDS.values()) + [SCALE_FIELD])
+        query = f"""
+        SELECT v.doc_id, v.embedding_encoding, {fields}
+        FROM `{capella_client.bucket_name}`.`{scope_name}`.`{collection_name}` AS v
+        """
+        ids = []
+        vectors = []
+        # rows are decoded as they arrive, only the float32 vectors are kept
+        for row in capella_client.stream_query(query):
+            embedding = decode_embedding(row)
+            if embedding is not None:
+                ids.append(row.get("doc_id"))
+                vectors.append(embedding)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError(f"No embeddings found in {scope_name}.{collection_name}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        folder = self._generations.create()
+        np.save(os.path.join(folder, self.MATRIX_FILE), matrix)
+        with open(os.path.join(folder, self.IDS_FILE), "w") as f:
+            json.dump(ids, f)
+        self._generations.publish(folder)
+
+        previous = self._loaded_folder
+        self.load()
+        # searches still running may hold the previous generation
+        self._generations.remove_stale(keep=[folder, previous])
+        print(f"Built local vector index with {len(ids)} embeddings in {self.index_dir}")
+        return len(ids)
+
+    def load(self):
+        """
+        Memory-map a previously built index.
+
+        Returns:
+            bool: True if an index was found and loaded
+        """
+        folder = self._generations.current()
+        matrix_path = os.path.join(folder, self.MATRIX_FILE)
+        ids_path = os.path.join(folder, self.IDS_FILE)
+        if not (os.path.exists(matrix_path) and os.path.exists(ids_path)):
+            return False
+        matrix = np.load(matrix_path, mmap_mode="r")
+        with open(ids_path) as f:
+            ids = json.load(f)
+        self._index = (matrix, ids)
+        self._loaded_folder = folder
+        return True
+
+    def search(self, query_embedding, k):
+        """
+        Find the k embeddings most similar to the query.
+
+        Returns:
+            list: (doc_id, cosine similarity) tuples, best match first
+        """
+        if self._index is None:
+            raise RuntimeError("Local vector index is not loaded. Call build() or load() first.")
+        matrix, ids = self._index
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = matrix @ query
+        k = min(k, len(ids))
+        if k <= 0:
+            return []
+        if k < len(ids):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def start_auto_refresh(self, capella_client, interval_seconds, scope_name="inventory", collection_name="vectors"):
+        """
+        Rebuild the index from the vectors collection every interval_seconds
+        in a background thread.
+        """
+        if self._refresh_thread is not None:
+            return
+        self._stop_refresh.clear()
+
+        def refresh_loop():
+            while not self._stop_refresh.wait(interval_seconds):
+                try:
+                    self.build(capella_client, scope_name, collection_name)
+                except Exception as e:
+                    print(f"Local vector index refresh failed, keeping the previous index: {e}")
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, name="vector-index-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_auto_refresh(self):
+        """Stop the background refresh thread."""
+        self._stop_refresh.set()
+        self._refresh_thread = None
@@ -0,0 +1,116 @@
+import json
+import os
+import numpy as np
+
+# "torch" runs the model as downloaded, "onnx" through ONNX Runtime,
+# "onnx-int8" through ONNX Runtime with dynamically int8-quantized weights
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# instruction sets optimum can target when quantizing
+QUANTIZATION_CONFIGS = ("arm64", "avx2", "avx512", "avx512_vnni")
+PARITY_FILE = "parity.json"
+# questions and landmark texts shaped like what the chatbot embeds
+PARITY_TEXTS = [
+    "museums in Paris",
+    "What is there to do in London?",
+    "quiet beach near Los Angeles",
+    "where can I get good wine in Marseille",
+    "historic castles in Scotland",
+    "family friendly parks with a view",
+    "Eiffel Tower The iconic wrought-iron tower on the Champ de Mars France Paris landmark see",
+    "Golden Gate Bridge Suspension bridge with views of the bay United States San Francisco landmark see",
+    "Le Bistrot Classic French dishes in a small dining room France Lyon restaurant eat",
+    "British Museum Free museum of human history and culture United Kingdom London museum see"
+]
+
+def check_backend(backend, quantization="avx2"):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}, use one of {', '.join(BACKENDS)}")
+    if quantization not in QUANTIZATION_CONFIGS:
+        raise ValueError(f"Unknown quantization config: {quantization}, use one of {', '.join(QUANTIZATION_CONFIGS)}")
+    return backend
+
+def export_dir(model_name, cache_dir):
+    """Folder the ONNX export of a model is cached in."""
+    return os.path.join(cache_dir, model_name.strip("/\\").replace("/", "__").replace("\\", "__"))
+
+def onnx_file_name(backend, quantization):
+    """ONNX file of the export to load, relative to its folder."""
+    if backend == "onnx-int8":
+        return f"onnx/model_int8_{quantization}.onnx"
+    return "onnx/model.onnx"
+
+def export_onnx_model(model_name, backend="onnx", cache_dir=".onnx_models", quantization="avx2"):
+    """
+    Convert a model to ONNX (and quantize it for onnx-int8) unless
+    a previous run already did, so the export happens once per machine.
+
+    Returns:
+        str: The export folder
+    """
+    from sentence_transformers import SentenceTransformer
+    target = export_dir(model_name, cache_dir)
+    if not os.path.exists(os.path.join(target, onnx_file_name("onnx", quantization))):
+        print(f"Exporting {model_name} to ONNX in {target}, this only happens once...")
+        # with the onnx backend sentence-transformers converts the PyTorch weights on load
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(target)
+    if backend == "onnx-int8" and not os.path.exists(os.path.join(target, onnx_file_name(backend, quantization))):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        print(f"Quantizing {model_name} to int8 for {quantization}, this only happens once...")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(target, backend="onnx"), quantization, target, file_suffix=f"int8_{quantization}"
+        )
+    return target
+
+def load_onnx_model(model_name, backend="onnx", cache_dir=".onnx_models", quantization="avx2"):
+    """
+    Load the cached ONNX export of a model, exporting it first if needed.
+
+    Returns:
+        tuple: (SentenceTransformer, export folder)
+    """
+    from sentence_transformers import SentenceTransformer
+    target = export_onnx_model(model_name, backend, cache_dir, quantization)
+    model = SentenceTransformer(target, backend="onnx", model_kwargs={"file_name": onnx_file_name(backend, quantization)})
+    return model, target
+
+def check_parity(model, reference_model, texts=PARITY_TEXTS, min_cosine=0.98):
+    """
+    Compare a model's embeddings with a reference model's.
+
+    Returns:
+        dict: min and mean cosine similarity over the texts, and whether
+            the min is at least min_cosine
+    """
+    embeddings = np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    reference = np.asarray(reference_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    similarities = (embeddings * reference).sum(axis=1)
+    return {
+        "min_cosine": float(similarities.min()),
+        "mean_cosine": float(similarities.mean()),
+        "min_allowed": min_cosine,
+        "passed": bool(similarities.min() >= min_cosine),
+        "texts": len(texts)
+    }
+
+def cached_parity(model, model_name, target, file_name, min_cosine=0.98):
+    """
+    Parity of an export with the PyTorch model, checked once per export
+    file and remembered in the export folder.
+
+    Returns:
+        dict: See check_parity()
+    """
+    parity_path = os.path.join(target, PARITY_FILE)
+    results = {}
+    if os.path.exists(parity_path):
+        with open(parity_path) as f:
+            results = json.load(f)
+    result = results.get(file_name)
+    if result is None or result.get("min_allowed") != min_cosine:
+        from sentence_transformers import SentenceTransformer
+        print(f"Checking {file_name} embeddings against the PyTorch model...")
+        result = check_parity(model, SentenceTransformer(model_name), min_cosine=min_cosine)
+        results[file_name] = result
+        with open(parity_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return result
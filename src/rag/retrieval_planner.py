@@ -0,0 +1,89 @@
+import threading
+from telemetry.metrics import metrics
+
+class RetrievalPlanner:
+    """
+    Decides after vector search whether a keyword search is worth its
+    round-trip. The vector hits are trusted unless there are too few of
+    them, the best score is too low, or the best hit barely beats the
+    runner-up. Only used when keyword search is not requested anyway.
+    """
+
+    def __init__(self, min_results=None, min_top_score=None, min_score_gap=None):
+        """
+        Args:
+            min_results (int): Fewest vector hits that are enough on their own,
+                None asks for the retriever's num_candidates
+            min_top_score (float): Lowest acceptable score of the best hit, None never checks
+            min_score_gap (float): Smallest acceptable lead of the best hit over the
+                second best, None never checks
+        """
+        self.min_results = min_results
+        self.min_top_score = min_top_score
+        self.min_score_gap = min_score_gap
+        self.keyword_searches = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def needs_keyword_search(self, vector_docs, num_candidates):
+        """
+        Decide whether to run a keyword search after vector search, and
+        log the decision.
+
+        Args:
+            vector_docs (list): Documents found by vector search, None if it failed or timed out,
+                a list with a true partial attribute if it gave up on some landmarks
+            num_candidates (int): Documents the retriever was asked for
+
+        Returns:
+            bool: True if the vector hits are not confident enough
+        """
+        reason = self._low_confidence_reason(vector_docs, num_candidates)
+        with self._lock:
+            if reason is None:
+                self.skipped += 1
+            else:
+                self.keyword_searches += 1
+        if reason is None:
+            metrics.increment("rag_planner_decisions_total", decision="skip_keyword_search", reason="confident")
+            print(f"Retrieval plan: skipping keyword search, vector search is confident ({self._describe(vector_docs)})")
+            return False
+        metrics.increment("rag_planner_decisions_total", decision="keyword_search", reason=reason)
+        print(f"Retrieval plan: keyword search because of {reason.replace('_', ' ')} ({self._describe(vector_docs)})")
+        return True
+
+    def _low_confidence_reason(self, vector_docs, num_candidates):
+        # rejected by a deadline or circuit breaker, the missing hits say nothing about confidence
+        if vector_docs is None or getattr(vector_docs, "partial", False):
+            return "vector_search_failed"
+        min_results = num_candidates if self.min_results is None else self.min_results
+        if len(vector_docs) < min_results:
+            return "too_few_results"
+        scores = sorted((doc.metadata.get("score", 0) for doc in vector_docs), reverse=True)
+        if self.min_top_score is not None and (not scores or scores[0] < self.min_top_score):
+            return "low_top_score"
+        if self.min_score_gap is not None and len(scores) > 1 and scores[0] - scores[1] < self.min_score_gap:
+            return "small_score_gap"
+        return None
+
+    @staticmethod
+    def _describe(vector_docs):
+        if vector_docs is None:
+            return "no results"
+        if getattr(vector_docs, "partial", False):
+            return f"{len(vector_docs)} cached hits, landmark fetch gave up"
+        scores = sorted((doc.metadata.get("score", 0) for doc in vector_docs), reverse=True)
+        if not scores:
+            return "0 hits"
+        gap = f", gap {scores[0] - scores[1]:.3f}" if len(scores) > 1 else ""
+        return f"{len(scores)} hits, top score {scores[0]:.3f}{gap}"
+
+    def stats(self):
+        """How often keyword search ran or was skipped."""
+        with self._lock:
+            decisions = self.keyword_searches + self.skipped
+            return {
+                "keyword_searches": self.keyword_searches,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / decisions if decisions else 0.0
+            }
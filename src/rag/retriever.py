@@ -1,13 +1,37 @@
 from langchain_core.retrievers import BaseRetriever
 from langchain.schema import Document
-from typing import List
+from typing import List, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from datetime import timedelta
 import couchbase.search as search
+from couchbase.exceptions import DocumentNotFoundException
 from couchbase.options import SearchOptions
 from couchbase.vector_search import VectorQuery, VectorSearch
-import json
-from pydantic import Field
+import asyncio
+import time
+from pydantic import Field, PrivateAttr
 from db.capella_client import CapellaClient
+from db.hedging import CallRejectedError, HedgedCaller
 from rag.embeddings import EmbeddingGenerator
+from rag.landmark import LandmarkRecord
+from rag.local_keyword_index import LocalKeywordIndex
+from rag.local_vector_index import LocalVectorIndex
+from rag.document_cache import DocumentCache
+from rag.retrieval_planner import RetrievalPlanner
+from rag.semantic_cache import SemanticCache
+from telemetry.metrics import current_trace, metrics, record_stage, span
+
+class PartialResults(list):
+    """
+    Documents of a retrieval branch that gave up on part of its work, e.g.
+    landmarks served from the document cache because the fetch hit its
+    deadline or an open circuit. They are returned, but never cached, and
+    the planner treats them like a failed search.
+    """
+    partial = True
+
+class LandmarkFetchError(Exception):
+    """None of the landmarks of a multi-get could be read."""
 
 class CouchbaseRetriever(BaseRetriever):
     """
@@ -23,8 +47,31 @@ class CouchbaseRetriever(BaseRetriever):
     # if keyword search is used, the number of candiates will double
     num_candidates: int = 3
     keyword_search: bool = True
+    # "capella" uses the Capella vector search index,
+    # "local" uses the in-process LocalVectorIndex
+    vector_backend: str = "capella"
+    local_vector_index: LocalVectorIndex = Field(default=None)
+    # "capella" uses the Capella full text search index,
+    # "local" uses the in-process BM25 LocalKeywordIndex
+    keyword_backend: str = "capella"
+    local_keyword_index: LocalKeywordIndex = Field(default=None)
+    # document field the Capella vector index is defined on, depends on the embedding encoding
+    vector_field: str = "embedding"
+    # landmark documents shared by the vector and keyword paths
+    document_cache: DocumentCache = Field(default=None)
+    # optional cache of results for semantically near-identical questions
+    semantic_cache: SemanticCache = Field(default=None)
+    # decides whether vector hits are confident enough to skip the keyword search fallback
+    planner: RetrievalPlanner = Field(default=None)
+    # per-operation deadlines, hedging and circuit breakers for the Capella calls, None calls directly
+    hedged_caller: HedgedCaller = Field(default=None)
+    # per-branch timeouts in seconds, None waits for the branch to finish
+    vector_timeout_seconds: Optional[float] = None
+    keyword_timeout_seconds: Optional[float] = None
+    # threads shared by all questions for running the vector and keyword branches
+    _executor: ThreadPoolExecutor = PrivateAttr(default=None)
     
-    def __init__(self, capella_client, embedding_generator, vector_search_index_name, collection_name, num_candidates, keyword_search, text_search_index_name=None):
+    def __init__(self, capella_client, embedding_generator, vector_search_index_name, collection_name, num_candidates, keyword_search, text_search_index_name=None, vector_backend="capella", local_vector_index=None, vector_timeout_seconds=None, keyword_timeout_seconds=None, max_workers=8, document_cache=None, semantic_cache=None, vector_field="embedding", planner=None, keyword_backend="capella", local_keyword_index=None, hedged_caller=None):
         # Add bucket name to collection name if not provided
         if collection_name.count('.') == 1:
             collection_name = f"{capella_client.bucket_name}.{collection_name}"
@@ -40,127 +87,247 @@ class CouchbaseRetriever(BaseRetriever):
         self.num_candidates = num_candidates
         self.keyword_search = keyword_search
         self.text_search_index_name = text_search_index_name
+        if vector_backend not in ("capella", "local"):
+            raise ValueError(f"Unknown vector backend: {vector_backend}")
+        if vector_backend == "local" and local_vector_index is None:
+            raise ValueError("The local vector backend needs a LocalVectorIndex")
+        self.vector_backend = vector_backend
+        self.local_vector_index = local_vector_index
+        if keyword_backend not in ("capella", "local"):
+            raise ValueError(f"Unknown keyword backend: {keyword_backend}")
+        if keyword_backend == "local" and local_keyword_index is None:
+            raise ValueError("The local keyword backend needs a LocalKeywordIndex")
+        self.keyword_backend = keyword_backend
+        self.local_keyword_index = local_keyword_index
+        self.vector_field = vector_field
+        self.vector_timeout_seconds = vector_timeout_seconds
+        self.keyword_timeout_seconds = keyword_timeout_seconds
+        self.document_cache = document_cache
+        self.semantic_cache = semantic_cache
+        self.planner = planner or RetrievalPlanner()
+        self.hedged_caller = hedged_caller
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retriever")
     
     def _ensure_connection(self):
         """
-        Ensure the connection to Couchbase is active, reconnect if needed.
+        Ensure the connection to Couchbase is usable. The client keeps one
+        long-lived cluster handle and only reconnects after a failure.
         """
         try:
-            # Try a simple operation to check connection
-            self.capella_client.cluster.ping()
-        except Exception as e:
-            print(f"Connection error: {e}. Attempting to reconnect...")
-            try:
-                # Reconnect with the same parameters
-                self.capella_client.connect(timeout_seconds=15, apply_wan_profile=True)
-                print("Successfully reconnected to Couchbase")
-            except Exception as reconnect_error:
-                print(f"Failed to reconnect: {reconnect_error}")
-                raise
+            self.capella_client.ensure_connected()
+        except Exception as reconnect_error:
+            print(f"Failed to reconnect: {reconnect_error}")
+            raise
     
-    def _keyword_search(self, query: str) -> List[Document]:
+    def _call(self, operation, fn):
+        """Run a Capella call through the hedged caller, if there is one."""
+        if self.hedged_caller is None:
+            return fn()
+        return self.hedged_caller.call(operation, fn)
+
+    async def _acall(self, operation, make_coroutine):
+        """Async counterpart of _call, make_coroutine is called once per attempt."""
+        if self.hedged_caller is None:
+            return await make_coroutine()
+        return await self.hedged_caller.acall(operation, make_coroutine)
+
+    def _sdk_timeout(self, operation):
+        """
+        SDK options that end an attempt at the operation's deadline,
+        so abandoned attempts don't linger until the cluster-wide timeout.
+        """
+        deadline = None if self.hedged_caller is None else self.hedged_caller.deadlines.get(operation)
+        return {} if deadline is None else {"timeout": timedelta(seconds=deadline)}
+
+    def _report_failure(self, error):
+        """Let the client check the connection, unless the call was only given up on by policy."""
+        if not isinstance(error, CallRejectedError):
+            self.capella_client.report_failure(error)
+
+    async def _areport_failure(self, error):
+        if not isinstance(error, CallRejectedError):
+            await self.capella_client.report_failure_async(error)
+
+    def _keyword_search_request(self, query: str):
+        """
+        Build the FTS request and options for a keyword search.
+        Shared by the sync and async search paths.
         """
-        Search using Full Text Search (FTS) capabilities of Capella with scoped indexes.
+        search_options = SearchOptions(
+            limit=self.num_candidates,
+            fields=["activity", "city", "content", "country", "name", "state", "title", "type"],
+            **self._sdk_timeout("keyword_search")
+        )
+
+        # Create a disjunction query to match any field
+        field_queries = [
+            search.MatchQuery(query, field="name"),
+            search.MatchQuery(query, field="content"),
+            search.MatchQuery(query, field="activity"),
+            search.MatchQuery(query, field="title"),
+            search.MatchQuery(query, field="city"),
+            search.MatchQuery(query, field="country"),
+            search.MatchQuery(query, field="state"),
+            search.MatchQuery(query, field="type")
+        ]
+        
+        # Combine queries with OR logic - unpack the list with *
+        request = search.SearchRequest.create(
+            search.DisjunctionQuery(*field_queries)
+        )
+        return request, search_options
+
+    def _keyword_documents(self, rows) -> List[Document]:
         """
+        Turn keyword search rows into LangChain Documents. Landmarks that
+        are already in the document cache are returned in full, the others
+        are built from the fields stored in the search index.
+        """
+        cached = {}
+        if self.document_cache is not None:
+            cached, _ = self.document_cache.get_many([row.id for row in rows])
+        documents = []
+        for row in rows:
+            doc_id = row.id
+            landmark = cached.get(doc_id)
+            if landmark is None:
+                # Extract fields with proper error handling
+                fields = row.fields if hasattr(row, 'fields') else {}
+                landmark = LandmarkRecord(
+                    doc_id,
+                    name=fields.get("name", ""),
+                    content=fields.get("content", ""),
+                    country=fields.get("country", ""),
+                    city=fields.get("city", ""),
+                    type=fields.get("type", ""),
+                    activity=fields.get("activity", "")
+                )
+            documents.append(
+                self._landmark_document(landmark, "keyword_search", row.score if hasattr(row, 'score') else 0)
+            )
+        return documents
+
+    def _use_local_keyword_index(self):
+        """Whether keyword searches go to the local index, falling back to Capella FTS until it is loaded."""
+        if self.keyword_backend != "local":
+            return False
+        if self.local_keyword_index.is_loaded:
+            return True
+        print("Local keyword index is not loaded, using Capella full text search")
+        metrics.increment("rag_fallbacks_total", kind="capella_keyword_search")
+        return False
+
+    def _local_keyword_search(self, query: str) -> dict:
+        """
+        BM25 search against the in-process keyword index.
+
+        Returns:
+            dict: Landmark ID -> BM25 score, best match first
+        """
+        hits = dict(self.local_keyword_index.search(query, self.num_candidates))
+        print(f"Found {len(hits)} potential matches in keyword search...")
+        return hits
+
+    def _keyword_search(self, query: str, timings: dict = None) -> List[Document]:
+        """
+        Search using Full Text Search (FTS) capabilities of Capella with scoped indexes,
+        or the local keyword index.
+
+        Returns:
+            list: The matching landmarks, None if the search failed, PartialResults
+                if only some of the landmarks could be fetched
+        """
+        started = time.perf_counter()
         try:
-            # Force reconnection to ensure a fresh connection
-            try:
-                self.capella_client.connect(timeout_seconds=15, apply_wan_profile=True)
-                print("Successfully reconnected to Couchbase")
-            except Exception as reconnect_error:
-                print(f"Reconnection warning (continuing anyway): {reconnect_error}")
-            
+            if self._use_local_keyword_index():
+                hits = self._local_keyword_search(query)
+                landmarks, complete = self._fetch_landmarks(list(hits))
+                documents = [
+                    self._landmark_document(landmark, "keyword_search", hits[doc_id])
+                    for doc_id, landmark in landmarks.items()
+                ]
+                return documents if complete else PartialResults(documents)
             bucket = self.capella_client.cluster.bucket(self.capella_client.bucket_name)
             scope = bucket.scope("inventory")
-            
-            search_options = SearchOptions(
-                limit=self.num_candidates,
-                fields=["activity", "city", "content", "country", "name", "state", "title", "type"]
-            )
-
-            # Create a disjunction query to match any field
-            field_queries = [
-                search.MatchQuery(query, field="name"),
-                search.MatchQuery(query, field="content"),
-                search.MatchQuery(query, field="activity"),
-                search.MatchQuery(query, field="title"),
-                search.MatchQuery(query, field="city"),
-                search.MatchQuery(query, field="country"),
-                search.MatchQuery(query, field="state"),
-                search.MatchQuery(query, field="type")
-            ]
-            
-            # Combine queries with OR logic - unpack the list with *
-            request = search.SearchRequest.create(
-                search.DisjunctionQuery(*field_queries)
-            )
-            result = scope.search(
+            request, search_options = self._keyword_search_request(query)
+            # the rows are read inside the call, so its deadline covers the whole response
+            rows = self._call("keyword_search", lambda: list(scope.search(
                 self.text_search_index_name,
                 request,
                 search_options
-            )
-            rows = list(result.rows())
+            ).rows()))
             print(f"Found {len(rows)} potential matches in keyword search...")
-            documents = []
-            for row in rows:
-                doc_id = row.id
-                # Extract fields with proper error handling
-                fields = row.fields if hasattr(row, 'fields') else {}
-                content = {
-                    "id": doc_id,
-                    "name": fields.get("name", ""),
-                    "content": fields.get("content", ""),
-                    "country": fields.get("country", ""),
-                    "city": fields.get("city", ""),
-                    "type": fields.get("type", ""),
-                    "activity": fields.get("activity", "")
-                }
-                documents.append(
-                    Document(
-                        page_content=json.dumps(content),
-                        metadata={
-                            "id": doc_id,
-                            "source": "keyword_search",
-                            "score": row.score if hasattr(row, 'score') else 0
-                        }
-                    )
-                )
-            
-            return documents
+            return self._keyword_documents(rows)
             
         except Exception as e:
             print(f"Full text search error: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+            metrics.increment("rag_errors_total", stage="keyword_search")
+            self._report_failure(e)
+            if not isinstance(e, CallRejectedError):
+                import traceback
+                traceback.print_exc()
+            return None
+        finally:
+            self._record_timing(timings, "keyword_search", started)
     
-    def _get_relevant_documents(self, prompt: str) -> List[Document]:
+    def _vector_search(self, query_embedding) -> dict:
         """
-        Get documents relevant to the query using vector search
-        and keyword search.
-        
-        Keyword search is used as a fallback if vector search
-        doesn't return any results, or if the user wants to use both.
+        Find the landmark IDs closest to the query embedding
+        with the configured vector backend.
+
+        Returns:
+            dict: Landmark ID -> similarity score, best match first
         """
-        # Check if cappella cluster connection is still active and reconnect if needed
-        self._ensure_connection()
-        # Generate embedding from the query
-        query_embedding = self.embedding_generator.generate_embedding(prompt)
-        all_results = {}
-        score_results = {}
-        vector_doc_ids = []
-        try:
-            # STEP 1: Perform vector search to get relevant document IDs
-            scope = self.capella_client.cluster.bucket(self.capella_client.bucket_name).scope("inventory")
-            # Create the search request, increase num_candidates if you want more results
-            search_req = search.SearchRequest.create(search.MatchNoneQuery()).with_vector_search(
-                VectorSearch.from_vector_query(
-                    VectorQuery('embedding', query_embedding, num_candidates=self.num_candidates)
-                )
+        if self.vector_backend == "local":
+            if self.local_vector_index.is_loaded:
+                return self._local_vector_search(query_embedding)
+            print("Local vector index is not loaded, using Capella vector search")
+            metrics.increment("rag_fallbacks_total", kind="capella_vector_search")
+        return self._capella_vector_search(query_embedding)
+
+    def _local_vector_search(self, query_embedding) -> dict:
+        """
+        Vector search against the in-process memory-mapped index.
+        """
+        return dict(self.local_vector_index.search(query_embedding, self.num_candidates))
+
+    def _vector_search_request(self, query_embedding):
+        """
+        Build the vector search request and options.
+        Shared by the sync and async search paths.
+        """
+        # Create the search request, increase num_candidates if you want more results
+        search_req = search.SearchRequest.create(search.MatchNoneQuery()).with_vector_search(
+            VectorSearch.from_vector_query(
+                VectorQuery(self.vector_field, query_embedding, num_candidates=self.num_candidates)
             )
-            # NOTE: DOCUMENT FIELDS ARE ONLY RETURNED 
-            # IF THEY ARE INCLUDED IN THE SEARCH INDEX
-            search_options = SearchOptions(limit=10, fields=["*"])
+        )
+        # only the IDs and scores are used, the landmarks are fetched by key afterwards
+        search_options = SearchOptions(limit=self.num_candidates, **self._sdk_timeout("vector_search"))
+        return search_req, search_options
+
+    @staticmethod
+    def _add_vector_row(score_results, row):
+        """
+        Record the landmark ID and score of a vector search row.
+        """
+        doc_id = row.id
+        if doc_id and doc_id.startswith("vector::"):
+            try:
+                original_doc_id = doc_id.replace("vector::", "")
+                score_results[original_doc_id] = row.score
+            except Exception as e:
+                print(f"Error extracting document ID from {doc_id}: {e}")
+
+    def _capella_vector_search(self, query_embedding) -> dict:
+        """
+        Vector search against the Capella vector search index.
+        """
+        scope = self.capella_client.cluster.bucket(self.capella_client.bucket_name).scope("inventory")
+        search_req, search_options = self._vector_search_request(query_embedding)
+
+        def search_once():
+            score_results = {}
             result = scope.search(
                 self.vector_search_index_name,
                 search_req, 
@@ -168,51 +335,490 @@ class CouchbaseRetriever(BaseRetriever):
             )
             # Get document IDs from vector search results
             for row in result.rows():
-                doc_id = row.id
-                if doc_id and doc_id.startswith("vector::"):
-                    try:
-                        original_doc_id = doc_id.replace("vector::", "")
-                        vector_doc_ids.append(original_doc_id)
-                        score_results[original_doc_id] = row.score
-                    except Exception as e:
-                        print(f"Error extracting document ID from {doc_id}: {e}")
+                self._add_vector_row(score_results, row)
+            return score_results
+
+        return self._call("vector_search", search_once)
+
+    def _landmark_collection(self, bucket):
+        return bucket.scope("inventory").collection("landmark")
+
+    def _fetch_landmarks(self, doc_ids) -> tuple:
+        """
+        Fetch landmark documents by ID with a key-value multi-get,
+        serving what we can from the document cache.
+
+        Returns:
+            tuple: (dict of doc_id -> LandmarkRecord in the order of doc_ids,
+                False if the fetch was given up on or some keys failed to read)
+
+        Raises:
+            LandmarkFetchError: If none of the uncached landmarks could be read
+        """
+        found, missing = ({}, list(doc_ids)) if self.document_cache is None else self.document_cache.get_many(doc_ids)
+        complete = True
+        if missing:
+            collection = self._landmark_collection(self.capella_client.bucket)
+
+            def get_landmarks():
+                # checked inside the call, so a multi-get where every key failed counts against the breaker
+                result = collection.get_multi(missing, **self._sdk_timeout("landmark_fetch"))
+                return self._collect_landmarks(result.results, result.exceptions)
+
+            try:
+                fetched, complete = self._call("landmark_fetch", get_landmarks)
+            except CallRejectedError as e:
+                # degrade to the landmarks we already have
+                print(f"Landmark fetch gave up ({e}), using {len(found)} cached landmarks")
+                metrics.increment("rag_fallbacks_total", kind="cached_landmarks")
+                return {doc_id: found[doc_id] for doc_id in doc_ids if doc_id in found}, False
+            if self.document_cache is not None:
+                self.document_cache.put_many(fetched)
+            found.update(fetched)
+        return {doc_id: found[doc_id] for doc_id in doc_ids if doc_id in found}, complete
+
+    @staticmethod
+    def _collect_landmarks(results, errors) -> tuple:
+        """
+        Turn the per-key outcome of a landmark multi-get into records. A
+        landmark that doesn't exist is simply left out, any other per-key
+        error (usually a timeout) makes the fetch incomplete.
+
+        Args:
+            results (dict): doc_id -> GetResult for the keys that were read
+            errors (dict): doc_id -> exception for the keys that were not
+
+        Returns:
+            tuple: (dict of doc_id -> LandmarkRecord, False if some keys failed)
+
+        Raises:
+            LandmarkFetchError: If keys failed and none could be read
+        """
+        failed = {
+            doc_id: error for doc_id, error in errors.items()
+            if not isinstance(error, DocumentNotFoundException)
+        }
+        for doc_id, error in failed.items():
+            print(f"Error fetching landmark {doc_id}: {error}")
+        if failed and not results:
+            raise LandmarkFetchError(f"All {len(failed)} landmark gets failed: {next(iter(failed.values()))}")
+        fetched = {
+            doc_id: LandmarkRecord.from_dict(doc_id, get_result.content_as[dict])
+            for doc_id, get_result in results.items()
+        }
+        return fetched, not failed
+
+    @staticmethod
+    def _landmark_document(landmark, source, score) -> Document:
+        """
+        Turn a LandmarkRecord into a LangChain Document. The record itself
+        travels in the metadata, the page content is only for the chain's prompt.
+        """
+        return Document(
+            page_content=landmark.text(),
+            metadata={"id": landmark.id, "source": source, "score": score, "landmark": landmark}
+        )
+
+    @staticmethod
+    def _record_timing(timings, stage, started):
+        """
+        Record the seconds spent in a stage in the metrics, and in
+        timings when the caller asked for them.
+        """
+        record_stage(stage, time.perf_counter() - started, timings)
+
+    def _vector_documents(self, prompt: str, timings: dict = None, query_embedding=None) -> List[Document]:
+        """
+        Embed the query (unless already embedded), run vector search
+        and fetch the matching landmarks.
+
+        Returns:
+            list: The matching landmarks, None if the search failed, PartialResults
+                if only some of the landmarks could be fetched
+        """
+        if query_embedding is None:
+            # Generate embedding from the query
+            started = time.perf_counter()
+            query_embedding = self.embedding_generator.generate_embedding(prompt)
+            self._record_timing(timings, "embedding", started)
+        documents = []
+        try:
+            # STEP 1: Perform vector search to get relevant document IDs and scores
+            started = time.perf_counter()
+            score_results = self._vector_search(query_embedding)
+            self._record_timing(timings, "vector_search", started)
             # STEP 2: Fetch the landmark documents using the IDs
-            if vector_doc_ids:
-                # Create IN clause for the document IDs
-                doc_ids_str = ", ".join([f"'{doc_id}'" for doc_id in vector_doc_ids])
-                query = f"""
-                SELECT META().id as id, l.*
-                FROM `{self.capella_client.bucket_name}`.inventory.landmark AS l
-                WHERE META().id IN [{doc_ids_str}]
-                """
-                landmark_results = self.capella_client.execute_query(query)
-                for row in landmark_results:
-                    doc_id = row.get("id")
-                    # Extract the landmark data from the nested 'l' field
-                    if 'l' in row:
-                        content = row['l']
-                    else:
-                        # Remove 'id' field
-                        content = {k: v for k, v in row.items() if k != "id"}
-                    # Create a LangChain Document
-                    all_results[doc_id] = Document(
-                        page_content=json.dumps(content),
-                        metadata={"id": doc_id, "source": "vector_search", "score": score_results.get(f"landmark_{doc_id}", 0)}
-                    )
+            if score_results:
+                started = time.perf_counter()
+                landmarks, complete = self._fetch_landmarks(list(score_results))
+                documents = [
+                    self._landmark_document(landmark, "vector_search", score_results[doc_id])
+                    for doc_id, landmark in landmarks.items()
+                ]
+                if not complete:
+                    documents = PartialResults(documents)
+                self._record_timing(timings, "landmark_fetch", started)
         except Exception as e:
             print(f"Vector search error: {str(e)}")
-        # Perform keyword search as a fallback, 
-        # or if user wants to use both keyword and vector search
-        if not all_results or len(all_results) != self.num_candidates or self.keyword_search:
-            print("Performing keyword search...")
-            keyword_results = self._keyword_search(prompt)
-            for doc in keyword_results:
-                doc_id = doc.metadata.get("id")
-                doc_id = int(doc_id.split(f"{self.collection_name}_")[1])
-                # don't need to duplicate ids
-                if doc_id not in all_results:
-                    all_results[doc_id] = doc
-                else:
-                    print(f"Match was already found during vector embeddingsearch: {doc_id}")
+            metrics.increment("rag_errors_total", stage="vector_search")
+            self._report_failure(e)
+            return None
+        return documents
+
+    @staticmethod
+    def _deadline(timeout):
+        """Monotonic time a branch submitted now has to finish by, None without a timeout."""
+        return None if timeout is None else time.monotonic() + timeout
+
+    def _run_branch(self, future, timeout, name, deadline=None) -> List[Document]:
+        """
+        Wait for a retrieval branch, giving up after its timeout
+        so one slow service can't stall the answer. Pass the deadline
+        taken when the branch was submitted, so time spent waiting on
+        another branch counts against this one's timeout.
+        """
+        wait_seconds = timeout if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            return future.result(timeout=wait_seconds)
+        except FuturesTimeoutError:
+            print(f"{name} search timed out after {timeout}s, continuing without it")
+            metrics.increment("rag_errors_total", stage=f"{name.lower()}_timeout")
+        except Exception as e:
+            print(f"{name} search error: {e}")
+            metrics.increment("rag_errors_total", stage=f"{name.lower()}_branch")
+        # None tells the caller the results are incomplete
+        return None
+
+    @staticmethod
+    def _complete(*branch_results):
+        """Whether no branch failed or returned partial results, i.e. the answer may be cached."""
+        return all(docs is not None and not isinstance(docs, PartialResults) for docs in branch_results)
+
+    def _merge_results(self, vector_docs: List[Document], keyword_docs: List[Document]) -> List[Document]:
+        """
+        Combine vector and keyword results, keeping the vector
+        match when both branches found the same landmark.
+        """
+        all_results = {doc.metadata.get("id"): doc for doc in vector_docs}
+        for doc in keyword_docs:
+            doc_id = doc.metadata.get("id")
+            # don't need to duplicate ids
+            if doc_id not in all_results:
+                all_results[doc_id] = doc
+            else:
+                print(f"Match was already found during vector embeddingsearch: {doc_id}")
+        return list(all_results.values())
+
+    def _get_relevant_documents(self, prompt: str, timings: dict = None, query_embedding=None) -> List[Document]:
+        """
+        Get documents relevant to the query using vector search
+        and keyword search.
         
-        return list(all_results.values())
\ No newline at end of file
+        Keyword search is used as a fallback if the planner finds the
+        vector results not confident enough, or if the user wants to use both.
+        When both are wanted they run concurrently, so the latency is
+        the slower of the two instead of their sum.
+
+        Pass a dict as timings (retriever.invoke(question, timings={}))
+        to get the seconds spent in each stage. Without one, the timings
+        go to the enclosing telemetry trace(), if any. Pass query_embedding
+        when the question was already embedded, e.g. in a batch.
+        """
+        if timings is None:
+            # the branches run on our executor, which doesn't see the caller's context
+            timings = current_trace()
+        # Check if cappella cluster connection is still active and reconnect if needed
+        started = time.perf_counter()
+        self._ensure_connection()
+        self._record_timing(timings, "connection_check", started)
+        if self.semantic_cache is not None:
+            # the cache is keyed on meaning, so the query is embedded before searching
+            if query_embedding is None:
+                started = time.perf_counter()
+                query_embedding = self.embedding_generator.generate_embedding(prompt)
+                self._record_timing(timings, "embedding", started)
+            cached = self.semantic_cache.lookup(query_embedding)
+            if cached is not None:
+                print("Answering from semantic cache")
+                return cached
+
+        vector_future = self._executor.submit(self._vector_documents, prompt, timings, query_embedding)
+        if self.keyword_search:
+            # hybrid retrieval, issue the keyword search right away; both timeouts run from here
+            keyword_future = self._executor.submit(self._keyword_search, prompt, timings)
+            keyword_deadline = self._deadline(self.keyword_timeout_seconds)
+            vector_docs = self._run_branch(vector_future, self.vector_timeout_seconds, "Vector")
+            keyword_docs = self._run_branch(keyword_future, self.keyword_timeout_seconds, "Keyword", keyword_deadline)
+        else:
+            vector_docs = self._run_branch(vector_future, self.vector_timeout_seconds, "Vector")
+            keyword_docs = []
+            # Perform keyword search as a fallback
+            if self.planner.needs_keyword_search(vector_docs, self.num_candidates):
+                print("Performing keyword search...")
+                metrics.increment("rag_fallbacks_total", kind="keyword_search")
+                keyword_future = self._executor.submit(self._keyword_search, prompt, timings)
+                keyword_docs = self._run_branch(keyword_future, self.keyword_timeout_seconds, "Keyword")
+
+        started = time.perf_counter()
+        documents = self._merge_results(vector_docs or [], keyword_docs or [])
+        self._record_timing(timings, "merge", started)
+        # only complete answers are cached, a failed branch would be missing from every later answer
+        if self.semantic_cache is not None and documents and self._complete(vector_docs, keyword_docs):
+            self.semantic_cache.store(query_embedding, documents)
+        return documents
+
+    def stream_relevant_documents(self, prompt: str, timings: dict = None):
+        """
+        Like _get_relevant_documents, but yields the documents of each
+        retrieval branch as soon as that branch finishes, so a caller can
+        show vector results while a slower keyword search is still running.
+        Landmarks already yielded by the other branch are skipped, so with
+        hybrid retrieval the first branch to finish wins a duplicate.
+
+        Yields:
+            Document: Each relevant landmark, once
+        """
+        if timings is None:
+            timings = current_trace()
+        started = time.perf_counter()
+        self._ensure_connection()
+        self._record_timing(timings, "connection_check", started)
+        query_embedding = None
+        if self.semantic_cache is not None:
+            started = time.perf_counter()
+            query_embedding = self.embedding_generator.generate_embedding(prompt)
+            self._record_timing(timings, "embedding", started)
+            cached = self.semantic_cache.lookup(query_embedding)
+            if cached is not None:
+                print("Answering from semantic cache")
+                yield from cached
+                return
+
+        def submit(branch, name, timeout, *args):
+            branches[self._executor.submit(branch, *args)] = (name, timeout, self._deadline(timeout))
+
+        # future -> (name, timeout, deadline)
+        branches = {}
+        submit(self._vector_documents, "Vector", self.vector_timeout_seconds, prompt, timings, query_embedding)
+        if self.keyword_search:
+            submit(self._keyword_search, "Keyword", self.keyword_timeout_seconds, prompt, timings)
+        documents = {}
+        complete = True
+        while branches:
+            deadlines = [deadline for _, _, deadline in branches.values() if deadline is not None]
+            wait_seconds = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            wait(list(branches), timeout=wait_seconds, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future in list(branches):
+                name, timeout, deadline = branches[future]
+                if future.done():
+                    branch_docs = self._run_branch(future, 0, name)
+                elif deadline is not None and deadline <= now:
+                    print(f"{name} search timed out after {timeout}s, continuing without it")
+                    metrics.increment("rag_errors_total", stage=f"{name.lower()}_timeout")
+                    branch_docs = None
+                else:
+                    continue
+                del branches[future]
+                if not self._complete(branch_docs):
+                    complete = False
+                for doc in branch_docs or []:
+                    doc_id = doc.metadata.get("id")
+                    if doc_id not in documents:
+                        documents[doc_id] = doc
+                        yield doc
+                if name == "Vector" and not self.keyword_search and self.planner.needs_keyword_search(branch_docs, self.num_candidates):
+                    print("Performing keyword search...")
+                    metrics.increment("rag_fallbacks_total", kind="keyword_search")
+                    submit(self._keyword_search, "Keyword", self.keyword_timeout_seconds, prompt, timings)
+        if self.semantic_cache is not None and documents and complete:
+            self.semantic_cache.store(query_embedding, list(documents.values()))
+
+    async def _akeyword_search(self, query: str) -> List[Document]:
+        """
+        Async keyword search on the asyncio Couchbase cluster, or the local keyword index.
+        Returns None if the search failed, PartialResults if only some
+        of the landmarks could be fetched.
+        """
+        try:
+            with span("keyword_search"):
+                if self._use_local_keyword_index():
+                    hits = self._local_keyword_search(query)
+                    landmarks, complete = await self._afetch_landmarks(list(hits))
+                    documents = [
+                        self._landmark_document(landmark, "keyword_search", hits[doc_id])
+                        for doc_id, landmark in landmarks.items()
+                    ]
+                    return documents if complete else PartialResults(documents)
+                scope = self.capella_client.async_bucket.scope("inventory")
+                request, search_options = self._keyword_search_request(query)
+
+                async def search_once():
+                    result = scope.search(
+                        self.text_search_index_name,
+                        request,
+                        search_options
+                    )
+                    return [row async for row in result.rows()]
+
+                rows = await self._acall("keyword_search", search_once)
+                print(f"Found {len(rows)} potential matches in keyword search...")
+                return self._keyword_documents(rows)
+        except Exception as e:
+            print(f"Full text search error: {e}")
+            metrics.increment("rag_errors_total", stage="keyword_search")
+            await self._areport_failure(e)
+            return None
+
+    async def _avector_search(self, query_embedding) -> dict:
+        """
+        Async vector search with the configured vector backend.
+        """
+        if self.vector_backend == "local":
+            if self.local_vector_index.is_loaded:
+                # an in-memory matrix product, cheaper than a hop to the executor
+                return self._local_vector_search(query_embedding)
+            print("Local vector index is not loaded, using Capella vector search")
+            metrics.increment("rag_fallbacks_total", kind="capella_vector_search")
+        scope = self.capella_client.async_bucket.scope("inventory")
+        search_req, search_options = self._vector_search_request(query_embedding)
+
+        async def search_once():
+            score_results = {}
+            result = scope.search(
+                self.vector_search_index_name,
+                search_req,
+                search_options
+            )
+            async for row in result.rows():
+                self._add_vector_row(score_results, row)
+            return score_results
+
+        return await self._acall("vector_search", search_once)
+
+    async def _afetch_landmarks(self, doc_ids) -> tuple:
+        """
+        Async counterpart of _fetch_landmarks, the key-value gets for
+        cache misses run concurrently on the asyncio cluster.
+        """
+        found, missing = ({}, list(doc_ids)) if self.document_cache is None else self.document_cache.get_many(doc_ids)
+        complete = True
+        if missing:
+            collection = self._landmark_collection(self.capella_client.async_bucket)
+            timeout = self._sdk_timeout("landmark_fetch")
+
+            async def get_landmarks():
+                results = await asyncio.gather(
+                    *(collection.get(doc_id, **timeout) for doc_id in missing), return_exceptions=True
+                )
+                return self._collect_landmarks(
+                    {doc_id: result for doc_id, result in zip(missing, results) if not isinstance(result, Exception)},
+                    {doc_id: result for doc_id, result in zip(missing, results) if isinstance(result, Exception)}
+                )
+
+            try:
+                fetched, complete = await self._acall("landmark_fetch", get_landmarks)
+            except CallRejectedError as e:
+                print(f"Landmark fetch gave up ({e}), using {len(found)} cached landmarks")
+                metrics.increment("rag_fallbacks_total", kind="cached_landmarks")
+                return {doc_id: found[doc_id] for doc_id in doc_ids if doc_id in found}, False
+            if self.document_cache is not None:
+                self.document_cache.put_many(fetched)
+            found.update(fetched)
+        return {doc_id: found[doc_id] for doc_id in doc_ids if doc_id in found}, complete
+
+    async def _avector_documents(self, prompt: str, query_embedding=None) -> List[Document]:
+        """
+        Async counterpart of _vector_documents. Encoding is CPU bound, so
+        it is batched or runs on the retriever's thread pool, never on the event loop.
+        Returns None if the search failed, PartialResults if only some
+        of the landmarks could be fetched.
+        """
+        if query_embedding is None:
+            with span("embedding"):
+                query_embedding = await self.embedding_generator.agenerate_embedding(prompt, executor=self._executor)
+        documents = []
+        try:
+            with span("vector_search"):
+                score_results = await self._avector_search(query_embedding)
+            if score_results:
+                with span("landmark_fetch"):
+                    landmarks, complete = await self._afetch_landmarks(list(score_results))
+                    documents = [
+                        self._landmark_document(landmark, "vector_search", score_results[doc_id])
+                        for doc_id, landmark in landmarks.items()
+                    ]
+                    if not complete:
+                        documents = PartialResults(documents)
+        except Exception as e:
+            print(f"Vector search error: {str(e)}")
+            metrics.increment("rag_errors_total", stage="vector_search")
+            await self._areport_failure(e)
+            return None
+        return documents
+
+    async def _arun_branch(self, task, timeout, name, deadline=None) -> List[Document]:
+        """
+        Await a retrieval branch, cancelling it after its timeout,
+        or what is left of it at the deadline taken when it started.
+        """
+        wait_seconds = timeout if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(task, timeout=wait_seconds)
+        except asyncio.TimeoutError:
+            print(f"{name} search timed out after {timeout}s, continuing without it")
+            metrics.increment("rag_errors_total", stage=f"{name.lower()}_timeout")
+        except Exception as e:
+            print(f"{name} search error: {e}")
+            metrics.increment("rag_errors_total", stage=f"{name.lower()}_branch")
+        # None tells the caller the results are incomplete
+        return None
+
+    async def _aget_relevant_documents(self, prompt: str) -> List[Document]:
+        """
+        Async version of _get_relevant_documents, built on the asyncio
+        Couchbase SDK so concurrent questions don't each need a thread.
+        """
+        with span("connection_check"):
+            await self.capella_client.ensure_connected_async()
+        query_embedding = None
+        if self.semantic_cache is not None:
+            with span("embedding"):
+                query_embedding = await self.embedding_generator.agenerate_embedding(prompt, executor=self._executor)
+            cached = self.semantic_cache.lookup(query_embedding)
+            if cached is not None:
+                print("Answering from semantic cache")
+                return cached
+
+        vector_task = asyncio.ensure_future(self._avector_documents(prompt, query_embedding))
+        if self.keyword_search:
+            # both timeouts run from here, not from when each one is awaited
+            keyword_task = asyncio.ensure_future(self._akeyword_search(prompt))
+            keyword_deadline = self._deadline(self.keyword_timeout_seconds)
+            vector_docs = await self._arun_branch(vector_task, self.vector_timeout_seconds, "Vector")
+            keyword_docs = await self._arun_branch(keyword_task, self.keyword_timeout_seconds, "Keyword", keyword_deadline)
+        else:
+            vector_docs = await self._arun_branch(vector_task, self.vector_timeout_seconds, "Vector")
+            keyword_docs = []
+            if self.planner.needs_keyword_search(vector_docs, self.num_candidates):
+                print("Performing keyword search...")
+                metrics.increment("rag_fallbacks_total", kind="keyword_search")
+                keyword_docs = await self._arun_branch(
+                    self._akeyword_search(prompt), self.keyword_timeout_seconds, "Keyword"
+                )
+
+        with span("merge"):
+            documents = self._merge_results(vector_docs or [], keyword_docs or [])
+        if self.semantic_cache is not None and documents and self._complete(vector_docs, keyword_docs):
+            self.semantic_cache.store(query_embedding, documents)
+        return documents
+
+    def invalidate_caches(self):
+        """
+        Drop cached retrieval results and landmark documents,
+        e.g. after the loader re-embedded landmarks.
+        """
+        if self.semantic_cache is not None:
+            self.semantic_cache.invalidate()
+        if self.document_cache is not None:
+            self.document_cache.clear()
\ No newline at end of file
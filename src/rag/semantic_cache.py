@@ -0,0 +1,96 @@
+import threading
+import time
+import numpy as np
+
+class SemanticCache:
+    """
+    Retrieval-level cache keyed on query meaning rather than query text.
+    Stores recent query embeddings with the documents retrieved for them;
+    a new query whose embedding is within the cosine threshold of a cached
+    one gets those documents back without searching again.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl_seconds=600):
+        """
+        Args:
+            threshold (float): Minimum cosine similarity for a hit
+            max_entries (int): Most queries kept, least recently used are evicted first
+            ttl_seconds (float): How long an entry may be served
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # one slot per entry, a slot is empty when its expiry is in the past
+        self._matrix = None
+        self._expires = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._documents = [None] * max_entries
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding):
+        """
+        Find cached documents for a query embedding.
+
+        Returns:
+            list: The cached documents, or None on a miss
+        """
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            live = self._expires > now
+            if self._matrix is None or not live.any():
+                self.misses += 1
+                return None
+            scores = self._matrix @ query
+            scores[~live] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            return list(self._documents[best])
+
+    def store(self, embedding, documents):
+        """Remember the documents retrieved for a query embedding."""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+            free = np.flatnonzero(self._expires <= now)
+            # reuse an empty or expired slot, otherwise evict the least recently used entry
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+            self._matrix[slot] = query
+            self._expires[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+            self._documents[slot] = list(documents)
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the loader re-embedded landmarks."""
+        with self._lock:
+            self._expires[:] = 0
+            self._documents = [None] * self.max_entries
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit rate for tuning the similarity threshold."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": int((self._expires > time.monotonic()).sum()),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
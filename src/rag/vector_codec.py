@@ -0,0 +1,75 @@
+import base64
+import json
+import numpy as np
+
+# encoding -> field of the vector document that holds the embedding
+#   json:    list of floats, readable by a Capella vector index of type "vector"
+#   base64:  little-endian float32 bytes, readable by a Capella index of type "vector_base64"
+#   float16: little-endian float16 bytes, half the size of base64, local vector index only
+#   int8:    one signed byte per dimension plus a per-vector scale, local vector index only
+ENCODING_FIELDS = {
+    "json": "embedding",
+    "base64": "embedding_base64",
+    "float16": "embedding_f16",
+    "int8": "embedding_i8"
+}
+# encodings a Capella vector search index can be defined on
+CAPELLA_ENCODINGS = ("json", "base64")
+SCALE_FIELD = "embedding_scale"
+
+def check_encoding(encoding):
+    if encoding not in ENCODING_FIELDS:
+        raise ValueError(f"Unknown embedding encoding: {encoding}, use one of {', '.join(ENCODING_FIELDS)}")
+    return encoding
+
+def vector_field(encoding):
+    """Name of the document field that holds embeddings in this encoding."""
+    return ENCODING_FIELDS[check_encoding(encoding)]
+
+def encode_embedding(embedding, encoding="json"):
+    """
+    Encode an embedding for storage in a vector document.
+
+    Returns:
+        dict: The fields to put in the document
+    """
+    field = vector_field(encoding)
+    if encoding == "json":
+        return {field: [float(value) for value in embedding]}
+    vector = np.asarray(embedding, dtype=np.float32)
+    if encoding == "base64":
+        return {field: base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")}
+    if encoding == "float16":
+        return {field: base64.b64encode(vector.astype("<f2").tobytes()).decode("ascii")}
+    # symmetric int8 quantization, the scale maps the largest component to 127
+    peak = float(np.abs(vector).max()) if vector.size else 0.0
+    scale = peak / 127 if peak else 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return {field: base64.b64encode(quantized.tobytes()).decode("ascii"), SCALE_FIELD: scale}
+
+def decode_embedding(doc):
+    """
+    Read the embedding of a vector document, whatever its encoding.
+
+    Returns:
+        numpy.ndarray: float32 vector, or None if the document has no embedding
+    """
+    encoding = doc.get("embedding_encoding")
+    encodings = [encoding] if encoding in ENCODING_FIELDS else list(ENCODING_FIELDS)
+    for encoding in encodings:
+        value = doc.get(ENCODING_FIELDS[encoding])
+        if value is None:
+            continue
+        if encoding == "json":
+            return np.asarray(value, dtype=np.float32)
+        raw = base64.b64decode(value)
+        if encoding == "base64":
+            return np.frombuffer(raw, dtype="<f4").astype(np.float32)
+        if encoding == "float16":
+            return np.frombuffer(raw, dtype="<f2").astype(np.float32)
+        return np.frombuffer(raw, dtype=np.int8).astype(np.float32) * float(doc.get(SCALE_FIELD, 1.0))
+    return None
+
+def encoded_size(doc):
+    """Bytes of a document as JSON, roughly what it costs on the wire and on disk."""
+    return len(json.dumps(doc, separators=(",", ":")).encode("utf-8"))
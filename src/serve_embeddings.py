@@ -0,0 +1,44 @@
+from dotenv import load_dotenv
+from bootstrap import Settings, build_embedding_generator
+from rag.embedding_server import EmbeddingServer
+import signal
+import sys
+import threading
+
+def main():
+    """
+    Load the embedding model once and serve it over a Unix socket to
+    every chatbot, HTTP server and ingestion worker on this machine that
+    has EMBEDDING_SERVER_SOCKET set to the same path. The cache,
+    backend and micro-batching settings apply to the served model.
+
+        python src/serve_embeddings.py [socket path]
+    """
+    load_dotenv()
+    settings = Settings()
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else settings.embedding_server_socket
+    if not socket_path:
+        print("Set EMBEDDING_SERVER_SOCKET or pass the socket path to listen on.")
+        sys.exit(1)
+    # this process is the one that loads the model
+    settings.embedding_server_socket = None
+    embedding_generator = build_embedding_generator(settings)
+    embedding_generator.load_model()
+    embedding_generator.warmup()
+
+    server = EmbeddingServer(embedding_generator, socket_path)
+    server.start()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    server.close()
+    print(f"Embedding server: {server.stats()}")
+    if embedding_generator.cache is not None:
+        print(f"Embedding cache: {embedding_generator.cache.stats()}")
+        embedding_generator.cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+from dotenv import load_dotenv
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bootstrap import (Settings, StartupReport, build_client, build_embedding_generator, build_local_keyword_index,
+                       build_local_vector_index, build_retriever, preload_modules)
+from telemetry.metrics import metrics
+import json
+import threading
+import traceback
+
+class ChatbotService:
+    """
+    Builds the chatbot pipeline once from settings and answers
+    questions with a bounded number running at the same time.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.chatbot = None
+        self.client = None
+        self.embedding_generator = None
+        self.ready = False
+        self.startup_error = None
+        self._slots = threading.BoundedSemaphore(settings.server_max_concurrency)
+
+    def start(self):
+        """
+        Connect, load and warm up the model in a background thread,
+        so the health endpoint answers while the service is starting.
+        """
+        threading.Thread(target=self._build, name="chatbot-startup", daemon=True).start()
+
+    def _build(self):
+        startup = StartupReport()
+        try:
+            # the model loads and LangChain imports in the background while we connect
+            print("Loading embedding model...")
+            embedding_generator = build_embedding_generator(self.settings)
+            embedding_generator.load_in_background(warmup=True)
+            preload_modules(startup)
+            print("connecting to capella...")
+            with startup.phase("connect"):
+                self.client = build_client(self.settings)
+            with startup.phase("local vector index"):
+                local_vector_index = build_local_vector_index(self.settings, self.client)
+            with startup.phase("local keyword index"):
+                local_keyword_index = build_local_keyword_index(self.settings, self.client)
+            with startup.phase("chatbot setup"):
+                from rag.chatbot import TravelChatbot
+                retriever = build_retriever(self.settings, self.client, embedding_generator, local_vector_index, local_keyword_index=local_keyword_index)
+                self.chatbot = TravelChatbot(retriever, slow_request_seconds=self.settings.slow_request_seconds)
+            with startup.phase("waiting for model"):
+                embedding_generator.wait_until_loaded()
+            self.embedding_generator = embedding_generator
+            startup.add("model load", embedding_generator.load_seconds, background=True)
+            startup.add("model warmup", embedding_generator.warmup_seconds, background=True)
+            self.ready = True
+            startup.report()
+        except Exception as e:
+            self.startup_error = str(e)
+            print(f"Chatbot startup failed: {e}")
+            traceback.print_exc()
+
+    def stats(self):
+        """
+        Cache, batching and connection statistics for tuning.
+        """
+        stats = {"ready": self.ready}
+        if self.embedding_generator is not None:
+            if self.embedding_generator.cache is not None:
+                stats["embedding_cache"] = self.embedding_generator.cache.stats()
+            if self.embedding_generator.batcher is not None:
+                stats["embedding_batcher"] = self.embedding_generator.batcher.stats()
+        if self.chatbot is not None:
+            retriever = self.chatbot.retriever
+            if retriever.document_cache is not None:
+                stats["document_cache"] = retriever.document_cache.stats()
+            if retriever.semantic_cache is not None:
+                stats["semantic_cache"] = retriever.semantic_cache.stats()
+            stats["retrieval_planner"] = retriever.planner.stats()
+            if retriever.hedged_caller is not None:
+                stats["capella_calls"] = retriever.hedged_caller.stats()
+        if self.client is not None:
+            stats["connection"] = self.client.connection_stats()
+        stats["metrics"] = metrics.snapshot()
+        return stats
+
+    def answer(self, question):
+        """
+        Answer a question, waiting for a free slot for at most the queue timeout.
+
+        Returns:
+            dict: The structured answer, or None when no slot became free
+        """
+        if not self._slots.acquire(timeout=self.settings.server_queue_timeout_seconds):
+            return None
+        try:
+            return self.chatbot.answer_question_structured(question)
+        finally:
+            self._slots.release()
+
+class ChatbotRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP endpoints:
+        GET  /health - the process is up
+        GET  /ready  - the model is loaded and Capella is connected
+        GET  /stats  - cache, batching and connection statistics, plus all metrics as JSON
+        GET  /metrics - stage timings and counters in the Prometheus text format
+        POST /ask    - {"question": "..."} -> documents, scores, sources and timings
+    """
+    service = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/ready":
+            if self.service.ready:
+                self._send_json(200, {"status": "ready"})
+            else:
+                self._send_json(503, {"status": "starting", "error": self.service.startup_error})
+        elif self.path == "/stats":
+            self._send_json(200, self.service.stats())
+        elif self.path == "/metrics":
+            self._send_text(200, metrics.to_prometheus(), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/ask":
+            self._send_json(404, {"error": "Not found"})
+            return
+        if not self.service.ready:
+            self._send_json(503, {"error": "Chatbot is not ready yet"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            question = str(body.get("question", "")).strip()
+        except Exception:
+            self._send_json(400, {"error": "Request body must be JSON with a 'question' field"})
+            return
+        if not question:
+            self._send_json(400, {"error": "Missing 'question'"})
+            return
+        try:
+            result = self.service.answer(question)
+        except Exception as e:
+            print(f"Error answering question: {e}")
+            traceback.print_exc()
+            self._send_json(500, {"error": "Error answering question"})
+            return
+        if result is None:
+            self._send_json(503, {"error": "Too many questions in progress, try again shortly"})
+            return
+        self._send_json(200, result)
+
+    def _send_json(self, status, payload):
+        self._send_text(status, json.dumps(payload), "application/json")
+
+    def _send_text(self, status, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the console for pipeline output, only log failed requests
+        if len(args) < 2 or str(args[1]).startswith(("4", "5")):
+            super().log_message(format, *args)
+
+def main():
+    print("Starting Travel Chatbot server...")
+    load_dotenv()
+    settings = Settings()
+    missing = settings.missing_connection_settings()
+    if missing:
+        print(f"Error: Missing required environment variables: {', '.join(missing)}")
+        return
+
+    service = ChatbotService(settings)
+    service.start()
+    ChatbotRequestHandler.service = service
+    server = ThreadingHTTPServer((settings.server_host, settings.server_port), ChatbotRequestHandler)
+    print(f"Listening on http://{settings.server_host}:{settings.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        server.server_close()
+        if service.client is not None:
+            service.client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+from contextlib import contextmanager
+import bisect
+import contextvars
+import threading
+import time
+
+# upper bounds in seconds for the stage duration histograms
+STAGE_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+class Histogram:
+    """
+    Fixed-bucket histogram, cheap enough to update on every request.
+    """
+
+    def __init__(self, buckets):
+        # upper bounds of each bucket, values above the last bound go in an overflow bucket
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self):
+        """Bucket counts keyed by upper bound, plus count and mean."""
+        with self._lock:
+            buckets = {f"le_{bound}": count for bound, count in zip(self.buckets, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            return {
+                "buckets": buckets,
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0
+            }
+
+    def cumulative(self):
+        """(upper bound, count of values <= bound) pairs, count and sum, for Prometheus."""
+        with self._lock:
+            pairs = []
+            running = 0
+            for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+                running += count
+                pairs.append((bound, running))
+            return pairs, self.count, self.total
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, keyed by name and labels.
+    Exported as JSON for /stats or in the Prometheus text format.
+    """
+
+    def __init__(self):
+        # (name, sorted label pairs) -> value or Histogram
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        """Set the HELP line shown for a metric in the Prometheus export."""
+        self._help[name] = help_text
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=STAGE_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+        histogram.observe(value)
+
+    def counter(self, name, **labels):
+        """Current value of a counter, 0 if it was never incremented."""
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _series_name(name, labels):
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{key}={value}" for key, value in labels) + "}"
+
+    def snapshot(self):
+        """All metrics as a JSON-friendly dict."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        return {
+            "counters": {self._series_name(name, labels): value for (name, labels), value in sorted(counters.items())},
+            "histograms": {
+                self._series_name(name, labels): histogram.snapshot()
+                for (name, labels), histogram in sorted(histograms.items(), key=lambda item: item[0])
+            }
+        }
+
+    @staticmethod
+    def _prometheus_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = []
+        for key, value in pairs:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{key}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def to_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{self._prometheus_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            pairs, count, total = histogram.cumulative()
+            for bound, running in pairs:
+                lines.append(f"{name}_bucket{self._prometheus_labels(labels, [('le', bound)])} {running}")
+            lines.append(f"{name}_sum{self._prometheus_labels(labels)} {total}")
+            lines.append(f"{name}_count{self._prometheus_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.describe("rag_stage_duration_seconds", "Seconds spent in each stage of answering a question")
+metrics.describe("rag_fallbacks_total", "Times a retrieval path fell back to another one")
+metrics.describe("rag_errors_total", "Errors by pipeline stage")
+metrics.describe("rag_answers_total", "Questions answered")
+metrics.describe("rag_slow_answers_total", "Answers slower than the slow request threshold")
+metrics.describe("rag_planner_decisions_total", "Keyword search fallbacks run or skipped by the retrieval planner, by reason")
+metrics.describe("embedding_server_requests_total", "Encode requests answered by the embedding server")
+metrics.describe("embedding_server_texts_total", "Texts embedded by the embedding server")
+metrics.describe("embedding_server_reconnects_total", "Embedding server requests retried on a new connection after the pooled one broke")
+metrics.describe("capella_reconnects_total", "Successful reconnects to Capella")
+metrics.describe("capella_reconnect_failures_total", "Failed reconnect attempts to Capella")
+metrics.describe("capella_reconnect_cooldown_rejections_total", "Requests failed fast because a reconnect had just failed")
+metrics.describe("capella_health_check_failures_total", "Health checks that found the connection broken")
+metrics.describe("capella_hedged_requests_total", "Second attempts sent because the first was slower than the hedging percentile")
+metrics.describe("capella_hedge_wins_total", "Hedged attempts that answered before the first attempt")
+metrics.describe("capella_deadline_exceeded_total", "Operations given up on at their deadline")
+metrics.describe("capella_circuit_opened_total", "Times an operation's circuit breaker opened")
+metrics.describe("capella_circuit_rejections_total", "Calls not made because the operation's circuit was open")
+
+# stage -> seconds of the answer being worked on in this context, see trace()
+_current_trace = contextvars.ContextVar("rag_stage_trace", default=None)
+
+@contextmanager
+def trace():
+    """
+    Collect the stage timings of everything run inside the block.
+
+        with trace() as timings:
+            chatbot.answer_question(question)
+        # timings == {"embedding": 0.004, "vector_search": 0.03, ...}
+
+    The dict travels with the context, so stages timed in LangChain's
+    worker threads or asyncio tasks land in it too.
+    """
+    timings = {}
+    token = _current_trace.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_trace.reset(token)
+
+def current_trace():
+    """The timings dict of the enclosing trace(), or None outside of one."""
+    return _current_trace.get()
+
+def record_stage(stage, seconds, timings=None):
+    """
+    Record the seconds spent in a stage: always in the stage histogram,
+    and in timings (or the current trace, if timings is None).
+    """
+    metrics.observe("rag_stage_duration_seconds", seconds, stage=stage)
+    if timings is None:
+        timings = _current_trace.get()
+    if timings is not None:
+        timings[stage] = seconds
+
+@contextmanager
+def span(stage, timings=None):
+    """Time the block as one stage, see record_stage()."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, timings)